@@ -0,0 +1,231 @@
+"""
+Generates a reproducible synthetic dataset of master passwords and vault entries into a backend,
+for benchmark and load runs.
+
+Every user gets a master password, and the vault entries are distributed between the users
+uniformly, or skewed (Zipf: the i-th user owns entries proportionally to 1 / i ** skew).
+Some entries have extra (elastic) fields, and some have protected fields (e.g. `_CREATED`),
+which are stored, but removed from entities returned by the repositories.
+The same seed, size and distribution always generate the same data.
+
+Entries are written with a single batch per table (`create_many`), not one entity at a time:
+the Tiny backend writes the database file once, the git backend commits once,
+and the file system backend writes the files with a thread pool.
+
+Usage:
+    python -m benchmarks.dataset tiny ~/.mypass/db/tinydb/db.json -n 100000 -u 1000 -d zipf --seed 42
+    python -m benchmarks.dataset fs /tmp/mypass-fs -n 10000 -u 100 -d uniform
+    python -m benchmarks.dataset git /tmp/mypass-git -n 10000
+"""
+import base64
+import random
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+from typing import Literal
+
+from mypass.db import CrudRepository
+from mypass.db.fs import FileSystemDao, MasterFileSystemRepository, VaultFileSystemRepository
+from mypass.db.git import MasterGitRepository, VaultGitRepository
+from mypass.db.serializers import SERIALIZERS, get_serializer
+from mypass.db.tiny import MasterTinyRepository, VaultTinyRepository
+from mypass.db.tiny.dao import close_persistent_connections
+from mypass.exceptions import RequiresIdError
+from mypass.types import MasterEntity, VaultEntity
+from mypass.types.const import UID_FIELD
+
+SITES = [
+    'google.com', 'github.com', 'amazon.com', 'facebook.com', 'microsoft.com', 'apple.com', 'netflix.com',
+    'paypal.com', 'linkedin.com', 'reddit.com', 'dropbox.com', 'slack.com', 'spotify.com', 'twitter.com',
+]
+EXTRA_FIELDS = ('notes', 'tags', 'otp_secret', 'recovery_codes', 'folder', 'url')
+PROTECTED_FIELDS = ('_CREATED', '_ROTATED', '_HISTORY')
+
+
+class Dataset:
+    """Generated master passwords (one per user), and vault entries with the index of their user."""
+
+    def __init__(self, masters: list[MasterEntity], entries: list[tuple[int, VaultEntity]]):
+        self.masters = masters
+        self.entries = entries
+
+    def stats(self) -> dict[str, float]:
+        per_user = Counter(user for user, _ in self.entries)
+        return {
+            'users': len(self.masters),
+            'entries': len(self.entries),
+            'max_per_user': max(per_user.values(), default=0),
+            'users_without_entries': len(self.masters) - len(per_user),
+            'with_extra_fields': sum(any(k in entity for k in EXTRA_FIELDS) for _, entity in self.entries),
+            'with_protected_fields': sum(any(k in entity for k in PROTECTED_FIELDS) for _, entity in self.entries),
+        }
+
+
+def _token(rnd: random.Random, size: int) -> str:
+    return base64.urlsafe_b64encode(rnd.randbytes(size)).decode('ascii')
+
+
+def _user_weights(users: int, distribution: Literal['uniform', 'zipf'], skew: float) -> list[float] | None:
+    if distribution == 'uniform':
+        return None
+    return list(accumulate(1 / (rank ** skew) for rank in range(1, users + 1)))
+
+
+def _vault_entity(rnd: random.Random, user: int, extra: float, protected: float) -> VaultEntity:
+    site = rnd.choice(SITES)
+    fields = {}
+    if rnd.random() < extra:
+        for field in rnd.sample(EXTRA_FIELDS, rnd.randint(1, 3)):
+            if field == 'tags':
+                fields[field] = rnd.sample(['work', 'mail', 'bank', 'social', 'shared', 'old'], rnd.randint(1, 3))
+            elif field == 'recovery_codes':
+                fields[field] = [_token(rnd, 6) for _ in range(8)]
+            elif field == 'url':
+                fields[field] = f'https://{site}/login'
+            else:
+                fields[field] = _token(rnd, rnd.randint(8, 64))
+    if rnd.random() < protected:
+        created = 1_600_000_000 + rnd.randrange(100_000_000)
+        fields['_CREATED'] = created
+        fields['_ROTATED'] = created + rnd.randrange(10_000_000)
+        fields['_HISTORY'] = [f'gAAAAAB{_token(rnd, 72)}' for _ in range(rnd.randint(1, 3))]
+    return VaultEntity(
+        user=f'user-{user}', pw=f'gAAAAAB{_token(rnd, 72)}', salt=_token(rnd, 16),
+        label=f'{site.split(".")[0]}-{rnd.randrange(10)}', email=f'user-{user}@example.com',
+        site=f'https://{site}', **fields)
+
+
+def generate(
+        size: int,
+        users: int,
+        distribution: Literal['uniform', 'zipf'] = 'zipf',
+        skew: float = 1.1,
+        extra: float = 0.3,
+        protected: float = 0.1,
+        seed: int = 0
+) -> Dataset:
+    """
+    Generates the master passwords of `users` users, and `size` vault entries distributed between them.
+
+    Parameters:
+        size (int): Number of vault entries.
+        users (int): Number of users (master passwords).
+        distribution (Literal['uniform', 'zipf']): Distribution of the entries between the users.
+        skew (float): Exponent of the Zipf distribution, higher values give more entries to the first users.
+        extra (float): Ratio of the entries with extra (elastic) fields.
+        protected (float): Ratio of the entries with protected fields.
+        seed (int): Seed of the random generator.
+    """
+    assert users > 0, 'The dataset should have at least one user.'
+    rnd = random.Random(seed)
+    masters = [
+        MasterEntity(user=f'user-{user}', token=_token(rnd, 32), pw=_token(rnd, 32), salt=_token(rnd, 16))
+        for user in range(users)]
+    owners = rnd.choices(range(users), cum_weights=_user_weights(users, distribution, skew), k=size)
+    entries = [(user, _vault_entity(rnd, user, extra, protected)) for user in owners]
+    return Dataset(masters, entries)
+
+
+def _create_many(repo: CrudRepository, entities: list, rnd: random.Random) -> list:
+    try:
+        return list(repo.create_many(entities))
+    except RequiresIdError:
+        # ids are generated from the seed too (instead of `gen_uuid`), so the files are the same on every run
+        for entity in entities:
+            entity.id = f'{rnd.getrandbits(128):032x}'
+        return list(repo.create_many(entities))
+
+
+def write(master_repo: CrudRepository, vault_repo: CrudRepository, dataset: Dataset, seed: int = 0) -> dict:
+    """
+    Writes the dataset into the repositories, the user id field of every entry is set to the id of its master.
+
+    Returns:
+        dict: Ids of the created master passwords (`master`) and vault entries (`vault`).
+    """
+    rnd = random.Random(seed)
+    master_ids = _create_many(master_repo, dataset.masters, rnd)
+    for user, entity in dataset.entries:
+        entity[UID_FIELD] = master_ids[user]
+    vault_ids = _create_many(vault_repo, [entity for _, entity in dataset.entries], rnd)
+    return {'master': master_ids, 'vault': vault_ids}
+
+
+def tiny_repositories(path: Path, serializer: str):
+    serializer = get_serializer(serializer)
+    master = MasterTinyRepository(path=path, persistent=True, serializer=serializer)
+    vault = VaultTinyRepository(path=path, persistent=True, serializer=serializer)
+    return master, vault, close_persistent_connections
+
+
+def fs_repositories(path: Path, serializer: str):
+    (path / 'master').mkdir(parents=True, exist_ok=True)
+    (path / 'vault').mkdir(parents=True, exist_ok=True)
+    dao = FileSystemDao(max_workers=8, serializer=get_serializer(serializer))
+    master = MasterFileSystemRepository(path / 'master', dao)
+    vault = VaultFileSystemRepository(path / 'vault', dao)
+
+    def close():
+        master.close()
+        vault.close()
+        dao.close()
+
+    return master, vault, close
+
+
+def git_repositories(path: Path, serializer: str):
+    path.mkdir(parents=True, exist_ok=True)
+    master_dao, vault_dao, close_tiny = tiny_repositories(
+        path / f'db{get_serializer(serializer).extension}', serializer)
+    master = MasterGitRepository(dao=master_dao, path=path)
+    vault = VaultGitRepository(dao=vault_dao, path=path)
+
+    def close():
+        master.git.repo.close()
+        vault.git.repo.close()
+        close_tiny()
+
+    return master, vault, close
+
+
+BACKENDS = {
+    'tiny': tiny_repositories,
+    'fs': fs_repositories,
+    'git': git_repositories,
+}
+
+
+def main():
+    arg_parser = ArgumentParser('dataset')
+    arg_parser.add_argument('backend', choices=list(BACKENDS), help='backend to write the dataset into')
+    arg_parser.add_argument(
+        'path', type=Path, help='database file (tiny), root folder (fs) or repository folder (git)')
+    arg_parser.add_argument('-n', '--size', type=int, default=10000, help='number of vault entries')
+    arg_parser.add_argument('-u', '--users', type=int, default=100, help='number of users (master passwords)')
+    arg_parser.add_argument(
+        '-d', '--distribution', choices=['uniform', 'zipf'], default='zipf', help='entries per user')
+    arg_parser.add_argument('--skew', type=float, default=1.1, help='exponent of the zipf distribution')
+    arg_parser.add_argument('--extra', type=float, default=0.3, help='ratio of entries with extra fields')
+    arg_parser.add_argument('--protected', type=float, default=0.1, help='ratio of entries with protected fields')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    arg_parser.add_argument(
+        '-f', '--format', choices=list(SERIALIZERS), default='json', help='serialization format of the files')
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    dataset = generate(
+        args.size, args.users, distribution=args.distribution, skew=args.skew, extra=args.extra,
+        protected=args.protected, seed=args.seed)
+    generated = time.perf_counter()
+    master, vault, close = BACKENDS[args.backend](args.path, args.format)
+    write(master, vault, dataset, seed=args.seed)
+    close()
+    written = time.perf_counter()
+    print(', '.join(f'{k} {v}' for k, v in dataset.stats().items()))
+    print(f'Generated in {generated - start:.2f} s, written into {args.path} in {written - generated:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Measures the operations of `MasterDbSupport` and `VaultDbSupport` on every repository backend
+(Tiny, FileSystem and Git, the latter storing a Tiny database in a local repository).
+
+Every backend is filled with the given number of vault records (with a single batched write),
+then every operation is called `--ops` times on random records: create, read by pk, read by crit (user id),
+update by ids and delete by crit (user id), and create/read of master passwords.
+Results are printed, and written as JSON with `--output`. With `--compare`, results are checked against
+a baseline written by a previous run: operations slower than the baseline by more than `--threshold`
+are reported, and the script exits with status 1.
+
+Usage:
+    python -m benchmarks.dbsupport -s 1000 10000 100000 -o results.json
+    python -m benchmarks.dbsupport -s 1000 10000 -c results.json -t 0.25
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable
+
+from mypass.db import MasterDbSupport, VaultDbSupport
+from mypass.db.fs import FileSystemDao, MasterFileSystemRepository, VaultFileSystemRepository
+from mypass.db.git import MasterGitRepository, VaultGitRepository
+from mypass.db.tiny import MasterTinyRepository, VaultTinyRepository
+from mypass.db.tiny.dao import close_persistent_connections
+from mypass.types import MasterEntity, VaultEntity
+from mypass.types.const import UID_FIELD
+
+USERS = 100
+
+
+def tiny_backend(folder: Path) -> tuple[MasterDbSupport, VaultDbSupport, Callable[[], None]]:
+    path = folder / 'db.json'
+    master = MasterTinyRepository(path=path, persistent=True)
+    vault = VaultTinyRepository(path=path, persistent=True)
+    return MasterDbSupport(master), VaultDbSupport(vault), close_persistent_connections
+
+
+def fs_backend(folder: Path) -> tuple[MasterDbSupport, VaultDbSupport, Callable[[], None]]:
+    (folder / 'master').mkdir()
+    (folder / 'vault').mkdir()
+    dao = FileSystemDao()
+    master = MasterFileSystemRepository(folder / 'master', dao)
+    vault = VaultFileSystemRepository(folder / 'vault', dao)
+
+    def close():
+        master.close()
+        vault.close()
+        dao.close()
+
+    return MasterDbSupport(master), VaultDbSupport(vault), close
+
+
+def git_backend(folder: Path) -> tuple[MasterDbSupport, VaultDbSupport, Callable[[], None]]:
+    master_support, vault_support, close_tiny = tiny_backend(folder)
+    # both repositories store their tables in the same database file, and commit to the same git repository
+    master = MasterGitRepository(dao=master_support.repo, path=folder)
+    vault = VaultGitRepository(dao=vault_support.repo, path=folder)
+
+    def close():
+        vault.close()
+        master.close()
+        vault.git.repo.close()
+        master.git.repo.close()
+        close_tiny()
+
+    return MasterDbSupport(master), VaultDbSupport(vault), close
+
+
+BACKENDS = {
+    'tiny': tiny_backend,
+    'fs': fs_backend,
+    'git': git_backend,
+}
+
+
+def vault_entity(i: int) -> VaultEntity:
+    return VaultEntity(
+        user=f'user-{i}@example.com', pw='gAAAAABk' + f'{i:08x}' * 12,
+        site=f'https://site-{i % 500}.example.com/login', **{UID_FIELD: i % USERS})
+
+
+def timed(fn: Callable[[], object], calls: int) -> dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    seconds = time.perf_counter() - start
+    return {'calls': calls, 'seconds': seconds, 'per_call': seconds / calls}
+
+
+def bench_backend(backend: str, size: int, ops: int, seed: int) -> dict[str, dict[str, float]]:
+    rnd = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        master, vault, close = BACKENDS[backend](Path(tmp_dir))
+        results = {'vault.populate': timed(lambda: vault.create_vault_entries(
+            entities=[vault_entity(i) for i in range(size)]), 1)}
+        pks = [entity.id for entity in vault.read_vault_entries(fields=())]
+
+        counter = iter(range(size, size + ops))
+        results['vault.create'] = timed(lambda: vault.create_vault_entry(entity=vault_entity(next(counter))), ops)
+        results['vault.read_by_pk'] = timed(lambda: vault.read_vault_entry(pk=rnd.choice(pks)), ops)
+        results['vault.read_by_crit'] = timed(lambda: list(vault.read_vault_entries(rnd.randrange(USERS))), ops)
+        results['vault.update_by_ids'] = timed(lambda: vault.update_vault_entries(
+            update=VaultEntity(site='https://example.org'), pks=rnd.sample(pks, min(10, len(pks)))), ops)
+        # every call deletes the entries of another user
+        users = iter(rnd.sample(range(USERS), USERS))
+        results['vault.delete_by_crit'] = timed(
+            lambda: vault.delete_vault_entries(next(users)), min(ops, USERS))
+
+        counter = iter(range(ops))
+        results['master.create'] = timed(lambda: master.create_master_password(
+            MasterEntity(user=f'user-{next(counter)}', pw='gAAAAABk' * 8, salt='salt' * 4)), ops)
+        uids = [entity.id for entity in master.repo.find_all()]
+        results['master.read'] = timed(lambda: master.read_master_password(rnd.choice(uids)), ops)
+        close()
+    return results
+
+
+def flatten(backend: str, size: int, results: dict[str, dict[str, float]]) -> list[dict]:
+    return [{'backend': backend, 'size': size, 'operation': op, **result} for op, result in results.items()]
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    """
+    Returns the regressions: operations of the results slower than the same operation
+    (backend, size and operation) of the baseline by more than `threshold` (e.g. 0.25 for 25%).
+    """
+    baseline = {(r['backend'], r['size'], r['operation']): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get((result['backend'], result['size'], result['operation']), None)
+        if base is None:
+            continue
+        change = result['per_call'] / base['per_call'] - 1
+        if change > threshold:
+            regressions.append(
+                f'{result["backend"]} {result["size"]} records {result["operation"]}: '
+                f'{base["per_call"] * 1e3:.3f} ms -> {result["per_call"] * 1e3:.3f} ms (+{change:.0%})')
+    return regressions
+
+
+def main():
+    arg_parser = ArgumentParser('dbsupport')
+    arg_parser.add_argument(
+        '-s', '--sizes', nargs='*', type=int, default=[1000, 10000, 100000], help='number of records')
+    arg_parser.add_argument('-b', '--backends', nargs='*', default=list(BACKENDS), choices=list(BACKENDS))
+    arg_parser.add_argument('-n', '--ops', type=int, default=100, help='calls of each operation')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the random records and pks')
+    arg_parser.add_argument('-o', '--output', type=Path, default=None, help='writes the results as JSON')
+    arg_parser.add_argument('-c', '--compare', type=Path, default=None, help='baseline results (JSON) to compare to')
+    arg_parser.add_argument(
+        '-t', '--threshold', type=float, default=0.25, help='relative slowdown reported as regression')
+    args = arg_parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            backend_results = bench_backend(backend, size, args.ops, args.seed)
+            for op, result in backend_results.items():
+                print(
+                    f'{size:>7} records {backend:>5} {op:>20}: {result["per_call"] * 1e3:10.3f} ms/call '
+                    f'({result["calls"] / result["seconds"]:10.1f} calls/s)')
+            results.extend(flatten(backend, size, backend_results))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare is not None:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions compared to {args.compare} (threshold {args.threshold:.0%}).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Micro-benchmarks of the entity representation: construction, iteration and conversion to dict.
+A plain dict holding the same fields is measured as reference.
+
+Usage:
+    python -m benchmarks.entity_micro -n 100000
+"""
+import timeit
+from argparse import ArgumentParser
+
+from mypass.types import VaultEntity
+from mypass.utils import entity_as_dict
+
+FIELDS = dict(user='mypass-user', pw='gAAAAABk' * 8, salt='salt' * 4, site='https://example.com', _uid='uid')
+
+
+def cases():
+    entity = VaultEntity(1, **FIELDS)
+    data = dict(FIELDS)
+    return {
+        'construct': (lambda: VaultEntity(1, **FIELDS), lambda: dict(**FIELDS)),
+        'iterate': (lambda: list(entity.items()), lambda: list(data.items())),
+        'len': (lambda: len(entity), lambda: len(data)),
+        'entity_as_dict': (
+            lambda: entity_as_dict(entity, keep_id=True, remove_special=False),
+            lambda: {'_id': 1, **data}),
+    }
+
+
+def main():
+    arg_parser = ArgumentParser('entity-micro')
+    arg_parser.add_argument('-n', '--number', type=int, default=100000, help='number of runs per case')
+    args = arg_parser.parse_args()
+
+    for name, (entity_case, dict_case) in cases().items():
+        entity_time = min(timeit.repeat(entity_case, number=args.number, repeat=3))
+        dict_time = min(timeit.repeat(dict_case, number=args.number, repeat=3))
+        print(f'{name:>15}: {entity_time / args.number * 1e6:8.3f} us/op '
+              f'(plain dict {dict_time / args.number * 1e6:.3f} us/op)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compares serial and thread pool execution of the FileSystemDao batch operations.
+
+Usage:
+    python -m benchmarks.fs_parallel_io -s 1000 10000 100000 -w 8
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from mypass.db.fs import FileSystemDao
+from mypass.types.const import UID_FIELD
+
+OPERATIONS = ('read', 'find', 'update', 'delete')
+
+
+def populate(folder: Path, size: int) -> list[Path]:
+    dao = FileSystemDao()
+    paths = [folder / f'{i // 1000}' / f'{i}.json' for i in range(size)]
+    for i, path in enumerate(paths):
+        dao.create(path, {
+            UID_FIELD: i % 100, 'user': f'user-{i}', 'pw': 'gAAAAABk' * 8, 'site': 'https://example.com'})
+    return paths
+
+
+def bench(dao: FileSystemDao, paths: list[Path]) -> dict[str, float]:
+    timings = {}
+    start = time.perf_counter()
+    dao.read(paths)
+    timings['read'] = time.perf_counter() - start
+    start = time.perf_counter()
+    dao.find(paths, {UID_FIELD: 42})
+    timings['find'] = time.perf_counter() - start
+    start = time.perf_counter()
+    dao.update(paths, {'site': 'https://example.org'})
+    timings['update'] = time.perf_counter() - start
+    start = time.perf_counter()
+    dao.delete(paths)
+    timings['delete'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    arg_parser = ArgumentParser('fs-parallel-io')
+    arg_parser.add_argument(
+        '-s', '--sizes', nargs='*', type=int, default=[1000, 10000, 100000], help='number of records')
+    arg_parser.add_argument('-w', '--workers', type=int, default=8, help='thread pool size of the parallel mode')
+    args = arg_parser.parse_args()
+
+    for size in args.sizes:
+        for mode, max_workers in (('serial', None), ('parallel', args.workers)):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                paths = populate(Path(tmp_dir), size)
+                dao = FileSystemDao(max_workers=max_workers)
+                timings = bench(dao, paths)
+                dao.close()
+            rates = ', '.join(f'{op} {size / timings[op]:9.1f}/s' for op in OPERATIONS)
+            print(f'{size:>7} records {mode:>8} ({max_workers or 1} threads): {rates}')
+
+
+if __name__ == '__main__':
+    main()
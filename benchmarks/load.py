@@ -0,0 +1,322 @@
+"""
+Load test of the service: concurrent clients replaying a mix of api calls,
+reporting the throughput and the latency percentiles (p50/p95/p99) of every endpoint.
+
+By default, the application is served in this process by waitress (with `--threads` threads, as `service.run`)
+on top of a synthetic dataset (see `benchmarks.dataset`) in a temporary folder, and the clients call it over HTTP.
+With `--test-client`, the clients call the application through the Flask test client instead (no HTTP server),
+and with `--url`, they call an already running service (e.g. `python service.py -t 16`) with its own data.
+
+Every client logs in, then sends requests picked randomly from the mix until the duration is over,
+refreshing its access token with the refresh token (`auth.refresh` in the mix, and whenever it gets a 401).
+Entries are read, updated and deleted by their id and user, entries created by the client are the ones deleted.
+
+Usage:
+    python -m benchmarks.load -c 16 -t 8 -d 10 -b tiny -n 10000
+    python -m benchmarks.load -c 16 -d 10 --mix vault.read=80,vault.update=20
+    python -m benchmarks.load -c 16 -d 10 --url http://localhost:5758 -P api-key
+"""
+import http.client
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlsplit
+
+import waitress
+from waitress import wasyncore
+
+import service
+from benchmarks import dataset
+from mypass.types.const import ID_FIELD, UID_FIELD
+
+DEFAULT_MIX = {
+    'vault.read': 40,
+    'vault.read_crit': 10,
+    'vault.create': 10,
+    'vault.update': 15,
+    'vault.delete': 5,
+    'master.read': 10,
+    'master.create': 5,
+    'auth.refresh': 5,
+}
+
+# sends a request: method, path, json body and headers, returns the status and the json response
+Transport = Callable[[str, str, dict | None, dict], tuple[int, object]]
+
+
+def http_transport(url: str) -> Transport:
+    """Transport of a single client, keeping its connection alive between the requests."""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+
+    def send(method: str, path: str, body: dict | None, headers: dict) -> tuple[int, object]:
+        if body is not None:
+            headers = {'Content-Type': 'application/json', **headers}
+            body = json.dumps(body)
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        raw = response.read()
+        return response.status, json.loads(raw) if raw else None
+
+    return send
+
+
+def flask_transport(app) -> Transport:
+    client = app.test_client()
+
+    def send(method: str, path: str, body: dict | None, headers: dict) -> tuple[int, object]:
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+    return send
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """
+    Parses a mix of calls (e.g. `vault.read=80,vault.update=20`).
+
+    Raises:
+        ValueError: If a call is unknown, or its weight is not a number.
+    """
+    weights = {}
+    for item in mix.split(','):
+        call, weight = item.split('=')
+        if call not in DEFAULT_MIX:
+            raise ValueError(f'Unknown call "{call}", expected one of {", ".join(DEFAULT_MIX)}.')
+        weights[call] = float(weight)
+    return weights
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Stats:
+    """Latencies and errors of the calls, shared by the clients."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, call: str, latency: float, ok: bool):
+        with self._lock:
+            self.latencies[call].append(latency)
+            if not ok:
+                self.errors[call] += 1
+
+    def report(self, duration: float) -> dict[str, dict[str, float]]:
+        report = {}
+        for call, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            report[call] = {
+                'requests': len(latencies),
+                'errors': self.errors[call],
+                'throughput': len(latencies) / duration,
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1],
+            }
+        return report
+
+
+class Client:
+    """A user of the service, sending the calls of the mix one after the other."""
+
+    def __init__(
+            self,
+            send: Transport,
+            stats: Stats,
+            api_key: str | None,
+            entries: list[tuple[object, object]],
+            mix: dict[str, float],
+            seed: int
+    ):
+        self.send = send
+        self.stats = stats
+        self.api_key = api_key
+        self.entries = entries
+        self.calls, self.weights = list(mix), list(mix.values())
+        self.rnd = random.Random(seed)
+        self.created: list[tuple[object, object]] = []
+        self.access_token = self.refresh_token = None
+        self.seed = seed
+        self.masters = 0
+
+    def call(self, name: str, method: str, path: str, body: dict = None, token: str = None) -> tuple[int, object]:
+        headers = {'Authorization': f'Bearer {token or self.access_token}'} if (token or self.access_token) else {}
+        start = time.perf_counter()
+        status, response = self.send(method, path, body, headers)
+        self.stats.add(name, time.perf_counter() - start, status < 400)
+        return status, response
+
+    def login(self):
+        status, response = self.call('auth.login', 'POST', '/api/auth/login', {'pw': self.api_key or 'load'})
+        if status != 201:
+            raise RuntimeError(f'Login failed ({status}): {response}')
+        self.access_token, self.refresh_token = response['access_token'], response['refresh_token']
+
+    def refresh(self):
+        status, response = self.call('auth.refresh', 'POST', '/api/auth/refresh', token=self.refresh_token)
+        if status == 201:
+            self.access_token = response['access_token']
+        else:
+            self.login()
+
+    def vault_fields(self) -> dict:
+        return {'user': f'load-{self.rnd.randrange(1000)}', 'pw': f'gAAAAAB{self.rnd.getrandbits(256):064x}',
+                'site': 'https://example.com'}
+
+    def step(self):
+        name = self.rnd.choices(self.calls, weights=self.weights)[0]
+        if name == 'vault.delete' and not self.created:
+            name = 'vault.create'
+        pk, uid = self.rnd.choice(self.entries)
+        if name == 'auth.refresh':
+            return self.refresh()
+        if name == 'vault.read':
+            status, _ = self.call(name, 'POST', '/api/db/vault/read', {'id': pk, 'uid': uid})
+        elif name == 'vault.read_crit':
+            status, _ = self.call(name, 'POST', '/api/db/vault/read', {'uid': uid, 'crit': {}})
+        elif name == 'vault.create':
+            status, response = self.call(
+                name, 'POST', '/api/db/vault/create', {'uid': uid, 'fields': self.vault_fields()})
+            if status == 201:
+                self.created.append((response['id'], uid))
+        elif name == 'vault.update':
+            status, _ = self.call(
+                name, 'POST', '/api/db/vault/update', {'id': pk, 'uid': uid, 'fields': {'pw': 'gAAAAAB-updated'}})
+        elif name == 'vault.delete':
+            pk, uid = self.created.pop(self.rnd.randrange(len(self.created)))
+            status, _ = self.call(name, 'POST', '/api/db/vault/delete', {'id': pk, 'uid': uid})
+        elif name == 'master.read':
+            status, _ = self.call(name, 'POST', '/api/db/master/read', {'uid': uid})
+        else:
+            self.masters += 1
+            status, _ = self.call(name, 'POST', '/api/db/master/create', {
+                'user': f'load-{self.seed}-{self.masters}', 'token': 'token', 'pw': 'gAAAAAB-master', 'salt': 'salt'})
+        if status == 401:
+            self.refresh()
+
+    def run(self, deadline: float):
+        self.login()
+        while time.perf_counter() < deadline:
+            self.step()
+
+
+def fetch_entries(send: Transport, api_key: str | None) -> list[tuple[object, object]]:
+    """Ids and users of every vault entry of the service."""
+    status, response = send('POST', '/api/auth/login', {'pw': api_key or 'load'}, {})
+    if status != 201:
+        raise RuntimeError(f'Login failed ({status}): {response}')
+    headers = {'Authorization': f'Bearer {response["access_token"]}'}
+    status, response = send('POST', f'/api/db/vault/read?fields={UID_FIELD}', None, headers)
+    entries = [(entry[ID_FIELD], entry[UID_FIELD]) for entry in response if UID_FIELD in entry]
+    if not entries:
+        raise RuntimeError('The vault has no entries of any user, generate a dataset first (benchmarks.dataset).')
+    return entries
+
+
+def run_load(
+        new_transport: Callable[[], Transport],
+        clients: int,
+        duration: float,
+        mix: dict[str, float],
+        api_key: str = None,
+        seed: int = 0
+) -> dict[str, dict[str, float]]:
+    """
+    Runs the clients concurrently for `duration` seconds.
+
+    Returns:
+        dict[str, dict[str, float]]: Requests, errors, throughput (requests per second)
+            and latency percentiles (seconds) of every call.
+    """
+    entries = fetch_entries(new_transport(), api_key)
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=Client(new_transport(), stats, api_key, entries, mix, seed + i).run, args=(deadline,))
+        for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.perf_counter() - start)
+
+
+def main():
+    arg_parser = ArgumentParser('load')
+    arg_parser.add_argument('-c', '--clients', type=int, default=8, help='number of concurrent clients')
+    arg_parser.add_argument('-d', '--duration', type=float, default=10.0, help='seconds of the run')
+    arg_parser.add_argument('-t', '--threads', type=int, default=service.THREADS, help='waitress threads')
+    arg_parser.add_argument('-b', '--backend', choices=list(dataset.BACKENDS), default='tiny')
+    arg_parser.add_argument('-n', '--size', type=int, default=10000, help='number of vault entries of the dataset')
+    arg_parser.add_argument('-u', '--users', type=int, default=100, help='number of users of the dataset')
+    arg_parser.add_argument(
+        '-m', '--mix', type=parse_mix, default=DEFAULT_MIX,
+        help=f'weights of the calls, defaults to {",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())}')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the dataset and of the clients')
+    arg_parser.add_argument(
+        '--test-client', action='store_true', default=False, help='calls the application without an HTTP server')
+    arg_parser.add_argument('--url', type=str, default=None, help='url of a running service to load')
+    arg_parser.add_argument('-P', '--api-key', type=str, default=None, help='api key of the service')
+    arg_parser.add_argument('-o', '--output', type=Path, default=None, help='writes the results as JSON')
+    args = arg_parser.parse_args()
+    # the queue depth is reported on every request once the clients outnumber the threads
+    logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+
+    if args.url is not None:
+        report = run_load(
+            lambda: http_transport(args.url), args.clients, args.duration, args.mix, args.api_key, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / ('db.json' if args.backend == 'tiny' else 'db')
+            master_repo, vault_repo, close = dataset.BACKENDS[args.backend](path, 'json')
+            dataset.write(master_repo, vault_repo, dataset.generate(args.size, args.users, seed=args.seed), args.seed)
+            app = service.create_app(master_repo, vault_repo, api_key=args.api_key)
+            if args.test_client:
+                report = run_load(
+                    lambda: flask_transport(app), args.clients, args.duration, args.mix, args.api_key, args.seed)
+            else:
+                server = waitress.create_server(app, host='127.0.0.1', port=0, threads=args.threads)
+                server_thread = threading.Thread(target=server.run, name='waitress')
+                server_thread.start()
+                url = f'http://127.0.0.1:{server.effective_port}'
+                try:
+                    report = run_load(
+                        lambda: http_transport(url), args.clients, args.duration, args.mix, args.api_key, args.seed)
+                finally:
+                    # waits for the running tasks, then the sockets are closed by the loop thread (not while it
+                    # selects on them), the loop returns once its map is empty
+                    server.task_dispatcher.shutdown()
+                    server.trigger.pull_trigger(lambda: wasyncore.close_all(server._map))
+                    server_thread.join()
+            close()
+
+    total = sum(result['requests'] for result in report.values())
+    served = 'external service' if args.url else 'test client' if args.test_client else f'{args.threads} threads'
+    print(f'{total} requests in {args.duration:.1f} s ({total / args.duration:.1f} requests/s), '
+          f'{args.clients} clients, {served}')
+    for call, result in report.items():
+        print(
+            f'{call:>16}: {result["requests"]:7} requests ({result["errors"]} errors) '
+            f'{result["throughput"]:9.1f}/s, p50 {result["p50"] * 1e3:8.2f} ms, '
+            f'p95 {result["p95"] * 1e3:8.2f} ms, p99 {result["p99"] * 1e3:8.2f} ms, max {result["max"] * 1e3:8.2f} ms')
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
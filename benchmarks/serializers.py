@@ -0,0 +1,82 @@
+"""
+Compares the serialization formats of the database files on vault data:
+parse and dump throughput, and the size of the serialized data.
+Every format is measured on a whole TinyDB database (a single file of every entry),
+and on separate entries (a file per entry, as written by the FileSystemDao).
+
+Usage:
+    python -m benchmarks.serializers -s 1000 10000 100000 -r 3
+"""
+import time
+from argparse import ArgumentParser
+
+from mypass.db.serializers import available_formats, get_serializer
+from mypass.types.const import UID_FIELD
+
+
+def vault_entries(size: int) -> dict[str, dict]:
+    return {
+        str(i): {
+            UID_FIELD: i % 100,
+            'user': f'user-{i}@example.com',
+            'pw': 'gAAAAABk' + f'{i:08x}' * 12,
+            'site': f'https://site-{i % 500}.example.com/login',
+            'tags': ['work', 'mail'] if i % 3 else [],
+            'notes': None if i % 5 else f'rotated on 2023-06-{i % 28 + 1:02d}',
+        }
+        for i in range(1, size + 1)}
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_database(serializer, entries: dict[str, dict], repeat: int) -> dict[str, float]:
+    data = {'vault': entries}
+    raw = serializer.dumps(data)
+    return {
+        'dump': best_of(repeat, lambda: serializer.dumps(data)),
+        'parse': best_of(repeat, lambda: serializer.loads(raw)),
+        'size': len(raw),
+    }
+
+
+def bench_files(serializer, entries: dict[str, dict], repeat: int) -> dict[str, float]:
+    documents = list(entries.values())
+    raws = [serializer.dumps(document) for document in documents]
+    return {
+        'dump': best_of(repeat, lambda: [serializer.dumps(document) for document in documents]),
+        'parse': best_of(repeat, lambda: [serializer.loads(raw) for raw in raws]),
+        'size': sum(len(raw) for raw in raws),
+    }
+
+
+def main():
+    arg_parser = ArgumentParser('serializers')
+    arg_parser.add_argument('-s', '--sizes', nargs='*', type=int, default=[1000, 10000], help='number of records')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=3, help='runs of each measurement, the best is kept')
+    arg_parser.add_argument(
+        '-f', '--formats', nargs='*', default=None, help='formats to compare, defaults to every available format')
+    args = arg_parser.parse_args()
+
+    formats = args.formats if args.formats is not None else available_formats()
+    for size in args.sizes:
+        entries = vault_entries(size)
+        for layout, bench in (('database', bench_database), ('files', bench_files)):
+            for name in formats:
+                result = bench(get_serializer(name), entries, args.repeat)
+                megabytes = result['size'] / 1e6
+                print(
+                    f'{size:>7} records {layout:>8} {name:>15}: '
+                    f'dump {megabytes / result["dump"]:7.1f} MB/s ({size / result["dump"]:10.1f} records/s), '
+                    f'parse {megabytes / result["parse"]:7.1f} MB/s ({size / result["parse"]:10.1f} records/s), '
+                    f'size {megabytes:8.2f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares insert throughput of the TinyDb dao modes with concurrent writers.
+
+Usage:
+    python -m benchmarks.tiny_group_commit -n 2000 -t 8
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mypass.db.tiny import TinyDao, LogStorage
+from mypass.db.tiny.dao import close_persistent_connections
+
+MODES = {
+    'per-operation': dict(),
+    'persistent': dict(persistent=True),
+    'group-commit': dict(group_commit=dict(max_latency=0.005, max_batch=128)),
+    'group-commit-nofsync': dict(group_commit=dict(max_latency=0.005, max_batch=128), fsync=False),
+    'log': dict(persistent=True, storage=LogStorage),
+    'log-nofsync': dict(persistent=True, storage=LogStorage, fsync=False),
+}
+
+
+def bench_inserts(mode: str, n: int, threads: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dao = TinyDao('vault', path=Path(tmp_dir) / 'db.json', **MODES[mode])
+        entity = dict(user='mypass-user', pw='gAAAAABk' * 8, salt='salt' * 4, site='https://example.com')
+        start = time.perf_counter()
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(lambda _: dao.create(entity), range(n)))
+        else:
+            for _ in range(n):
+                dao.create(entity)
+        elapsed = time.perf_counter() - start
+        close_persistent_connections()
+    return n / elapsed
+
+
+def main():
+    arg_parser = ArgumentParser('tiny-group-commit')
+    arg_parser.add_argument('-n', '--inserts', type=int, default=2000, help='number of inserts per mode')
+    arg_parser.add_argument('-t', '--threads', type=int, default=8, help='number of concurrent writers')
+    arg_parser.add_argument('-m', '--modes', nargs='*', default=list(MODES), choices=list(MODES))
+    args = arg_parser.parse_args()
+
+    for mode in args.modes:
+        # the per-operation mode is not thread safe, it runs with a single writer
+        threads = 1 if mode == 'per-operation' else args.threads
+        rate = bench_inserts(mode, args.inserts, threads)
+        print(f'{mode:>22}: {rate:10.1f} inserts/s ({args.inserts} inserts, {threads} threads)')
+
+
+if __name__ == '__main__':
+    main()
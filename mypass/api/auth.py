@@ -5,25 +5,28 @@ import flask
 from flask import Blueprint, request
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 
-from mypass.persistence.blacklist.memory import blacklist
 from mypass.utils import hash_fn
+from mypass.utils.hooks import get_blacklist
+
+logger = logging.getLogger(__name__)
 
 AuthApi = Blueprint('auth', __name__)
 
 
 @AuthApi.route('/api/auth/login', methods=['POST'])
 def login():
-    logging.getLogger().debug(f'Signing in user with\n    {request.json}')
+    logger.debug(f'Signing in user with\n    {request.json}')
     son = request.json
     pw = son['pw']
     key = flask.current_app.config['API_KEY']
     if key is None or hash_fn(pw) == key:
-        logging.getLogger().debug('Clearing blacklists.')
-        blacklist.clear()
-        logging.getLogger().debug('Creating fresh access token.')
+        # revoked tokens stay revoked until they expire (the blacklist is shared by every user and process)
+        logger.debug('Purging expired tokens of the blacklist.')
+        get_blacklist().purge()
+        logger.debug('Creating fresh access token.')
         access_token = create_access_token(identity=pw, fresh=True)
         refresh_token = create_refresh_token(identity=pw)
-        logging.getLogger().debug(
+        logger.debug(
             f'Returning access and refresh tokens\n    {dict(access_token="*****", refresh_token="*****")}')
         return {'access_token': access_token, 'refresh_token': refresh_token}, 201
     return {'msg': 'NOT AUTHORIZED :: Wrong password provided. Use the secret api key you provided.'}, 401
@@ -33,9 +36,9 @@ def login():
 @jwt_required(refresh=True, optional=bool(int(os.environ.get('MYPASS_OPTIONAL_JWT_CHECKS', 0))))
 def refresh():
     pw = get_jwt_identity()
-    logging.getLogger().debug('Creating non-fresh access token.')
+    logger.debug('Creating non-fresh access token.')
     access_token = create_access_token(identity=pw, fresh=False)
-    logging.getLogger().debug(
+    logger.debug(
         f'Returning access token\n    {dict(access_token="*****")}')
     return {'access_token': access_token}, 201
 
@@ -43,11 +46,13 @@ def refresh():
 @AuthApi.route('/api/auth/logout', methods=['DELETE'])
 @jwt_required(optional=True)
 def logout():
-    logging.getLogger().debug('Logging out user.')
+    logger.debug('Logging out user.')
     try:
-        jti = get_jwt()['jti']
-        logging.getLogger().debug(f'Blacklisting token: {jti}.')
-        blacklist.add(jti)
+        claims = get_jwt()
+        jti = claims['jti']
+        logger.debug(f'Blacklisting token: {jti}.')
+        # the token is forgotten once it expires, it is rejected as expired from then on
+        get_blacklist().add(jti, exp=claims.get('exp', None))
         return '', 204
     except KeyError:
         return '', 409
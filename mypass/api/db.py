@@ -10,7 +10,9 @@ from mypass import utils
 from mypass.db import MasterDbSupport, VaultDbSupport
 from mypass.exceptions import MasterPasswordExistsError, MultipleMasterPasswordsError, EmptyRecordInsertionError, \
     RecordNotFoundError
-from mypass.types import MasterEntity, VaultEntity
+from mypass.types import MasterEntity, VaultEntity, const
+
+logger = logging.getLogger(__name__)
 
 # TODO: Should all _write_ endpoints need fresh=True token?
 DbApi = Blueprint('db', __name__)
@@ -40,17 +42,71 @@ def record_not_found_handler(err):
     return {'msg': f'{err.__class__.__name__} :: {err}'}, 404
 
 
+def _is_stream_requested(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _stream_entities(entities):
+    """Streams the entities as a JSON array, converting and serializing one entity at a time."""
+    chunks = utils.iter_json_array(entities, keep_id=True, remove_special=False, dumps=flask.current_app.json.dumps)
+    return flask.Response(chunks, status=200, mimetype='application/json')
+
+
+def _parse_page(params, id_cls):
+    """
+    Returns the `limit` and `cursor` parameters of a paged read.
+    Cursors coming from a query string are converted to the id type of the repository.
+
+    Raises:
+        ValueError: If limit is not a positive integer, or the cursor is not a valid id.
+    """
+    limit, cursor = params.get('limit', None), params.get('cursor', None)
+    if limit is not None:
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError(f'Parameter limit should be a positive integer, got {limit}.')
+    if isinstance(cursor, str) and id_cls is int:
+        cursor = int(cursor)
+    return limit, cursor
+
+
+def _parse_fields(fields):
+    """
+    Returns the projected fields as a list, accepting a list of strings, or a comma separated string.
+
+    Raises:
+        ValueError: If fields is neither a list of strings nor a string.
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        return [field for field in fields.split(',') if field]
+    if isinstance(fields, list) and all(isinstance(field, str) for field in fields):
+        return fields
+    raise ValueError(f'Parameter fields should be a list of field names, got {fields}.')
+
+
+def _page_response(entities, limit):
+    """The items of the page, and the cursor of the next page (None, if this is the last page)."""
+    entities = list(entities)
+    next_cursor = entities[-1].id if limit is not None and len(entities) >= limit else None
+    items = utils.entities_as_dict(entities, keep_id=True, remove_special=False)
+    return {'items': items, 'next_cursor': next_cursor}, 200
+
+
 @DbApi.route('/api/db/master/create', methods=['POST'])
 @jwt_required(optional=bool(int(os.environ.get('MYPASS_OPTIONAL_JWT_CHECKS', 0))))
 def create_master_pw():
     controller: MasterDbSupport = flask.current_app.config['master_controller']
     request_obj = dict(request.json)
-    logging.getLogger().debug(f'Creating master password with params\n    {request_obj}')
+    logger.debug(f'Creating master password with params\n    {request_obj}')
     entity_id = request_obj.get('id', None)
     user, token, pw, salt = request_obj['user'], request_obj['token'], request_obj['pw'], request_obj['salt']
     entity = MasterEntity(entity_id, user=user, token=token, pw=pw, salt=salt)
     entity_id = controller.create_master_password(entity)
-    logging.getLogger().debug(f'Created master password with id: {entity_id}')
+    logger.debug(f'Created master password with id: {entity_id}')
     return {'id': entity_id}, 201
 
 
@@ -59,7 +115,7 @@ def create_master_pw():
 def query_master_pw():
     controller: MasterDbSupport = flask.current_app.config['master_controller']
     request_obj = dict(request.json)
-    logging.getLogger().debug(f'Reading master password with params\n    {request_obj}')
+    logger.debug(f'Reading master password with params\n    {request_obj}')
     user = request_obj.get('user', None)
     uid = request_obj.get('uid', None)
     if user is None and uid is None:
@@ -68,7 +124,7 @@ def query_master_pw():
     if uid is None:
         uid = user
     pw = controller.read_master_password(uid)
-    logging.getLogger().debug(f'Read master password: {pw}')
+    logger.debug(f'Read master password: {pw}')
     return {'pw': pw}, 200
 
 
@@ -76,11 +132,11 @@ def query_master_pw():
 @jwt_required(optional=bool(int(os.environ.get('MYPASS_OPTIONAL_JWT_CHECKS', 0))))
 def update_master_pw():
     controller: MasterDbSupport = flask.current_app.config['master_controller']
-    logging.getLogger().debug(f'Updating master password with params\n    {request.json}')
+    logger.debug(f'Updating master password with params\n    {request.json}')
     uid, token, pw, salt = request.json['uid'], request.json['token'], request.json['pw'], request.json['salt']
     update = MasterEntity(token=token, pw=pw, salt=salt)
     entity_id = controller.update_master_password(uid, update)
-    logging.getLogger().debug(f'Updated master password with id: {entity_id}')
+    logger.debug(f'Updated master password with id: {entity_id}')
     return {'id': entity_id}, 200
 
 
@@ -89,7 +145,7 @@ def update_master_pw():
 def new_vault_entry():
     controller: VaultDbSupport = flask.current_app.config['vault_controller']
     request_obj = dict(request.json)
-    logging.getLogger().debug(f'Creating password inside user vault with params\n    {request_obj}')
+    logger.debug(f'Creating password inside user vault with params\n    {request_obj}')
     entity_id = request_obj.get('id', None)
     uid = request_obj.get('uid', None)
     fields = request_obj.get('fields', None)
@@ -97,10 +153,24 @@ def new_vault_entry():
         fields = fields.copy()
     entity = VaultEntity(entity_id, **fields)
     entity_id = controller.create_vault_entry(uid, entity=entity)
-    logging.getLogger().debug(f'Created password inside vault with id: {entity_id}')
+    logger.debug(f'Created password inside vault with id: {entity_id}')
     return {'id': entity_id}, 201
 
 
+@DbApi.route('/api/db/vault/create_many', methods=['POST'])
+@jwt_required(optional=bool(int(os.environ.get('MYPASS_OPTIONAL_JWT_CHECKS', 0))))
+def new_vault_entries():
+    controller: VaultDbSupport = flask.current_app.config['vault_controller']
+    request_obj = dict(request.json)
+    uid = request_obj.get('uid', None)
+    entries = request_obj.get('entries', [])
+    logger.debug(f'Creating {len(entries)} passwords inside user vault')
+    entities = [VaultEntity(entry.get('id', None), **entry.get('fields', {})) for entry in entries]
+    entity_ids = controller.create_vault_entries(uid, entities=entities)
+    logger.debug(f'Created passwords inside vault with ids: {entity_ids}')
+    return {'_ids': entity_ids}, 201
+
+
 @DbApi.route('/api/db/vault/read', methods=['POST'])
 @jwt_required(optional=bool(int(os.environ.get('MYPASS_OPTIONAL_JWT_CHECKS', 0))))
 def query_vault_entry():
@@ -111,17 +181,43 @@ def query_vault_entry():
         pks = request_obj.get('ids', None)
         uid = request_obj.get('uid', None)
         crit = request_obj.get('crit', None)
+        stream = _is_stream_requested(request_obj.get('stream', request.args.get('stream', False)))
+        try:
+            fields = _parse_fields(request_obj.get('fields', None))
+        except ValueError as e:
+            return {'msg': f'BAD REQUEST :: {e}'}, 400
 
         if pk is not None:
             entity = controller.read_vault_entry(uid, crit=crit, pk=pk)
             entity_dict = utils.entity_as_dict(entity, keep_id=True, remove_special=False)
+            if fields is not None:
+                entity_dict = utils.project_fields(entity_dict, [const.ID_FIELD, *fields])
             return entity_dict, 200
+        if 'limit' in request_obj or 'cursor' in request_obj:
+            try:
+                limit, cursor = _parse_page(request_obj, controller.repo.id_cls)
+            except (TypeError, ValueError) as e:
+                return {'msg': f'BAD REQUEST :: {e}'}, 400
+            entities = controller.read_vault_entries(
+                uid, crit=crit, pks=pks, limit=limit, cursor=cursor, fields=fields)
+            return _page_response(entities, limit)
         if pks is not None or crit is not None:
-            entities = controller.read_vault_entries(uid, crit=crit, pks=pks)
+            if stream:
+                return _stream_entities(controller.iter_vault_entries(uid, crit=crit, pks=pks, fields=fields))
+            entities = controller.read_vault_entries(uid, crit=crit, pks=pks, fields=fields)
             entities_dict = utils.entities_as_dict(entities, keep_id=True, remove_special=False)
             return entities_dict, 200
     except UnsupportedMediaType:
-        entities = controller.read_vault_entries()
+        fields = _parse_fields(request.args.get('fields', None))
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit, cursor = _parse_page(request.args, controller.repo.id_cls)
+            except (TypeError, ValueError) as e:
+                return {'msg': f'BAD REQUEST :: {e}'}, 400
+            return _page_response(controller.read_vault_entries(limit=limit, cursor=cursor, fields=fields), limit)
+        if _is_stream_requested(request.args.get('stream', False)):
+            return _stream_entities(controller.iter_vault_entries(fields=fields))
+        entities = controller.read_vault_entries(fields=fields)
         entities_dict = utils.entities_as_dict(entities, keep_id=True, remove_special=False)
         return entities_dict, 200
 
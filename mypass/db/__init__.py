@@ -1,2 +1,2 @@
-from .utils import create_query, MasterDbSupport, VaultDbSupport
+from .utils import create_query, Query, MasterDbSupport, VaultDbSupport
 from .repository import CrudRepository
@@ -1,3 +1,4 @@
 from ._impl import MasterFileSystemRepository, VaultFileSystemRepository
 from .dao import FileSystemDao
+from .index import FileSystemIndex
 from .repository import FileSystemRepository
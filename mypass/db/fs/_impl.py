@@ -1,10 +1,10 @@
-from mypass.types import MasterEntity, VaultEntity
+from mypass.types import MasterEntity, VaultEntity, const
 from .repository import FileSystemRepository
 
 
 class MasterFileSystemRepository(FileSystemRepository[str, MasterEntity]):
-    pass
+    indexes = ('user',)
 
 
 class VaultFileSystemRepository(FileSystemRepository[str, VaultEntity]):
-    pass
+    indexes = (const.UID_FIELD,)
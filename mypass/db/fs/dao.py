@@ -1,21 +1,35 @@
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from os import PathLike
 from pathlib import Path
-from typing import Iterable, Mapping, Any, Type
+from typing import Iterable, Mapping, Any, Type, Callable
 
+from mypass.db.serializers import Serializer, JsonSerializer
+from mypass.db.utils import Query
 from mypass.types import op
+from mypass.utils import project_fields
+
+
+# format of the files, unless a dao is configured with another serializer
+DEFAULT_SERIALIZER = JsonSerializer()
 
 
 def is_subset(dict1, dict2):
     return all(item in dict2.items() for item in dict1.items())
 
 
-def read(path: str | PathLike, into: Type[Mapping] = None) -> Mapping[str, Any]:
-    with open(path, 'r') as f:
-        ret: dict[str, Any] = json.load(f)
-        assert isinstance(ret, dict), 'The loaded JSON data is not a dictionary.'
+def read(
+        path: str | PathLike,
+        into: Type[Mapping] = None,
+        fields: Iterable[str] = None,
+        serializer: Serializer = None
+) -> Mapping[str, Any]:
+    with open(path, 'rb') as f:
+        ret: dict[str, Any] = (serializer or DEFAULT_SERIALIZER).loads(f.read())
+        assert isinstance(ret, dict), 'The loaded data is not a dictionary.'
+    ret = project_fields(ret, fields)
     if into:
-        ret = into(path, **ret)
+        ret = into(str(path), **ret)
     return ret
 
 
@@ -24,10 +38,49 @@ def find_all_files(path: str | PathLike):
     return [file for file in path_obj.rglob('*') if file.is_file()]
 
 
-def find_files_by_crit(paths: Iterable[str | PathLike], crit: Mapping):
-    data = (read(path) for path in paths)
-
-    return [path for path, data in data if is_subset(crit, data)]
+def _read_documents(paths: list, serializer: Serializer | None, mapper: Callable) -> Iterable[Mapping[str, Any]]:
+    return mapper(lambda path: read(path, serializer=serializer), paths)
+
+
+def find_files_by_crit(
+        paths: Iterable[str | PathLike],
+        crit: Mapping | Query,
+        serializer: Serializer = None,
+        mapper: Callable = map
+):
+    """
+    Returns the files matching the criteria. Files are read by `mapper` (`map` or a parallel equivalent),
+    which should keep the order of the paths.
+    """
+    query = crit if isinstance(crit, Query) else Query(crit, 'and')
+    paths = list(paths)
+    query.record_plan('scan', examined=len(paths))
+    documents = _read_documents(paths, serializer, mapper)
+    return [path for path, doc in zip(paths, documents) if query(doc)]
+
+
+def find_documents_by_crit(
+        paths: Iterable[str | PathLike],
+        crit: Mapping | Query,
+        into: Type[Mapping] = None,
+        fields: Iterable[str] = None,
+        serializer: Serializer = None,
+        mapper: Callable = map
+):
+    """
+    Reads every file once (with `mapper`, as `find_files_by_crit`), and returns the content
+    of the files matching the criteria, projected to the given fields (if any).
+    """
+    query = crit if isinstance(crit, Query) else Query(crit, 'and')
+    paths = list(paths)
+    query.record_plan('scan', examined=len(paths))
+    documents = _read_documents(paths, serializer, mapper)
+    return [_into(path, doc, into, fields) for path, doc in zip(paths, documents) if query(doc)]
+
+
+def _into(path: str | PathLike, document: Mapping, into: Type[Mapping] | None, fields: Iterable[str] | None):
+    document = project_fields(document, fields)
+    return into(str(path), **document) if into else document
 
 
 def delete(path: str | PathLike, secure=False):
@@ -42,70 +95,140 @@ def delete(path: str | PathLike, secure=False):
     return False
 
 
-def write(path: str | PathLike, data: Mapping, overwrite=False):
+def write(path: str | PathLike, data: Mapping, overwrite=False, serializer: Serializer = None):
     path = Path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
 
     if not overwrite and path.is_file():
         raise FileExistsError(f'File {path.absolute()} already exists and parameter overwrite is False.')
 
-    with open(path, 'w') as f:
-        return json.dump(dict(data), f)
+    serialized = (serializer or DEFAULT_SERIALIZER).dumps(dict(data))
+    with open(path, 'wb') as f:
+        f.write(serialized)
+    return True
 
 
-def update(path: str | PathLike, new: Mapping):
+def update(path: str | PathLike, new: Mapping, serializer: Serializer = None):
     path = Path(path)
-    curr = read(path)
+    curr = read(path, serializer=serializer)
     curr.update(new)
     curr = {k: v for k, v in curr.items() if v != op.DEL}
 
-    return write(path, curr, overwrite=True)
+    return write(path, curr, overwrite=True, serializer=serializer)
 
 
-def update_by_crit(path, crit, data):
+def update_by_crit(path, crit, data, serializer: Serializer = None):
     all_file = find_all_files(path)
-    files_to_update = find_files_by_crit(all_file, crit=crit)
+    files_to_update = find_files_by_crit(all_file, crit=crit, serializer=serializer)
     for file in files_to_update:
-        update(file, data)
+        update(file, data, serializer=serializer)
 
 
 class FileSystemDao:
+    """
+    Reads and writes files in the format of its serializer (JSON by default).
+
+    Batch methods (`read`, `find`, `find_documents`, `update` and `delete`) process the files one by one,
+    or, if `max_workers` is greater than one, in a thread pool of that size.
+    Results of the batch methods keep the order of the given paths in both modes.
+    """
+
+    def __init__(self, max_workers: int = None, serializer: Serializer = None):
+        """
+        Parameters:
+            max_workers (int): Number of threads processing the files of batch operations.
+                None, 0 or 1 means serial processing. Defaults to None.
+            serializer (Serializer): Format of the files, defaults to JSON.
+        """
+        self.max_workers = max_workers
+        self.serializer = serializer if serializer is not None else DEFAULT_SERIALIZER
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def parallel(self) -> bool:
+        return self.max_workers is not None and self.max_workers > 1
+
+    def _map(self, fn: Callable, *iterables: Iterable) -> list:
+        if not self.parallel:
+            return list(map(fn, *iterables))
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fs-dao')
+        # waits for every task, even if one fails, so no write is still running when the error is raised
+        futures = [self._executor.submit(fn, *args) for args in zip(*iterables)]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Shuts down the thread pool (if any), it is started again by the next batch operation."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
 
     def create(self, path: str | PathLike[str], data: Mapping):
-        return write(path, data, overwrite=False)
+        return write(path, data, overwrite=False, serializer=self.serializer)
 
-    def read_one(self, path: str | PathLike[str], into: Type[Mapping] | None = None):
-        return read(path, into=into)
+    def create_many(self, paths: Iterable[str | PathLike[str]], data: Iterable[Mapping]):
+        return self._map(lambda path, document: self.create(path, document), paths, data)
 
-    def read(self, paths: Iterable[str | PathLike[str]], into: Type[Mapping] | None = None):
-        return [self.read_one(path, into=into) for path in paths]
+    def read_one(
+            self, path: str | PathLike[str], into: Type[Mapping] | None = None, fields: Iterable[str] = None):
+        return read(path, into=into, fields=fields, serializer=self.serializer)
+
+    def read(
+            self,
+            paths: Iterable[str | PathLike[str]],
+            into: Type[Mapping] | None = None,
+            fields: Iterable[str] = None
+    ):
+        if fields is not None:
+            fields = tuple(fields)
+        return self._map(lambda path: self.read_one(path, into=into, fields=fields), paths)
 
     def find_all_files(self, folder: str | PathLike):
         return find_all_files(folder)
 
-    def find(self, paths: Iterable[str | PathLike], crit: Mapping):
-        return find_files_by_crit(paths, crit=crit)
-
-    def find_in_folder(self, folder: str | PathLike, crit: Mapping):
+    @property
+    def _mapper(self) -> Callable:
+        # serial scans read the files lazily, so only the matching documents are kept in memory
+        return self._map if self.parallel else map
+
+    def find(self, paths: Iterable[str | PathLike], crit: Mapping | Query):
+        return find_files_by_crit(paths, crit=crit, serializer=self.serializer, mapper=self._mapper)
+
+    def find_documents(
+            self,
+            paths: Iterable[str | PathLike],
+            crit: Mapping | Query,
+            into: Type[Mapping] | None = None,
+            fields: Iterable[str] = None
+    ):
+        if fields is not None:
+            fields = tuple(fields)
+        return find_documents_by_crit(
+            paths, crit=crit, into=into, fields=fields, serializer=self.serializer, mapper=self._mapper)
+
+    def find_in_folder(self, folder: str | PathLike, crit: Mapping | Query):
         return self.find(self.find_all_files(folder), crit=crit)
 
     def update_one(self, path: str | PathLike[str], data: Mapping):
-        return update(path, data)
+        return update(path, data, serializer=self.serializer)
 
     def update(self, paths: Iterable[str | PathLike[str]], data: Mapping):
-        return [self.update_one(path, data) for path in paths]
+        return self._map(lambda path: self.update_one(path, data), paths)
 
     def delete_one(self, path: str | PathLike[str], secure=False):
         return delete(path, secure=secure)
 
     def delete(self, paths: Iterable[str | PathLike[str]], secure=False):
-        return [self.delete_one(path, secure=secure) for path in paths]
+        return self._map(lambda path: self.delete_one(path, secure=secure), paths)
 
     def delete_all(self, folder: str | PathLike, secure=False, delete_directories=True):
         folder = Path(folder)
-        for file_path in folder.glob('*'):
-            if file_path.is_file():
-                delete(file_path, secure=secure)
+        self.delete([file_path for file_path in folder.glob('*') if file_path.is_file()], secure=secure)
 
         if delete_directories:
             for file_path in folder.glob('*'):
@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+from os import PathLike
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Callable, Any
+
+from .dao import read
+
+INDEX_VERSION = 2
+
+
+def _normalize(value):
+    # values equal in Python (as compared by the queries) get the same key: True == 1 == 1.0
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def value_key(value) -> str:
+    """
+    Canonical string form of a JSON value, used as key of the inverted index.
+    Values equal to each other (e.g. `1`, `1.0` and `True`) have the same key.
+    """
+    return json.dumps(_normalize(value), sort_keys=True)
+
+
+class FileSystemIndex:
+    """
+    Persistent inverted index (field -> value -> paths) of a file system repository.
+
+    The index is stored next to the root folder (`<root>.index.json`), together with
+    the modification time and size of every indexed file. On load, the folder is walked once,
+    and only the files changed since the index was saved are parsed again.
+    Changes made while the index is loaded should be reported through `refresh` and `discard`,
+    they are appended to a log (`<root>.index.json.log`), so a write costs the same whatever the size of the index.
+    The log is replayed on load, and compacted into the index once it has as many records as the index has files
+    (at least `compact_threshold`), and on `close`. Changes missing from the log (e.g. after a crash)
+    are found by the modification time check of the load.
+    """
+
+    def __init__(
+            self,
+            root_folder: str | PathLike,
+            fields: Iterable[str],
+            index_path: str | PathLike = None,
+            reader: Callable[[Path], Mapping[str, Any]] = read,
+            compact_threshold: int = 1000
+    ):
+        """
+        Parameters:
+            root_folder (str | PathLike): Root folder of the repository.
+            fields (Iterable[str]): Indexed fields.
+            index_path (str | PathLike): Path of the index file, defaults to `<root_folder>.index.json`.
+            reader (Callable): Function loading the content of a file.
+            compact_threshold (int): Minimum number of log records before the log is compacted into the index.
+        """
+        self.root_folder = Path(root_folder).absolute()
+        self.fields = tuple(fields)
+        if index_path is None:
+            index_path = self.root_folder.with_name(f'{self.root_folder.name}.index.json')
+        self.path = Path(index_path)
+        self.log_path = self.path.with_name(f'{self.path.name}.log')
+        self.compact_threshold = compact_threshold
+        self._reader = reader
+        self._logged = 0
+        self._lock = threading.RLock()
+        self._files: dict[str, dict] = {}
+        self._values: dict[str, dict[str, set[str]]] = {field: {} for field in self.fields}
+        self.load()
+
+    def _key(self, path: str | PathLike) -> str:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.root_folder / path
+        return path.relative_to(self.root_folder).as_posix()
+
+    def _add(self, key: str, entry: dict):
+        self._files[key] = entry
+        for field, value in entry['values'].items():
+            self._values[field].setdefault(value, set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self._files.pop(key, None)
+        if entry is None:
+            return
+        for field, value in entry['values'].items():
+            keys = self._values[field][value]
+            keys.discard(key)
+            if not keys:
+                del self._values[field][value]
+
+    def _index_file(self, key: str, stat: os.stat_result = None):
+        path = self.root_folder / key
+        try:
+            if stat is None:
+                stat = path.stat()
+            data = self._reader(path)
+        except (FileNotFoundError, ValueError, AssertionError):
+            # missing and malformed files are not indexed
+            self._remove(key)
+            return
+        self._remove(key)
+        values = {field: value_key(data[field]) for field in self.fields if field in data}
+        self._add(key, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'values': values})
+
+    def _replay(self) -> int:
+        replayed = 0
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last record of a crashed process might be incomplete
+                        break
+                    self._remove(record['key'])
+                    if record['entry'] is not None:
+                        self._add(record['key'], record['entry'])
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        return replayed
+
+    def _append(self, keys: Iterable[str]):
+        lines = [json.dumps({'key': key, 'entry': self._files.get(key, None)}) + '\n' for key in keys]
+        if not lines:
+            return
+        with open(self.log_path, 'a') as f:
+            f.writelines(lines)
+        self._logged += len(lines)
+        if self._logged >= max(self.compact_threshold, len(self._files)):
+            self.save()
+
+    def load(self):
+        """Loads the saved index and its log, and updates it with the changes of the folder."""
+        with self._lock:
+            self._files.clear()
+            for values in self._values.values():
+                values.clear()
+            saved = None
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+            except (FileNotFoundError, ValueError):
+                pass
+            if saved is not None and saved.get('version') == INDEX_VERSION \
+                    and tuple(saved.get('fields', ())) == self.fields:
+                for key, entry in saved['files'].items():
+                    self._add(key, entry)
+                replayed = self._replay()
+            else:
+                # the log belongs to another index
+                replayed = 1
+            if self.validate() or replayed:
+                self.save()
+
+    def validate(self) -> int:
+        """
+        Compares the index with the files of the root folder by modification time and size,
+        and re-indexes the changed files.
+
+        Returns:
+            int: Number of added, changed or removed files.
+        """
+        with self._lock:
+            changed = 0
+            seen = set()
+            for path in self.root_folder.rglob('*'):
+                if not path.is_file():
+                    continue
+                key = self._key(path)
+                seen.add(key)
+                stat = path.stat()
+                entry = self._files.get(key, None)
+                if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    self._index_file(key, stat)
+                    changed += 1
+            for key in set(self._files) - seen:
+                self._remove(key)
+                changed += 1
+            return changed
+
+    def refresh(self, paths: Iterable[str | PathLike]):
+        """Re-indexes the given (created or updated) files."""
+        with self._lock:
+            keys = [self._key(path) for path in paths]
+            for key in keys:
+                self._index_file(key)
+            self._append(keys)
+
+    def discard(self, paths: Iterable[str | PathLike]):
+        """Removes the given (deleted) files from the index."""
+        with self._lock:
+            keys = [self._key(path) for path in paths]
+            for key in keys:
+                self._remove(key)
+            self._append(keys)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            for values in self._values.values():
+                values.clear()
+
+    def candidates(self, crit: Mapping | None) -> Optional[list[Path]]:
+        """
+        Returns the paths of the files matching every indexed equality criterion,
+        or None if no indexed field is part of the criteria.
+        Non-indexed criteria are not checked, the files should be filtered by the full criteria.
+        """
+        if not crit:
+            return None
+        with self._lock:
+            found = [
+                self._values[field].get(value_key(crit[field]), set())
+                for field in self.fields if field in crit
+            ]
+            if not found:
+                return None
+            found.sort(key=len)
+            keys = found[0].intersection(*found[1:])
+            return [self.root_folder / key for key in sorted(keys)]
+
+    def save(self):
+        """Writes the index next to the root folder (atomically replacing the previous one), and clears the log."""
+        with self._lock:
+            data = {'version': INDEX_VERSION, 'fields': list(self.fields), 'files': self._files}
+            tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            # replaying the log over the new index would not change it, if removing the log is interrupted
+            self.log_path.unlink(missing_ok=True)
+            self._logged = 0
+
+    def close(self):
+        """Compacts the log into the index."""
+        with self._lock:
+            if self._logged:
+                self.save()
+
+    def __len__(self):
+        return len(self._files)
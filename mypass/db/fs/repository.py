@@ -1,12 +1,18 @@
+from bisect import bisect_right
+from collections import Counter
 from functools import wraps
+from itertools import islice
 from os import PathLike
 from pathlib import Path
-from typing import Iterable, Optional, Generic, TypeVar, Mapping
+from typing import Iterable, Optional, Generic, TypeVar, Mapping, Callable, Iterator
 
 from mypass.db import CrudRepository
+from mypass.db.utils import create_query, Query
+from mypass.utils import project_fields
 from mypass.exceptions import RequiresIdError
 from mypass.types.entity import Entity
 from .dao import FileSystemDao
+from .index import FileSystemIndex
 
 _PATH = TypeVar('_PATH', bound=str)
 _T = TypeVar('_T', bound=Mapping)
@@ -21,28 +27,29 @@ def requires_id(f):
     return wrapper
 
 
-def full_path(entity=False):
-    def func_dec(fun):
-        def get_full_path(root_folder: Path, path: Path):
-            if not path.is_absolute():
-                path = root_folder / path
+def get_full_path(root_folder: Path, path: Path, extension: str = '.json'):
+    if not path.is_absolute():
+        path = root_folder / path
+
+    if not path.suffix:
+        path = path.with_suffix(extension)
+    return path
 
-            if not path.suffix:
-                path = path.with_suffix('.json')
-            return path
 
+def full_path(entity=False):
+    def func_dec(fun):
         @wraps(fun)
         def entity_wrapper(self, e: Entity, *args, **kwargs):
-            e.id = get_full_path(self.root_folder, Path(e.id))
+            e.id = self.get_full_path(e.id)
             return fun(self, e, *args, **kwargs)
 
         @wraps(fun)
         def path_wrapper(self, path, *args, **kwargs):
             if isinstance(path, Iterable) and not isinstance(path, (str, bytes)):
-                abs_paths = (get_full_path(self.root_folder, Path(p)) for p in path)
-                return [fun(self, abs_path, *args, **kwargs) for abs_path in abs_paths]
+                abs_paths = [self.get_full_path(p) for p in path]
+                return fun(self, abs_paths, *args, **kwargs)
 
-            path = get_full_path(self.root_folder, Path(path))
+            path = self.get_full_path(path)
             return fun(self, path, *args, **kwargs)
 
         return entity_wrapper if entity else path_wrapper
@@ -51,22 +58,104 @@ def full_path(entity=False):
 
 
 class FileSystemRepository(CrudRepository, Generic[_PATH, _T]):
-
-    def __init__(self, root_folder: str | PathLike, dao: FileSystemDao):
+    """
+    Stores every entity in its own file under the root folder, the id of an entity is its path.
+    Ids without a suffix get the extension of the dao serializer (e.g. `.json`).
+
+    Fields listed in `indexes` are kept in a persistent `FileSystemIndex` next to the root folder,
+    so criteria on indexed fields only read the matching files instead of the whole folder.
+    """
+
+    indexes: tuple[str, ...] = ()
+
+    def __init__(self, root_folder: str | PathLike, dao: FileSystemDao, indexes: Iterable[str] = None):
+        """
+        Parameters:
+            root_folder (str | PathLike): Folder containing the entity files.
+            dao (FileSystemDao): Data access object reading and writing the files.
+            indexes (Iterable[str]): Indexed fields, defaults to the `indexes` of the class.
+                Pass an empty iterable to disable indexing.
+        """
         super().__init__()
         self.root_folder = Path(root_folder)
         assert self.root_folder.is_dir(), f'Path {root_folder} is not a directory!'
         self.dao = dao
+        if indexes is None:
+            indexes = self.indexes
+        indexes = tuple(indexes)
+        self.index = FileSystemIndex(self.root_folder, indexes, reader=self.dao.read_one) if indexes else None
+
+    def storage_paths(self, __paths: Iterable[_PATH] = None) -> Optional[Iterable[str]]:
+        if __paths is None:
+            return None
+        return [str(self.get_full_path(path)) for path in __paths]
+
+    def get_full_path(self, path: _PATH | PathLike) -> Path:
+        return get_full_path(self.root_folder, Path(path), self.dao.serializer.extension)
+
+    def _refresh_index(self, paths: Iterable[Path]):
+        if self.index is not None:
+            self.index.refresh(paths)
+
+    def _discard_index(self, paths: Iterable[Path]):
+        if self.index is not None:
+            self.index.discard(paths)
+
+    def _search(self, crit: _T, search: Callable[[Iterable[Path], Query], list]) -> list:
+        query = create_query(dict(crit), 'and')
+        if self.index is not None:
+            candidates = self.index.candidates(query.criteria)
+            if candidates is not None:
+                found = search(candidates, query)
+                used = tuple(field for field in self.index.fields if field in query.criteria)
+                query.record_plan('index', index=used, examined=len(candidates))
+                return found
+        return search(self.dao.find_all_files(self.root_folder), query)
+
+    def _find_files(self, crit: _T) -> list[Path]:
+        return self._search(crit, self.dao.find)
 
     @requires_id
     @full_path(entity=True)
     def create(self, entity: _T) -> _PATH:
         self.dao.create(path=entity.id, data=entity)
-        return entity.id
-
-    @full_path(entity=True)
-    def find_one(self, crit: _T) -> Optional[_T]:
-        entities = self.find_by_crit(crit)
+        self._refresh_index([entity.id])
+        return str(entity.id)
+
+    def create_many(self, entities: Iterable[_T]) -> list[_PATH]:
+        """
+        Creates every entity, or none of them: files written before a failing write are removed.
+
+        Raises:
+            RequiresIdError: If an entity has no id.
+            FileExistsError: If a file already exists, or two entities have the same id (nothing is written).
+        """
+        entities = list(entities)
+        if not all(entity.id for entity in entities):
+            raise RequiresIdError
+        paths = [self.get_full_path(entity.id) for entity in entities]
+        conflicts = [path for path in paths if path.exists()]
+        conflicts += [path for path, count in Counter(paths).items() if count > 1]
+        if conflicts:
+            raise FileExistsError(f'Files already exist or are created twice: {", ".join(map(str, conflicts))}')
+
+        written = paths
+        try:
+            self.dao.create_many(paths, entities)
+        except BaseException:
+            # none of the paths existed before, so every file found was written by this batch
+            written = [path for path in paths if path.is_file()]
+            self.dao.delete(written)
+            raise
+        finally:
+            self._refresh_index(written)
+
+        for entity, path in zip(entities, paths):
+            entity.id = path
+        return [str(path) for path in paths]
+
+    def find_one(self, entity: _T) -> Optional[_T]:
+        entities = self.find_by_crit(entity)
         try:
             return list(entities)[0]
         except IndexError:
@@ -74,67 +163,165 @@ class FileSystemRepository(CrudRepository, Generic[_PATH, _T]):
 
     @full_path()
     def find_by_id(self, path: _PATH) -> Optional[_T]:
-        return self.dao.read_one(path, into=self.entity_cls)
+        try:
+            return self.dao.read_one(path, into=self.entity_cls)
+        except FileNotFoundError:
+            return
+
+    def _page(
+            self,
+            paths: Iterable[Path],
+            query: Query | None,
+            limit: int | None,
+            cursor: _PATH | None,
+            fields: Iterable[str] | None
+    ) -> list[_T]:
+        # keyset pagination on the full paths, files are only read until the page is filled
+        paths = sorted(str(path) for path in paths)
+        if cursor is not None:
+            paths = paths[bisect_right(paths, str(self.get_full_path(cursor))):]
+        return list(islice(self._iter_entities(paths, query, fields), limit))
+
+    def _candidate_files(self, query: Query) -> Iterable[Path]:
+        paths = self.index.candidates(query.criteria) if self.index is not None else None
+        if paths is None:
+            paths = self.dao.find_all_files(self.root_folder)
+        return paths
+
+    @full_path()
+    def find_by_ids(
+            self, paths: Iterable[_PATH], *, limit: int = None, cursor: _PATH = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        if limit is not None or cursor is not None:
+            return self._page(paths, None, limit, cursor, fields)
+        return self.dao.read(paths, into=self.entity_cls, fields=fields)
+
+    def find_by_crit(
+            self, crit: _T, *, limit: int = None, cursor: _PATH = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        if limit is not None or cursor is not None:
+            query = create_query(dict(crit), 'and')
+            return self._page(self._candidate_files(query), query, limit, cursor, fields)
+        return self._search(
+            crit, lambda paths, query: self.dao.find_documents(paths, query, into=self.entity_cls, fields=fields))
+
+    @full_path()
+    def find(
+            self,
+            paths: Iterable[_PATH],
+            crit: _T,
+            *,
+            limit: int = None,
+            cursor: _PATH = None,
+            fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        if limit is not None or cursor is not None:
+            return self._page(paths, create_query(dict(crit), 'and'), limit, cursor, fields)
+        return self.dao.find_documents(paths, crit=crit, into=self.entity_cls, fields=fields)
+
+    def find_all(self, *, limit: int = None, cursor: _PATH = None, fields: Iterable[str] = None) -> Iterable[_T]:
+        paths = self.dao.find_all_files(self.root_folder)
+        if limit is not None or cursor is not None:
+            return self._page(paths, None, limit, cursor, fields)
+        return self.dao.read(paths, into=self.entity_cls, fields=fields)
+
+    def _iter_entities(
+            self, paths: Iterable[Path], query: Query = None, fields: Iterable[str] = None) -> Iterator[_T]:
+        # files are read one by one while iterating, removed files are skipped
+        if fields is not None:
+            fields = tuple(fields)
+        for path in paths:
+            try:
+                document = self.dao.read_one(path)
+            except FileNotFoundError:
+                continue
+            if query is None or query(document):
+                yield self.entity_cls(str(path), **project_fields(document, fields))
 
     @full_path()
-    def find_by_ids(self, paths: Iterable[_PATH]) -> Iterable[_T]:
-        return self.dao.read(paths, into=self.entity_cls)
+    def iter_by_ids(self, paths: Iterable[_PATH], *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(paths, fields=fields)
 
-    def find_by_crit(self, crit: _T) -> Iterable[_T]:
-        paths = self.dao.find_in_folder(self.root_folder, crit=crit)
-        return self.dao.read(paths, into=self.entity_cls)
+    def iter_by_crit(self, crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        query = create_query(dict(crit), 'and')
+        return self._iter_entities(self._candidate_files(query), query, fields)
 
     @full_path()
-    def find(self, paths: Iterable[_PATH], crit: _T) -> Iterable[_T]:
-        paths = self.dao.find(paths, crit=crit)
-        return self.dao.read(paths, into=self.entity_cls)
+    def iter_find(self, paths: Iterable[_PATH], crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(paths, create_query(dict(crit), 'and'), fields)
 
-    def find_all(self) -> Iterable[_T]:
-        # TODO: implement method
-        raise NotImplementedError()
+    def iter_all(self, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.find_all_files(self.root_folder), fields=fields)
 
     @full_path()
     def update_by_id(self, path: _PATH, update: _T) -> Optional[_PATH]:
-        self.dao.update_one(path, data=update)
-        return path
+        try:
+            self.dao.update_one(path, data=update)
+        except FileNotFoundError:
+            return
+        self._refresh_index([path])
+        return str(path)
 
     @full_path()
     def update_by_ids(self, paths: Iterable[_PATH], update: _T) -> Iterable[_PATH]:
         self.dao.update(paths, data=update)
-        return paths
+        self._refresh_index(paths)
+        return [str(path) for path in paths]
+
+    def bulk_update(self, updates: Iterable[tuple[_PATH, _T]]) -> Iterable[_PATH]:
+        updated = (self.update_by_id(path, update) for path, update in updates)
+        return [path for path in updated if path is not None]
 
     def update_by_crit(self, crit: _T, update: _T) -> Iterable[_PATH]:
-        files_to_update = self.dao.find_in_folder(self.root_folder, crit=crit)
-        deleted = self.dao.update(files_to_update, update)
-        return [path for path, is_deleted in zip(files_to_update, deleted) if is_deleted]
+        files_to_update = self._find_files(crit)
+        updated = self.dao.update(files_to_update, update)
+        files_updated = [path for path, is_updated in zip(files_to_update, updated) if is_updated]
+        self._refresh_index(files_updated)
+        return [str(path) for path in files_updated]
 
     @full_path()
     def update(self, paths: Iterable[_PATH], crit: _T, update: _T) -> Iterable[_PATH]:
         files_to_update = self.dao.find(paths, crit=crit)
-        deleted = self.dao.update(files_to_update, data=update)
-        return [path for path, is_deleted in zip(files_to_update, deleted) if is_deleted]
+        updated = self.dao.update(files_to_update, data=update)
+        files_updated = [path for path, is_updated in zip(files_to_update, updated) if is_updated]
+        self._refresh_index(files_updated)
+        return [str(path) for path in files_updated]
 
     @full_path()
     def remove_by_id(self, path: _PATH) -> Optional[_PATH]:
         if self.dao.delete_one(path):
-            return path
+            self._discard_index([path])
+            return str(path)
 
     @full_path()
     def remove_by_ids(self, paths: Iterable[_PATH]) -> Iterable[_PATH]:
-        paths = list(paths)
         deleted = self.dao.delete(paths)
-        return [p for d, p in zip(deleted, paths) if d]
+        files_deleted = [p for d, p in zip(deleted, paths) if d]
+        self._discard_index(files_deleted)
+        return [str(path) for path in files_deleted]
 
     def remove_by_crit(self, crit: _T) -> Iterable[_PATH]:
-        files_to_remove = self.dao.find_in_folder(self.root_folder, crit=crit)
+        files_to_remove = self._find_files(crit)
         deleted = self.dao.delete(files_to_remove)
-        return [path for path, is_deleted in zip(files_to_remove, deleted) if is_deleted]
+        files_deleted = [path for path, is_deleted in zip(files_to_remove, deleted) if is_deleted]
+        self._discard_index(files_deleted)
+        return [str(path) for path in files_deleted]
 
     @full_path()
     def remove(self, paths: Iterable[_PATH], crit: _T) -> Iterable[_PATH]:
         files_to_remove = self.dao.find(paths, crit=crit)
         deleted = self.dao.delete(files_to_remove)
-        return [path for path, is_deleted in zip(paths, deleted) if is_deleted]
+        files_deleted = [path for path, is_deleted in zip(files_to_remove, deleted) if is_deleted]
+        self._discard_index(files_deleted)
+        return [str(path) for path in files_deleted]
 
     def remove_all(self) -> None:
         self.dao.delete_all(self.root_folder)
+        if self.index is not None:
+            self.index.clear()
+            self.index.save()
+
+    def close(self):
+        """Compacts the changes of the index (the dao is not closed, it might be shared)."""
+        if self.index is not None:
+            self.index.close()
@@ -1,2 +1,3 @@
 from ._impl import MasterGitRepository, VaultGitRepository
 from .repository import GitRepository
+from .worker import GitCommitWorker
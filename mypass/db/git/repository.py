@@ -1,7 +1,8 @@
-from typing import Iterable, Optional, Generic, TypeVar
+from typing import Iterable, Optional, Generic, TypeVar, Iterator
 
 from mypass.db.repository import CrudRepository
 from mypass.utils import GitSupport
+from .worker import GitCommitWorker
 
 _ID = TypeVar('_ID')
 _T = TypeVar('_T')
@@ -11,75 +12,156 @@ class GitRepository(CrudRepository, Generic[_ID, _T]):
     def __init__(
             self,
             dao: CrudRepository,
+            async_commit: bool = False,
+            debounce: float = 1.0,
+            max_delay: float = 10.0,
             **git_config
     ):
+        """
+        Repository committing (and pushing) every change of the wrapped repository.
+
+        Parameters:
+            dao (CrudRepository): Repository storing the data inside the git working tree.
+            async_commit (bool): If True, writes return once the data is written by the dao,
+                and a background worker commits and pushes the changes (see `GitCommitWorker`).
+                Defaults to False, which commits and pushes inside every write.
+            debounce (float): Seconds without new changes before the worker commits.
+            max_delay (float): Maximum seconds a change waits for the worker.
+            git_config: Keyword arguments of `GitSupport`.
+        """
         super().__init__()
         self.dao = dao
         self.git = GitSupport(**git_config)
+        self.worker = GitCommitWorker(self.git, debounce=debounce, max_delay=max_delay) if async_commit else None
+
+    def _commit(self, __ids: Iterable[_ID] | None):
+        # stage only the files touched by the dao, if it can tell them
+        paths = self.dao.storage_paths(__ids)
+        if paths is not None:
+            paths = list(paths)
+            if not paths:
+                return
+        if self.worker is not None:
+            self.worker.submit(paths)
+        else:
+            self.git.stage_commit_push(paths)
+
+    def storage_paths(self, __ids: Iterable[_ID] = None) -> Optional[Iterable[str]]:
+        return self.dao.storage_paths(__ids)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Commits and pushes every pending change, and waits until it is done."""
+        if self.worker is not None:
+            return self.worker.flush(timeout=timeout)
+        return True
+
+    def wait_durable(self, timeout: float = None) -> bool:
+        """Waits until every change made so far is committed and pushed, without forcing a commit."""
+        if self.worker is not None:
+            return self.worker.wait_durable(timeout=timeout)
+        return True
+
+    @property
+    def metrics(self) -> dict:
+        if self.worker is not None:
+            return self.worker.metrics
+        return {'queue_depth': 0, 'lag': 0.0}
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
 
     def create(self, entity: _T) -> _ID:
         _id = self.dao.create(entity)
-        self.git.stage_commit_push()
+        self._commit([_id])
         return _id
 
+    def create_many(self, entities: Iterable[_T]) -> list[_ID]:
+        ids = list(self.dao.create_many(entities))
+        self._commit(ids)
+        return ids
+
     def find_one(self, entity: _T) -> Optional[_T]:
         return self.dao.find_one(entity)
 
     def find_by_id(self, __id: _ID) -> Optional[_T]:
         return self.dao.find_by_id(__id)
 
-    def find_by_ids(self, __ids: Iterable[_ID]) -> Iterable[_T]:
-        return self.dao.find_by_ids(__ids)
+    def find_by_ids(
+            self, __ids: Iterable[_ID], *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        return self.dao.find_by_ids(__ids, limit=limit, cursor=cursor, fields=fields)
+
+    def find_by_crit(
+            self, crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        return self.dao.find_by_crit(crit, limit=limit, cursor=cursor, fields=fields)
+
+    def find(
+            self, __ids: Iterable[_ID], crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        return self.dao.find(__ids, crit, limit=limit, cursor=cursor, fields=fields)
+
+    def find_all(self, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None) -> Iterable[_T]:
+        return self.dao.find_all(limit=limit, cursor=cursor, fields=fields)
+
+    def iter_by_ids(self, __ids: Iterable[_ID], *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self.dao.iter_by_ids(__ids, fields=fields)
 
-    def find_by_crit(self, crit: _T) -> Iterable[_T]:
-        return self.dao.find_by_crit(crit)
+    def iter_by_crit(self, crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self.dao.iter_by_crit(crit, fields=fields)
 
-    def find(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_T]:
-        return self.dao.find(__ids, crit)
+    def iter_find(self, __ids: Iterable[_ID], crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self.dao.iter_find(__ids, crit, fields=fields)
 
-    def find_all(self) -> Iterable[_T]:
-        return self.dao.find_all()
+    def iter_all(self, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self.dao.iter_all(fields=fields)
 
     def update_by_id(self, __id: _ID, update: _T) -> Optional[_ID]:
         _id = self.dao.update_by_id(__id, update)
-        self.git.stage_commit_push()
+        self._commit([_id] if _id is not None else [])
         return _id
 
     def update_by_ids(self, __ids: Iterable[_ID], update: _T) -> Iterable[_ID]:
-        _ids = self.dao.update_by_ids(__ids, update)
-        self.git.stage_commit_push()
+        _ids = list(self.dao.update_by_ids(__ids, update))
+        self._commit(_ids)
+        return _ids
+
+    def bulk_update(self, updates: Iterable[tuple[_ID, _T]]) -> Iterable[_ID]:
+        _ids = list(self.dao.bulk_update(updates))
+        self._commit(_ids)
         return _ids
 
     def update_by_crit(self, crit: _T, update: _T) -> Iterable[_ID]:
-        _ids = self.dao.update_by_crit(crit, update)
-        self.git.stage_commit_push()
+        _ids = list(self.dao.update_by_crit(crit, update))
+        self._commit(_ids)
         return _ids
 
     def update(self, __ids: Iterable[_ID], crit: _T, update: _T) -> Iterable[_ID]:
-        _ids = self.dao.update(__ids, crit, update)
-        self.git.stage_commit_push()
+        _ids = list(self.dao.update(__ids, crit, update))
+        self._commit(_ids)
         return _ids
 
     def remove_by_id(self, __id: _ID) -> Optional[_ID]:
         _id = self.dao.remove_by_id(__id)
-        self.git.stage_commit_push()
+        self._commit([_id] if _id is not None else [])
         return _id
 
     def remove_by_ids(self, __ids: Iterable[_ID]) -> Iterable[_ID]:
-        _ids = self.dao.remove_by_ids(__ids)
-        self.git.stage_commit_push()
+        _ids = list(self.dao.remove_by_ids(__ids))
+        self._commit(_ids)
         return _ids
 
     def remove_by_crit(self, crit: _T) -> Iterable[_ID]:
-        _id = self.dao.remove_by_crit(crit)
-        self.git.stage_commit_push()
-        return _id
+        _ids = list(self.dao.remove_by_crit(crit))
+        self._commit(_ids)
+        return _ids
 
     def remove(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_ID]:
-        _ids = self.dao.remove(__ids, crit)
-        self.git.stage_commit_push()
+        _ids = list(self.dao.remove(__ids, crit))
+        self._commit(_ids)
         return _ids
 
     def remove_all(self) -> None:
         self.dao.remove_all()
-        self.git.stage_commit_push()
+        self._commit(None)
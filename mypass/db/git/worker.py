@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from typing import Iterable
+
+from mypass.utils import GitSupport
+
+logger = logging.getLogger(__name__)
+
+
+class GitCommitWorker:
+    """
+    Background worker committing and pushing the changes of a repository.
+
+    Writers `submit` their changes after the data is written to the working tree and return immediately.
+    The worker waits until no change was submitted for `debounce` seconds (but at most `max_delay` seconds
+    after the oldest pending change), then stages, commits and pushes every pending change at once.
+    Only the submitted paths are staged, unless a change was submitted without paths.
+
+    If committing or pushing fails, the changes stay pending and are committed again after `retry_delay` seconds,
+    doubled by every consecutive failure (up to `max_retry_delay`), even if nothing else is submitted.
+    """
+
+    def __init__(
+            self,
+            git: GitSupport,
+            debounce: float = 1.0,
+            max_delay: float = 10.0,
+            retry_delay: float = 1.0,
+            max_retry_delay: float = 60.0
+    ):
+        """
+        Parameters:
+            git (GitSupport): Repository to commit to.
+            debounce (float): Seconds without new changes before committing.
+            max_delay (float): Maximum seconds a change waits to be committed.
+            retry_delay (float): Seconds before committing again after a failure.
+            max_retry_delay (float): Maximum seconds between two attempts after consecutive failures.
+        """
+        self.git = git
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._cond = threading.Condition()
+        self._submitted = 0
+        # every ticket up to `_committed` is durable, tickets in the range (start, end] of `_failed` failed
+        # with the last attempt (they are retried, and become durable once `_committed` reaches them)
+        self._committed = 0
+        self._failed = (0, 0)
+        self._failures = 0
+        self._retry_at = None
+        self._error = None
+        self._commits = 0
+        self._first_pending = None
+        self._last_submit = None
+        self._inflight_since = None
+        self._paths: set[str] | None = set()
+        self._flush_requested = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='git-commit-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, paths: Iterable[str | os.PathLike] = None) -> int:
+        """
+        Registers a change of the working tree to be committed.
+        If the changed paths are not given, the whole working tree is staged with the next commit.
+
+        Returns:
+            int: Ticket of the change, which can be passed to `wait_durable`.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Submitting changes to a closed commit worker.')
+            now = time.monotonic()
+            if paths is None:
+                self._paths = None
+            elif self._paths is not None:
+                self._paths.update(os.fspath(path) for path in paths)
+            self._submitted += 1
+            if self._first_pending is None:
+                self._first_pending = now
+            self._last_submit = now
+            self._cond.notify_all()
+            return self._submitted
+
+    def wait_durable(self, ticket: int = None, timeout: float = None) -> bool:
+        """
+        Blocks until the given change (or every change submitted so far) is committed and pushed.
+
+        Returns:
+            bool: False if the timeout expired, True otherwise.
+        Raises:
+            IOError: If the last attempt to commit or push the change failed (it is retried in the background).
+        """
+        with self._cond:
+            if ticket is None:
+                ticket = self._submitted
+            if not self._cond.wait_for(lambda: self._committed >= ticket or self._is_failed(ticket), timeout=timeout):
+                return False
+            if self._committed < ticket:
+                raise IOError(f'Committing changes failed: {self._error}') from self._error
+            return True
+
+    def _is_failed(self, ticket: int) -> bool:
+        start, end = self._failed
+        return start < ticket <= end
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Commits and pushes every pending change immediately (even while waiting to retry a failure),
+        and waits until it is done.
+        """
+        with self._cond:
+            ticket = self._submitted
+            if self._committed < ticket:
+                # a failed change is retried immediately, and the outcome of that attempt is waited for
+                self._failed = (0, 0)
+                self._retry_at = None
+                self._flush_requested = True
+                self._cond.notify_all()
+        return self.wait_durable(ticket, timeout=timeout)
+
+    @property
+    def metrics(self) -> dict:
+        """Queue depth (uncommitted changes), lag (age of the oldest uncommitted change in seconds) and stats."""
+        with self._cond:
+            oldest = self._inflight_since if self._inflight_since is not None else self._first_pending
+            return {
+                'queue_depth': self._submitted - self._committed,
+                'lag': time.monotonic() - oldest if oldest is not None else 0.0,
+                'submitted': self._submitted,
+                'committed': self._committed,
+                'commits': self._commits,
+                'failures': self._failures,
+                'last_error': repr(self._error) if self._error is not None else None,
+            }
+
+    def _deadline(self):
+        deadline = min(self._last_submit + self.debounce, self._first_pending + self.max_delay)
+        return deadline if self._retry_at is None else max(deadline, self._retry_at)
+
+    def _backoff(self) -> float:
+        return min(self.retry_delay * 2 ** (self._failures - 1), self.max_retry_delay)
+
+    def _run(self):
+        with self._cond:
+            while True:
+                self._cond.wait_for(lambda: self._closed or self._submitted > self._committed)
+                if self._submitted == self._committed:
+                    return
+                while not self._closed and not self._flush_requested:
+                    remaining = self._deadline() - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                target = self._submitted
+                paths, self._paths = self._paths, set()
+                self._inflight_since = self._first_pending
+                self._first_pending = None
+                self._flush_requested = False
+                self._cond.release()
+                try:
+                    self.git.stage_commit_push(paths)
+                    error = None
+                except Exception as e:
+                    logger.error(f'Committing changes failed: {e}')
+                    error = e
+                finally:
+                    self._cond.acquire()
+                if error is None:
+                    self._committed = target
+                    self._commits += 1
+                    self._failures = 0
+                    self._retry_at = None
+                else:
+                    # changes stay in the working tree, and are staged again with the retry
+                    if paths is None:
+                        self._paths = None
+                    elif self._paths is not None:
+                        self._paths.update(paths)
+                    self._error = error
+                    self._failed = (self._committed, target)
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + self._backoff()
+                    self._first_pending = self._inflight_since
+                self._inflight_since = None
+                self._cond.notify_all()
+                if error is not None and self._closed:
+                    # the last attempt of a closed worker, the changes are left in the working tree
+                    return
+
+    def close(self):
+        """Commits the pending changes and stops the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -1,11 +1,22 @@
 import abc
-from typing import TypeVar, Generic, Iterable, Optional
+from os import PathLike
+from typing import TypeVar, Generic, Iterable, Optional, Iterator
 
 _T = TypeVar('_T')
 _ID = TypeVar('_ID')
 
 
 class CrudRepository(abc.ABC, Generic[_ID, _T]):
+    """
+    Multi-document read methods (`find_by_ids`, `find_by_crit`, `find` and `find_all`) support
+    keyset pagination: if `limit` or `cursor` is given, the results are ordered by id,
+    and only the first `limit` documents with an id greater than `cursor` are returned.
+    The id of the last returned document is the cursor of the next page.
+
+    Multi-document read and iterating methods also accept a `fields` projection:
+    if given, the returned entities only contain the listed fields (and their id).
+    """
+
     def __init__(self):
         # noinspection PyUnresolvedReferences
         # insane hacking -> get stored entity type from original bases
@@ -23,6 +34,14 @@ class CrudRepository(abc.ABC, Generic[_ID, _T]):
     def entity_cls(self):
         return self._entity_cls
 
+    def storage_paths(self, __ids: Iterable[_ID] = None) -> Optional[Iterable[str | PathLike]]:
+        """
+        Returns the files storing the given entities (or every entity, if ids are not given),
+        which lets wrappers like the git repository track exactly the touched files.
+        Returns None, if the implementation cannot tell the files.
+        """
+        return None
+
     @abc.abstractmethod
     def create(self, entity: _T) -> _ID:
         """
@@ -34,6 +53,17 @@ class CrudRepository(abc.ABC, Generic[_ID, _T]):
             RequiresIdError: raises only if implementation needs an id to be created manually.
         """
 
+    def create_many(self, entities: Iterable[_T]) -> list[_ID]:
+        """
+        Saves multiple entities, and returns the newly created ids in the order of the entities.
+        Implementations should override it with a single batched write if possible.
+
+        Raises:
+            RequiresIdError: raises only if implementation needs an id to be created manually,
+                and any of the entities has no id.
+        """
+        return [self.create(entity) for entity in entities]
+
     @abc.abstractmethod
     def find_one(self, entity: _T) -> Optional[_T]:
         """Returns exactly one entity based on the specified conditions."""
@@ -45,25 +75,52 @@ class CrudRepository(abc.ABC, Generic[_ID, _T]):
         ...
 
     @abc.abstractmethod
-    def find_by_ids(self, __ids: Iterable[_ID]) -> Iterable[_T]:
+    def find_by_ids(
+            self, __ids: Iterable[_ID], *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
         """Finds multiple documents by their ids, and returns them in an iterable."""
         ...
 
     @abc.abstractmethod
-    def find_by_crit(self, crit: _T) -> Iterable[_T]:
+    def find_by_crit(
+            self, crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
         """Finds multiple documents by a given criteria, and returns them in an iterable."""
         ...
 
     @abc.abstractmethod
-    def find(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_T]:
+    def find(
+            self, __ids: Iterable[_ID], crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
         """Finds multiple documents based on their ids and a given criteria, and returns them in an iterable."""
         ...
 
     @abc.abstractmethod
-    def find_all(self) -> Iterable[_T]:
+    def find_all(
+            self, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
         """Finds all documents, and returns them in an iterable."""
         ...
 
+    def iter_by_ids(self, __ids: Iterable[_ID], *, fields: Iterable[str] = None) -> Iterator[_T]:
+        """
+        Yields the documents of the given ids one by one, skipping missing ids.
+        Implementations should override the iterating methods to avoid materializing every result at once.
+        """
+        yield from self.find_by_ids(__ids, fields=fields)
+
+    def iter_by_crit(self, crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        """Yields the documents matching the criteria one by one."""
+        yield from self.find_by_crit(crit, fields=fields)
+
+    def iter_find(self, __ids: Iterable[_ID], crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        """Yields the documents of the given ids matching the criteria one by one."""
+        yield from self.find(__ids, crit, fields=fields)
+
+    def iter_all(self, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        """Yields every document one by one."""
+        yield from self.find_all(fields=fields)
+
     @abc.abstractmethod
     def update_by_id(self, __id: _ID, update: _T) -> Optional[_ID]:
         """Updates an entity by its corresponding id."""
@@ -97,6 +154,14 @@ class CrudRepository(abc.ABC, Generic[_ID, _T]):
         """Updates all documents unconditionally."""
         ...
 
+    def bulk_update(self, updates: Iterable[tuple[_ID, _T]]) -> Iterable[_ID]:
+        """
+        Updates multiple documents, each by its own update object,
+        and returns the updated ids in an iterable. Non-existing ids are skipped.
+        Implementations should override it with a single batched operation if possible.
+        """
+        return [pk for pk in (self.update_by_id(pk, update) for pk, update in updates) if pk is not None]
+
     @abc.abstractmethod
     def remove_by_id(self, __id: _ID) -> Optional[_ID]:
         """Removes an entity by its corresponding id."""
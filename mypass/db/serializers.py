@@ -0,0 +1,183 @@
+"""
+Serialization formats of the database files, shared by the file based backends
+(`FileStorage` of the TinyDB backend and `FileSystemDao`).
+"""
+import abc
+import json
+import struct
+from typing import Any, Mapping, Type
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Serializer(abc.ABC):
+    """Converts the content of a database file (a mapping of JSON compatible values) to bytes and back."""
+
+    name: str = ''
+    extension: str = ''
+
+    @abc.abstractmethod
+    def dumps(self, data: Mapping[str, Any]) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def loads(self, raw: bytes) -> dict[str, Any]:
+        pass
+
+
+class JsonSerializer(Serializer):
+    """Standard library JSON, the default format of every backend."""
+
+    name = 'json'
+    extension = '.json'
+
+    def __init__(self, encoding: str = None, **kwargs):
+        """
+        Parameters:
+            encoding (str): Encoding of the files, defaults to UTF-8.
+            kwargs: Keyword arguments passed to `json.dumps`.
+        """
+        self.encoding = encoding or 'utf-8'
+        self.kwargs = kwargs
+
+    def dumps(self, data: Mapping[str, Any]) -> bytes:
+        return json.dumps(data, **self.kwargs).encode(self.encoding)
+
+    def loads(self, raw: bytes) -> dict[str, Any]:
+        return json.loads(raw.decode(self.encoding))
+
+
+class MsgpackSerializer(Serializer):
+    """Compact binary format of the optional `msgpack` package."""
+
+    name = 'msgpack'
+    extension = '.msgpack'
+
+    def __init__(self):
+        """
+        Raises:
+            ImportError: If the `msgpack` package is not installed.
+        """
+        if msgpack is None:
+            raise ImportError('Serialization format "msgpack" requires the msgpack package (pip install msgpack).')
+
+    def dumps(self, data: Mapping[str, Any]) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, raw: bytes) -> dict[str, Any]:
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+_MAGIC = b'MPLP\x01'
+_COUNT = struct.Struct('>I')
+_KEY = struct.Struct('>I')
+_VALUE = struct.Struct('>cI')
+_NESTED, _JSON = b'm', b'j'
+
+
+class LengthPrefixedSerializer(Serializer):
+    """
+    Binary format of length-prefixed entries.
+
+    A mapping is stored as the number of its entries, followed by the entries: the length and the UTF-8 key,
+    then the kind and the length of the value, and the value. Values of the first `depth` levels which are
+    mappings (e.g. the tables and documents of a TinyDB database) are stored the same way, any other value
+    is stored as JSON. Thus, parsing never scans for the end of a value,
+    and values can be skipped without being parsed.
+    """
+
+    name = 'length-prefixed'
+    extension = '.lp'
+
+    def __init__(self, depth: int = 2):
+        """
+        Parameters:
+            depth (int): Levels of nested mappings stored as length-prefixed entries.
+        """
+        assert depth > 0, 'The top level is always stored as length-prefixed entries.'
+        self.depth = depth
+
+    def _dump(self, data: Mapping, depth: int, out: list[bytes]) -> int:
+        # appends the chunks of the mapping, and returns their total length
+        size = _COUNT.size
+        out.append(_COUNT.pack(len(data)))
+        for key, value in data.items():
+            key = str(key).encode('utf-8')
+            out.append(_KEY.pack(len(key)))
+            out.append(key)
+            header = len(out)
+            out.append(b'')
+            if depth > 1 and isinstance(value, Mapping):
+                kind, length = _NESTED, self._dump(value, depth - 1, out)
+            else:
+                value = json.dumps(value).encode('utf-8')
+                kind, length = _JSON, len(value)
+                out.append(value)
+            out[header] = _VALUE.pack(kind, length)
+            size += _KEY.size + len(key) + _VALUE.size + length
+        return size
+
+    def _load(self, view: memoryview, offset: int) -> dict[str, Any]:
+        data = {}
+        count, = _COUNT.unpack_from(view, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            key_length, = _KEY.unpack_from(view, offset)
+            offset += _KEY.size
+            key = str(view[offset:offset + key_length], 'utf-8')
+            offset += key_length
+            kind, length = _VALUE.unpack_from(view, offset)
+            offset += _VALUE.size
+            if kind == _NESTED:
+                data[key] = self._load(view, offset)
+            else:
+                data[key] = json.loads(str(view[offset:offset + length], 'utf-8'))
+            offset += length
+        return data
+
+    def dumps(self, data: Mapping[str, Any]) -> bytes:
+        out = [_MAGIC]
+        self._dump(data, self.depth, out)
+        return b''.join(out)
+
+    def loads(self, raw: bytes) -> dict[str, Any]:
+        """
+        Raises:
+            ValueError: If the data is not in the length-prefixed format.
+        """
+        if not raw.startswith(_MAGIC):
+            raise ValueError('Data is not in the length-prefixed format.')
+        try:
+            return self._load(memoryview(raw), len(_MAGIC))
+        except struct.error as e:
+            raise ValueError(f'Truncated length-prefixed data: {e}') from e
+
+
+SERIALIZERS: dict[str, Type[Serializer]] = {
+    JsonSerializer.name: JsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+    LengthPrefixedSerializer.name: LengthPrefixedSerializer,
+}
+
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Returns a serializer of the format with its default options.
+
+    Raises:
+        ValueError: If the format is unknown.
+        ImportError: If the format requires a package, which is not installed.
+    """
+    try:
+        serializer_cls = SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(f'Unknown serialization format "{name}", expected one of {", ".join(SERIALIZERS)}.')
+    return serializer_cls()
+
+
+def available_formats() -> list[str]:
+    """Names of the formats usable in the current environment."""
+    return [name for name in SERIALIZERS if name != MsgpackSerializer.name or msgpack is not None]
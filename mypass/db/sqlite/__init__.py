@@ -0,0 +1,3 @@
+from .dao import SqliteDao
+from .repository import SqliteRepository
+from ._impl import MasterSqliteRepository, VaultSqliteRepository
@@ -0,0 +1,10 @@
+from mypass.types import MasterEntity, VaultEntity, const
+from .repository import SqliteRepository
+
+
+class MasterSqliteRepository(SqliteRepository[int, MasterEntity]):
+    indexes = ('user',)
+
+
+class VaultSqliteRepository(SqliteRepository[int, VaultEntity]):
+    indexes = (const.UID_FIELD, 'user')
@@ -0,0 +1,304 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Mapping, Iterator, Optional, Any
+
+from mypass.db.utils import Query
+from mypass.types.op import DEL
+from mypass.utils import project_fields, SqliteConnections
+
+_MIN_ID = -2 ** 63
+_MAX_ID = 2 ** 63 - 1
+
+
+def quote(identifier: str) -> str:
+    """Quotes an SQL identifier (table or column name)."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def json_path(field: str) -> str:
+    """JSON path of a top level field, as used by the SQLite JSON functions."""
+    if '"' in field:
+        raise ValueError(f'Field names containing double quotes are not supported: {field}.')
+    return f'$."{field}"'
+
+
+def sort_keys(value):
+    """Copy of a JSON value with the keys of (nested) objects sorted, so equal objects have the same JSON text."""
+    if isinstance(value, dict):
+        return {key: sort_keys(value[key]) for key in sorted(value)}
+    if isinstance(value, list):
+        return [sort_keys(item) for item in value]
+    return value
+
+
+def is_valid_id(doc_id) -> bool:
+    # ids out of the range of SQLite integers cannot exist in the table
+    return isinstance(doc_id, int) and not isinstance(doc_id, bool) and _MIN_ID <= doc_id <= _MAX_ID
+
+
+class SqliteDao:
+    """
+    Data access object for a single table of an SQLite database, storing every document as a JSON column.
+
+    Connections are `SqliteConnections` (WAL mode, one connection per thread),
+    writes run inside `BEGIN IMMEDIATE` transactions, so read-modify-write operations are atomic.
+
+    Fields listed in `indexes` are extracted into generated (virtual) columns with an index,
+    which are used by equality criteria on those fields.
+
+    Nested values (objects and arrays) are stored with sorted object keys, and criteria on them
+    compare the minified JSON text, thus key order and whitespace do not matter,
+    but numbers do not equal booleans and `1` does not equal `1.0` inside nested values.
+    """
+
+    def __init__(
+            self,
+            table: str,
+            path: str | os.PathLike,
+            indexes: Iterable[str] = (),
+            timeout: float = 5.0,
+            synchronous: str = 'NORMAL'
+    ):
+        """
+        Parameters:
+            table (str): Name of the table.
+            path (str | os.PathLike): Path of the database file.
+            indexes (Iterable[str]): Fields with a generated column and an index.
+            timeout (float): Seconds to wait for the lock of another writer.
+            synchronous (str): SQLite `synchronous` pragma, NORMAL is durable in WAL mode except for power loss.
+        """
+        self.table = table
+        self._path = Path(path)
+        self.indexes = tuple(indexes)
+        for field in self.indexes:
+            json_path(field)
+        self._columns = {field: f'f_{field}' for field in self.indexes}
+        self._connections = SqliteConnections(
+            self._path, timeout=timeout, synchronous=synchronous, create_schema=self._create_schema)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def persistent(self):
+        return True
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread, and opens it on first use."""
+        return self._connections.get()
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        table = quote(self.table)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, data TEXT NOT NULL CHECK (json_valid(data)))')
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+        for field, column in self._columns.items():
+            if column not in existing:
+                path = json_path(field).replace("'", "''")
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {quote(column)} "
+                    f"GENERATED ALWAYS AS (json_extract(data, '{path}')) VIRTUAL")
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote(f"{self.table}_{column}")} ON {table} ({quote(column)})')
+
+    def transaction(self):
+        """Write transaction of the calling thread, committed on success and rolled back on errors."""
+        return self._connections.transaction()
+
+    def close(self):
+        """Closes the connection of every thread."""
+        self._connections.close()
+
+    def unlink(self):
+        self._connections.unlink()
+
+    def _field_expr(self, field: str) -> tuple[str, list]:
+        if field in self._columns:
+            return quote(self._columns[field]), []
+        return 'json_extract(data, ?)', [json_path(field)]
+
+    def _where(self, cond: Query | None, doc_ids: Iterable[int] | None, after: int | None) -> tuple[str, list]:
+        clauses = []
+        params = []
+        if doc_ids is not None:
+            clauses.append('id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps([doc_id for doc_id in doc_ids if is_valid_id(doc_id)]))
+        if cond is not None:
+            criteria = []
+            for field, value in cond.criteria.items():
+                expr, expr_params = self._field_expr(field)
+                if value is None:
+                    criteria.append("json_type(data, ?) = 'null'")
+                    expr_params = [json_path(field)]
+                elif isinstance(value, (dict, list)):
+                    # nested values are compared by their (minified) JSON text, stored with sorted keys
+                    criteria.append(f'{expr} = json(?)')
+                    expr_params.append(json.dumps(sort_keys(value)))
+                else:
+                    criteria.append(f'{expr} = ?')
+                    expr_params.append(value)
+                params.extend(expr_params)
+            if criteria:
+                clauses.append('(' + f' {cond.logic.upper()} '.join(criteria) + ')')
+            elif cond.logic == 'or':
+                clauses.append('0')
+            used = tuple(field for field in self.indexes if field in cond.criteria)
+            if used and cond.logic == 'and':
+                cond.record_plan('index', index=used)
+            else:
+                cond.record_plan('scan')
+        if after is not None:
+            clauses.append('id > ?')
+            params.append(after)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def create(self, entity: Mapping, doc_id: int = None) -> int:
+        return self.create_many([entity], [doc_id])[0]
+
+    def create_many(self, entities: Iterable[Mapping], doc_ids: Iterable[Optional[int]] = None) -> list[int]:
+        """
+        Inserts every entity in a single transaction, and returns the new ids in the order of the entities.
+        Nothing is inserted, if any of the given ids already exists.
+
+        Raises:
+            ValueError: If any of the ids already exists.
+        """
+        entities = list(entities)
+        doc_ids = list(doc_ids) if doc_ids is not None else [None] * len(entities)
+        sql = f'INSERT INTO {quote(self.table)} (id, data) VALUES (?, ?)'
+        created = []
+        try:
+            with self.transaction() as conn:
+                for doc_id, entity in zip(doc_ids, entities):
+                    document = {field: sort_keys(value) for field, value in entity.items()}
+                    cursor = conn.execute(sql, (doc_id, json.dumps(document)))
+                    created.append(cursor.lastrowid)
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f'Document with an already existing id: {e}') from e
+        return created
+
+    def read(
+            self,
+            *,
+            cond: Query = None,
+            doc_ids: Iterable[int] = None,
+            limit: int = None,
+            after: int = None,
+            fields: Iterable[str] = None
+    ) -> list[tuple[int, dict]]:
+        """
+        Returns the (id, document) pairs of the documents matching both `cond` and `doc_ids` (if given), ordered by id.
+        Parameters `limit` and `after` read a single page (keyset pagination),
+        `fields` is a projection of the returned documents.
+        """
+        where, params = self._where(cond, doc_ids, after)
+        sql = f'SELECT id, data FROM {quote(self.table)}{where} ORDER BY id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        rows = self.get_connection().execute(sql, params).fetchall()
+        if fields is not None:
+            fields = tuple(fields)
+        return [(doc_id, project_fields(json.loads(data), fields)) for doc_id, data in rows]
+
+    def read_one(self, *, cond: Query = None, doc_id: int = None) -> Optional[tuple[int, dict]]:
+        assert doc_id is None or cond is None, 'Specifying both `doc_id` and `cond` is invalid.'
+        assert doc_id is not None or cond is not None, 'Specify either `doc_id` or `cond`.'
+        if doc_id is not None:
+            if not is_valid_id(doc_id):
+                return None
+            row = self.get_connection().execute(
+                f'SELECT id, data FROM {quote(self.table)} WHERE id = ?', (doc_id,)).fetchone()
+            return (row[0], json.loads(row[1])) if row is not None else None
+        found = self.read(cond=cond, limit=1)
+        return found[0] if found else None
+
+    def iter(
+            self,
+            *,
+            cond: Query = None,
+            doc_ids: Iterable[int] = None,
+            fields: Iterable[str] = None,
+            chunk_size: int = 256
+    ) -> Iterator[tuple[int, dict]]:
+        """
+        Yields the matching (id, document) pairs ordered by id, reading them in pages of `chunk_size`,
+        so no statement (thus no read transaction) is kept open between the chunks.
+        """
+        if doc_ids is not None:
+            doc_ids = list(doc_ids)
+        after = None
+        while True:
+            chunk = self.read(cond=cond, doc_ids=doc_ids, limit=chunk_size, after=after, fields=fields)
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1][0]
+
+    def _update_expr(self, entity: Mapping) -> tuple[str, list]:
+        expr = 'data'
+        params = []
+        assigned = [(field, value) for field, value in entity.items() if value != DEL]
+        removed = [field for field, value in entity.items() if value == DEL]
+        if assigned:
+            expr = f'json_set({expr}, ' + ', '.join('?, json(?)' for _ in assigned) + ')'
+            for field, value in assigned:
+                params.extend((json_path(field), json.dumps(sort_keys(value))))
+        if removed:
+            expr = f'json_remove({expr}, ' + ', '.join('?' for _ in removed) + ')'
+            params.extend(json_path(field) for field in removed)
+        return expr, params
+
+    def update(self, entity: Mapping, *, cond: Query = None, doc_ids: Iterable[int] = None) -> list[int]:
+        """
+        Updates the documents matching both `cond` and `doc_ids` (if given) in place,
+        fields with a value of `DEL` are removed. Returns the updated ids ordered by id.
+        """
+        expr, params = self._update_expr(entity)
+        where, where_params = self._where(cond, doc_ids, None)
+        with self.transaction() as conn:
+            rows = conn.execute(
+                f'UPDATE {quote(self.table)} SET data = {expr}{where} RETURNING id', params + where_params).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def update_many(self, updates: Iterable[tuple[int, Mapping]]) -> list[int]:
+        """
+        Updates each document with its own update object in a single transaction.
+        Ids not present in the table are skipped.
+
+        Returns:
+            list[int]: The updated ids in the order of the updates.
+        """
+        updated_ids = []
+        with self.transaction() as conn:
+            for doc_id, entity in updates:
+                if not is_valid_id(doc_id):
+                    continue
+                expr, params = self._update_expr(entity)
+                cursor = conn.execute(f'UPDATE {quote(self.table)} SET data = {expr} WHERE id = ?', params + [doc_id])
+                if cursor.rowcount:
+                    updated_ids.append(doc_id)
+        return updated_ids
+
+    def delete(self, *, cond: Query = None, doc_ids: Iterable[int] = None) -> list[int]:
+        """
+        Deletes the documents matching both `cond` and `doc_ids` (if given), and returns the deleted ids ordered by id.
+        """
+        where, params = self._where(cond, doc_ids, None)
+        with self.transaction() as conn:
+            rows = conn.execute(f'DELETE FROM {quote(self.table)}{where} RETURNING id', params).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def delete_all(self):
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM {quote(self.table)}')
+
+    def count(self) -> int:
+        return self.get_connection().execute(f'SELECT COUNT(*) FROM {quote(self.table)}').fetchone()[0]
+
+    def dump(self) -> dict[str, Any]:
+        """Returns every document by its (string) id, like the raw table of TinyDB."""
+        return {str(doc_id): document for doc_id, document in self.read()}
@@ -0,0 +1,81 @@
+"""
+Copies the tables of a TinyDB database (e.g. `~/.mypass/db/tinydb/db.json`) into an SQLite database.
+Ids of the documents are kept, so references to them stay valid after the migration.
+
+Usage:
+    python -m mypass.db.sqlite.migrate ~/.mypass/db/tinydb/db.json ~/.mypass/db/sqlite/db.sqlite3
+"""
+import os
+from argparse import ArgumentParser
+from typing import Iterable, Type
+
+from tinydb import Storage
+from tinydb.storages import JSONStorage
+
+from mypass.db.tiny import LogStorage
+from mypass.types import MasterEntity, VaultEntity
+from ._impl import MasterSqliteRepository, VaultSqliteRepository
+from .dao import SqliteDao
+
+# indexed fields of the known tables
+TABLES = {
+    MasterEntity.table: MasterSqliteRepository.indexes,
+    VaultEntity.table: VaultSqliteRepository.indexes,
+}
+
+
+def migrate_tiny(
+        source: str | os.PathLike,
+        target: str | os.PathLike,
+        tables: Iterable[str] = None,
+        storage: Type[Storage] = JSONStorage
+) -> dict[str, int]:
+    """
+    Copies the documents of the given TinyDB tables into the tables of the same name of an SQLite database.
+    Every table is copied in a single transaction.
+
+    Parameters:
+        source (str | os.PathLike): Path of the TinyDB database, which is opened read-only.
+        target (str | os.PathLike): Path of the SQLite database, created if missing.
+        tables (Iterable[str]): Tables to copy, defaults to every table of the source.
+        storage (Type[Storage]): Storage class of the source, e.g. `LogStorage`.
+
+    Returns:
+        dict[str, int]: Number of copied documents by table.
+    Raises:
+        ValueError: If an id of the source already exists in the target table, the table is not copied then.
+    """
+    source_storage = storage(str(source), access_mode='r')
+    try:
+        data = source_storage.read() or {}
+    finally:
+        source_storage.close()
+    if tables is None:
+        tables = list(data)
+    copied = {}
+    for table in tables:
+        documents = data.get(table, {})
+        dao = SqliteDao(table, target, indexes=TABLES.get(table, ()))
+        try:
+            copied[table] = len(dao.create_many(documents.values(), (int(doc_id) for doc_id in documents)))
+        finally:
+            dao.close()
+    return copied
+
+
+def main():
+    arg_parser = ArgumentParser('mypass-migrate-sqlite')
+    arg_parser.add_argument('source', help='path of the TinyDB database (db.json)')
+    arg_parser.add_argument('target', help='path of the SQLite database')
+    arg_parser.add_argument('-t', '--tables', nargs='*', default=None, help='tables to copy, defaults to every table')
+    arg_parser.add_argument(
+        '-l', '--log', action='store_true', default=False, help='the source is stored by `LogStorage`')
+    args = arg_parser.parse_args()
+
+    copied = migrate_tiny(args.source, args.target, tables=args.tables, storage=LogStorage if args.log else JSONStorage)
+    for table, count in copied.items():
+        print(f'{table}: {count} documents copied')
+
+
+if __name__ == '__main__':
+    main()
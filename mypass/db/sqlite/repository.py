@@ -0,0 +1,122 @@
+from typing import Iterable, Optional, Generic, TypeVar, Iterator
+
+from mypass.db.repository import CrudRepository
+from mypass.db.utils import create_query
+from .dao import SqliteDao
+
+_ID = TypeVar('_ID')
+_T = TypeVar('_T')
+
+
+class SqliteRepository(CrudRepository, Generic[_ID, _T]):
+    """
+    Repository storing the entities in an SQLite table (see `SqliteDao`).
+    Criteria are evaluated by SQLite, using the indexes of the `indexes` fields.
+    """
+
+    # fields with a generated, indexed column, used when the repository creates its own dao
+    indexes: tuple[str, ...] = ()
+
+    def __init__(self, dao: SqliteDao = None, *args, **kwargs):
+        assert dao is None or (len(args) == 0 and len(kwargs) == 0), \
+            'When dao is specified, there should not be any arguments and/or keyword arguments present.'
+        super().__init__()
+        if dao is None:
+            kwargs.setdefault('indexes', self.indexes)
+            if not args and 'table' not in kwargs:
+                kwargs['table'] = self.entity_cls.table
+            dao = SqliteDao(*args, **kwargs)
+        self.dao = dao
+
+    def get_table_name(self):
+        return self.dao.table
+
+    def _entities(self, documents: Iterable[tuple[_ID, dict]]) -> list[_T]:
+        return [self.entity_cls(doc_id, **document) for doc_id, document in documents]
+
+    def _iter_entities(self, documents: Iterable[tuple[_ID, dict]]) -> Iterator[_T]:
+        for doc_id, document in documents:
+            yield self.entity_cls(doc_id, **document)
+
+    def create(self, entity: _T) -> _ID:
+        return self.dao.create(entity, doc_id=entity.id)
+
+    def create_many(self, entities: Iterable[_T]) -> list[_ID]:
+        entities = list(entities)
+        return self.dao.create_many(entities, [entity.id for entity in entities])
+
+    def find_one(self, entity: _T) -> Optional[_T]:
+        found = self.dao.read_one(cond=create_query(dict(entity), 'and'))
+        return self.entity_cls(found[0], **found[1]) if found is not None else None
+
+    def find_by_id(self, __id: _ID) -> Optional[_T]:
+        found = self.dao.read_one(doc_id=__id)
+        return self.entity_cls(found[0], **found[1]) if found is not None else None
+
+    def find_by_ids(
+            self, __ids: Iterable[_ID], *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        return self._entities(self.dao.read(doc_ids=__ids, limit=limit, after=cursor, fields=fields))
+
+    def find_by_crit(
+            self, crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        query = create_query(dict(crit), 'and')
+        return self._entities(self.dao.read(cond=query, limit=limit, after=cursor, fields=fields))
+
+    def find(
+            self, __ids: Iterable[_ID], crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        query = create_query(dict(crit), 'and')
+        return self._entities(self.dao.read(cond=query, doc_ids=__ids, limit=limit, after=cursor, fields=fields))
+
+    def find_all(self, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None) -> Iterable[_T]:
+        return self._entities(self.dao.read(limit=limit, after=cursor, fields=fields))
+
+    def iter_by_ids(self, __ids: Iterable[_ID], *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(doc_ids=__ids, fields=fields))
+
+    def iter_by_crit(self, crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(cond=create_query(dict(crit), 'and'), fields=fields))
+
+    def iter_find(self, __ids: Iterable[_ID], crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        query = create_query(dict(crit), 'and')
+        return self._iter_entities(self.dao.iter(cond=query, doc_ids=__ids, fields=fields))
+
+    def iter_all(self, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(fields=fields))
+
+    def update_by_id(self, __id: _ID, update: _T) -> Optional[_ID]:
+        updated = self.dao.update(update, doc_ids=[__id])
+        return updated[0] if updated else None
+
+    def update_by_ids(self, __ids: Iterable[_ID], update: _T) -> Iterable[_ID]:
+        return self.dao.update_many((pk, update) for pk in __ids)
+
+    def bulk_update(self, updates: Iterable[tuple[_ID, _T]]) -> Iterable[_ID]:
+        return self.dao.update_many(updates)
+
+    def update_by_crit(self, crit: _T, update: _T) -> Iterable[_ID]:
+        return self.dao.update(update, cond=create_query(dict(crit), 'and'))
+
+    def update(self, __ids: Iterable[_ID], crit: _T, update: _T) -> Iterable[_ID]:
+        return self.dao.update(update, cond=create_query(dict(crit), 'and'), doc_ids=__ids)
+
+    def update_all(self, update: _T) -> Iterable[_ID]:
+        return self.dao.update(update)
+
+    def remove_by_id(self, __id: _ID) -> Optional[_ID]:
+        removed = self.dao.delete(doc_ids=[__id])
+        return removed[0] if removed else None
+
+    def remove_by_ids(self, __ids: Iterable[_ID]) -> Iterable[_ID]:
+        return self.dao.delete(doc_ids=__ids)
+
+    def remove_by_crit(self, crit: _T) -> Iterable[_ID]:
+        return self.dao.delete(cond=create_query(dict(crit), 'and'))
+
+    def remove(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_ID]:
+        return self.dao.delete(cond=create_query(dict(crit), 'and'), doc_ids=__ids)
+
+    def remove_all(self):
+        self.dao.delete_all()
@@ -1,3 +1,7 @@
 from .dao import TinyDao
+from .locks import ReadWriteLock, FileLock
+from .middlewares import StatCachingMiddleware, GroupCommitMiddleware
 from .repository import TinyRepository
+from .sharding import ShardedTinyDao, shard_of
+from .storages import FileStorage, LogStorage, MmapStorage, MappedTable
 from ._impl import MasterTinyRepository, VaultTinyRepository
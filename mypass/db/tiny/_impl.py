@@ -1,10 +1,10 @@
-from mypass.types import MasterEntity, VaultEntity
+from mypass.types import MasterEntity, VaultEntity, const
 from .repository import TinyRepository
 
 
 class MasterTinyRepository(TinyRepository[int, MasterEntity]):
-    pass
+    indexes = ('user',)
 
 
 class VaultTinyRepository(TinyRepository[int, VaultEntity]):
-    pass
+    indexes = (const.UID_FIELD,)
@@ -1,12 +1,98 @@
+import logging
 import os
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Type, Iterable, Mapping
+from typing import Type, Iterable, Mapping, TypedDict, Iterator, Optional
 
 from tinydb import TinyDB, Storage
 from tinydb.queries import QueryLike
 from tinydb.table import Document
 
+from mypass.db.serializers import Serializer
+from mypass.db.utils import Query
+from mypass.utils import project_fields
 from . import operations as ops
+from .index import TableIndex
+from .locks import get_lock
+from .middlewares import StatCachingMiddleware, GroupCommitMiddleware
+from .storages import FileStorage, MmapStorage
+from .table import TinyTable
+
+logger = logging.getLogger(__name__)
+
+
+class _GroupCommitConf(TypedDict, total=False):
+    max_latency: float
+    max_batch: int
+
+
+class PersistentTinyDB(TinyDB):
+    """
+    Long-lived connection shared by every dao working on the same database.
+
+    Entering the connection as a context manager acquires the lock of its storage middleware
+    instead of opening it, and leaving the context releases the lock instead of closing the storage.
+    After releasing the lock, it waits until the writes made inside the context are durable.
+    """
+
+    def __enter__(self):
+        self.storage.lock.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.storage.lock.release()
+        self.storage.wait_durable()
+
+
+_connections: dict[tuple, PersistentTinyDB] = {}
+_connections_lock = threading.Lock()
+
+
+def _connection_key(storage: Type[Storage] | None, path: Path | None):
+    return storage, str(path.resolve()) if path is not None else None
+
+
+def get_persistent_connection(
+        *args,
+        storage: Type[Storage] = None,
+        group_commit: _GroupCommitConf = None,
+        **kwargs
+):
+    """
+    Returns the shared connection of the database, and opens it on first use.
+    The first call for a database decides the storage and group commit configuration of the connection.
+    """
+    key = _connection_key(storage, kwargs.get('path', None))
+    with _connections_lock:
+        conn = _connections.get(key, None)
+        if conn is None:
+            if storage is None:
+                storage = FileStorage
+            if group_commit is not None:
+                storage = GroupCommitMiddleware(storage, **group_commit)
+            else:
+                storage = StatCachingMiddleware(storage)
+            conn = PersistentTinyDB(*args, storage=storage, **kwargs)
+            _connections[key] = conn
+        return conn
+
+
+def close_persistent_connection(storage: Type[Storage] | None, path: Path | None):
+    with _connections_lock:
+        conn = _connections.pop(_connection_key(storage, path), None)
+    if conn is not None:
+        conn.close()
+
+
+def close_persistent_connections():
+    with _connections_lock:
+        conns = list(_connections.values())
+        _connections.clear()
+    for conn in conns:
+        conn.close()
 
 
 class TinyDao:
@@ -16,22 +102,92 @@ class TinyDao:
             path: str | os.PathLike = None,
             storage: Type[Storage] = None,
             *args,
+            persistent: bool = False,
+            group_commit: _GroupCommitConf = None,
+            indexes: Iterable[str] = None,
+            read_only: bool = False,
+            serializer: Serializer = None,
+            file_lock: bool = False,
+            slow_lock_warning: float = 1.0,
             **kwargs
     ):
+        """
+        Data access object for a single table of a TinyDB database.
+
+        Parameters:
+            table (str): Name of the table.
+            path (str | os.PathLike): Path of the database file (used by file based storages).
+            storage (Type[Storage]): Storage class, defaults to TinyDB's `JSONStorage`,
+                or `FileStorage` for persistent connections.
+            persistent (bool): If True, a long-lived connection is shared between daos of the same database,
+                and the parsed data is kept in memory until the database file changes.
+                Defaults to False, which opens a fresh connection for every operation.
+            group_commit (_GroupCommitConf): If given, writes of concurrent threads are persisted together
+                by a background flush (see `GroupCommitMiddleware`), and every operation returns
+                only after its writes are durable. Implies `persistent`.
+            indexes (Iterable[str]): Fields with a secondary hash index. Indexes are kept in memory,
+                thus they are only used with persistent connections.
+            read_only (bool): If True, the database file is memory-mapped by `MmapStorage` (unless a storage
+                is given), and documents are parsed only when accessed, thus reading a single document does not
+                parse the whole file. Writes raise IOError. Best used with persistent connections,
+                which keep the mapping until the file changes.
+            serializer (Serializer): Format of the database file, implies `FileStorage` (unless a storage is given).
+                Defaults to the JSON format of the storage.
+            file_lock (bool): If True, operations also lock the database against other processes
+                (`fcntl` lock of `<path>.lock`). Not supported with `group_commit`, as writes are flushed later.
+            slow_lock_warning (float): Waiting longer than this many seconds for the lock of the database is logged
+                as a warning.
+            kwargs: Keyword arguments of the storage, e.g. `fsync=False` for the default `FileStorage`
+                of persistent connections.
+        """
         if path is not None:
             path = Path(path)
+        if file_lock and (path is None or group_commit is not None):
+            raise ValueError('File locks require a database file, and cannot be used with group commit.')
+        if read_only and storage is None:
+            storage = MmapStorage
+        if serializer is not None:
+            if storage is None:
+                storage = FileStorage
+            kwargs['serializer'] = serializer
         self._path = path
+        self._read_only = read_only
+        self._file_lock = file_lock
+        self.slow_lock_warning = slow_lock_warning
         self._storage = storage
         self._storage_args = args
         self._storage_kwargs = kwargs
+        self._persistent = persistent or group_commit is not None
+        self._group_commit = group_commit
+        self._index = TableIndex(indexes) if indexes and self._persistent else None
         if storage is not None:
             self._storage_kwargs['storage'] = storage
         if path is not None:
             self._storage_kwargs['path'] = path
         self.table = table
 
-    def init_db(self):
+    @property
+    def persistent(self):
+        return self._persistent
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def read_only(self):
+        return self._read_only
+
+    def storage_paths(self, __ids: Iterable[int] = None) -> Optional[Iterable[str]]:
+        """Path of the database file (every document is stored in it), or None if the storage has no file."""
         if self._path is None:
+            return None
+        if __ids is not None and not __ids:
+            return []
+        return [str(self._path)]
+
+    def init_db(self):
+        if self._path is None or self._read_only:
             return
 
         if not self._path.parent.exists():
@@ -40,58 +196,306 @@ class TinyDao:
 
     def get_connection(self):
         self.init_db()
+        if self._persistent:
+            return get_persistent_connection(
+                *self._storage_args, group_commit=self._group_commit, **self._storage_kwargs)
         return TinyDB(*self._storage_args, **self._storage_kwargs)
 
+    def get_lock(self):
+        """Reader/writer lock of the database, shared by every dao of the same file in this process."""
+        return get_lock(self._path, file_lock=self._file_lock)
+
+    def lock_stats(self) -> dict[str, dict[str, float]]:
+        """Acquisitions and wait times (in seconds) of the database lock, separately for readers and writers."""
+        return self.get_lock().stats()
+
+    @contextmanager
+    def _connect(self, write: bool):
+        """
+        Opens the connection holding the lock of the database: shared by readers, exclusive for writers.
+        Writers of persistent connections also hold the lock of the storage middleware,
+        which excludes the group commit flush, and wait for their writes to be durable after releasing the locks.
+        """
+        lock = self.get_lock()
+        durable = write and self._persistent
+        conn = None
+        start = time.perf_counter()
+        try:
+            with lock.write() if write else lock.read():
+                waited = time.perf_counter() - start
+                if waited > self.slow_lock_warning:
+                    logger.warning(
+                        f'Waited {waited:.3f}s for the {"write" if write else "read"} lock of database {self._path}.')
+                conn = self.get_connection()
+                if not self._persistent:
+                    with conn:
+                        yield conn
+                elif write:
+                    with conn.storage.lock:
+                        yield conn
+                else:
+                    yield conn
+        finally:
+            if durable and conn is not None:
+                conn.storage.wait_durable()
+
+    def get_table(self, conn: TinyDB) -> TinyTable:
+        if self._persistent:
+            # tables are not reused, so no query cache or next id survives a reload of the file
+            return TinyTable(conn.storage, self.table, cache_size=0)
+        return TinyTable(conn.storage, self.table)
+
+    def close(self):
+        if self._persistent:
+            close_persistent_connection(self._storage, self._path)
+
     def unlink(self):
+        self.close()
         if self._path is not None:
             unlink(self._path)
 
+    def _raw_table(self, conn: TinyDB):
+        tables = conn.storage.read()
+        return tables.get(self.table, None) if tables else None
+
+    def _sync_index(self, conn: TinyDB):
+        if self._index is not None:
+            self._index.sync(self._raw_table(conn))
+
+    def _reindex(self, conn: TinyDB, doc_ids: Iterable[int]):
+        if self._index is not None:
+            self._index.update(self._raw_table(conn), doc_ids)
+
+    def _indexed_candidates(self, conn: TinyDB, cond: QueryLike, hint: Mapping | None):
+        """
+        Returns the (doc_id, document) pairs matching the condition, found through the indexes,
+        or None if the indexes cannot be used, and the table should be scanned.
+        Conjunctive `Query` conditions are used as hint, if no hint is given.
+        """
+        if cond is None:
+            return None
+        if hint is None and isinstance(cond, Query) and cond.logic == 'and':
+            hint = cond.criteria
+        doc_ids = None
+        if self._index is not None:
+            raw_table = self._raw_table(conn)
+            with self._index.lock:
+                self._index.sync(raw_table)
+                doc_ids = self._index.candidates(hint)
+        if doc_ids is None:
+            if isinstance(cond, Query):
+                examined = len(self._raw_table(conn) or {}) if self._persistent else None
+                cond.record_plan('scan', examined=examined)
+            return None
+        found = []
+        for doc_id in sorted(doc_ids):
+            document = raw_table[str(doc_id)]
+            if cond(document):
+                found.append((doc_id, document))
+        if isinstance(cond, Query):
+            cond.record_plan('index', index=[f for f in self._index.fields if f in hint], examined=len(doc_ids))
+        return found
+
     def create(self, entity: Mapping):
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
-            return t.insert(entity)
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            self._sync_index(conn)
+            doc_id = t.insert(entity)
+            self._reindex(conn, [doc_id])
+            return doc_id
 
-    def read_one(self, *, cond: QueryLike = None, doc_id: int = None):
+    def create_many(self, entities: Iterable[Mapping]) -> list[int]:
+        """
+        Inserts every entity with a single write, and returns the new ids in the order of the entities.
+        Nothing is written, if any of the entities cannot be inserted (e.g. its id already exists).
+        """
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            self._sync_index(conn)
+            doc_ids = t.insert_multiple(entities)
+            self._reindex(conn, doc_ids)
+            return doc_ids
+
+    def read_one(self, *, cond: QueryLike = None, doc_id: int = None, hint: Mapping = None):
+        """
+        Parameter `hint` is an optional mapping of equality criteria implied by `cond`,
+        which is used to narrow the search through the indexes (not needed for `Query` conditions).
+        """
         assert doc_id is None or cond is None, 'Specifying both `doc_id` and `cond` is invalid.'
         assert doc_id is not None or cond is not None, 'Specify either `doc_id` or `cond`.'
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
+        with self._connect(write=False) as conn:
+            t = self.get_table(conn)
+            found = self._indexed_candidates(conn, cond, hint)
+            if found is not None:
+                return t.document_class(found[0][1], found[0][0]) if found else None
             doc: Document | None = t.get(doc_id=doc_id, cond=cond)
             return doc
 
-    def read(self, *, cond: QueryLike = None, doc_ids: Iterable[int] = None):
+    def read(
+            self,
+            *,
+            cond: QueryLike = None,
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None,
+            limit: int = None,
+            after: int = None,
+            fields: Iterable[str] = None
+    ):
+        """
+        Parameters `limit` and `after` read a single page of the results (keyset pagination):
+        at most `limit` documents with an id greater than `after`, ordered by id.
+        Parameter `fields` is a projection, only the listed fields are copied into the returned documents.
+        """
         assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
+        if limit is not None or after is not None or fields is not None:
+            return self._read_raw(cond=cond, doc_ids=doc_ids, hint=hint, limit=limit, after=after, fields=fields)
+        with self._connect(write=False) as conn:
+            t = self.get_table(conn)
             if doc_ids is not None:
                 docs: list[Document] = t.get(doc_ids=list(doc_ids))
                 return docs
             elif cond is not None:
+                found = self._indexed_candidates(conn, cond, hint)
+                if found is not None:
+                    return [t.document_class(document, doc_id) for doc_id, document in found]
                 return t.search(cond)
             return t.all()
 
+    def _read_raw(
+            self,
+            *,
+            cond: QueryLike,
+            doc_ids: Iterable[int] | None,
+            hint: Mapping | None,
+            limit: int | None,
+            after: int | None,
+            fields: Iterable[str] | None
+    ):
+        # scans the raw table in id order, and copies only the matching documents (and only the requested fields)
+        if fields is not None:
+            fields = tuple(fields)
+        with self._connect(write=False) as conn:
+            t = self.get_table(conn)
+            found = self._indexed_candidates(conn, cond, hint)
+            raw_table = self._raw_table(conn) or {}
+            if found is not None:
+                cond, ids = None, [doc_id for doc_id, _ in found]
+            elif doc_ids is not None:
+                ids = sorted(set(doc_ids))
+            else:
+                # keys are mostly in insertion (ascending) order, which makes sorting them cheap
+                ids = sorted(map(int, raw_table))
+            if after is not None:
+                ids = ids[bisect_right(ids, after):]
+            docs = []
+            for doc_id in ids:
+                if limit is not None and len(docs) >= limit:
+                    break
+                document = raw_table.get(str(doc_id), None)
+                if document is not None and (cond is None or cond(document)):
+                    docs.append(t.document_class(project_fields(document, fields), doc_id))
+            return docs
+
+    def iter(
+            self,
+            *,
+            cond: QueryLike = None,
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None,
+            fields: Iterable[str] = None,
+            chunk_size: int = 256
+    ) -> Iterator[Document]:
+        """
+        Yields the matching documents one by one, without building the list of results.
+
+        With persistent connections, the ids of the candidate documents are collected first,
+        then the documents are copied in chunks of `chunk_size`, holding the lock of the connection
+        only while a chunk is copied. Documents removed in the meantime are skipped.
+        Otherwise, the documents are read at once (the whole file is parsed anyway).
+        Parameter `fields` is a projection, only the listed fields are copied into the yielded documents.
+        """
+        assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
+        if fields is not None:
+            fields = tuple(fields)
+        if not self._persistent:
+            yield from self.read(cond=cond, doc_ids=doc_ids, hint=hint, fields=fields)
+            return
+
+        with self._connect(write=False) as conn:
+            found = self._indexed_candidates(conn, cond, hint)
+            if found is not None:
+                # candidates are checked again when copied, they might change in the meantime
+                ids = [doc_id for doc_id, _ in found]
+            elif doc_ids is not None:
+                ids = list(doc_ids)
+            else:
+                ids = list(self._raw_table(conn) or ())
+        for start in range(0, len(ids), chunk_size):
+            chunk = []
+            with self._connect(write=False) as conn:
+                t = self.get_table(conn)
+                raw_table = self._raw_table(conn) or {}
+                for doc_id in ids[start:start + chunk_size]:
+                    document = raw_table.get(str(doc_id), None)
+                    if document is not None and (cond is None or cond(document)):
+                        chunk.append(t.document_class(project_fields(document, fields), int(doc_id)))
+            yield from chunk
+
     def update(
             self,
             entity: Mapping,
             *,
             cond: QueryLike = None,
-            doc_ids: Iterable[int] = None
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None
     ):
         assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
-            return t.update(ops.update(fields=entity), cond=cond, doc_ids=doc_ids)
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            found = self._indexed_candidates(conn, cond, hint)
+            if found is not None:
+                if not found:
+                    return []
+                cond, doc_ids = None, [doc_id for doc_id, _ in found]
+            self._sync_index(conn)
+            updated_ids = t.update(ops.update(fields=entity), cond=cond, doc_ids=doc_ids)
+            self._reindex(conn, updated_ids)
+            return updated_ids
+
+    def update_many(self, updates: Iterable[tuple[int, Mapping]]):
+        """
+        Updates each document with its own update object in a single write.
+        Ids not present in the table are skipped.
+
+        Returns:
+            list[int]: The updated ids in the order of the updates.
+        """
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            self._sync_index(conn)
+            updated_ids = t.update_existing((doc_id, ops.update(fields=entity)) for doc_id, entity in updates)
+            self._reindex(conn, updated_ids)
+            return updated_ids
 
-    def delete(self, *, cond: QueryLike = None, doc_ids: Iterable[int] = None):
+    def delete(self, *, cond: QueryLike = None, doc_ids: Iterable[int] = None, hint: Mapping = None):
         assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
-            return t.remove(cond=cond, doc_ids=doc_ids)
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            found = self._indexed_candidates(conn, cond, hint)
+            if found is not None:
+                if not found:
+                    return []
+                cond, doc_ids = None, [doc_id for doc_id, _ in found]
+            self._sync_index(conn)
+            removed_ids = t.remove(cond=cond, doc_ids=doc_ids)
+            self._reindex(conn, removed_ids)
+            return removed_ids
 
     def delete_all(self):
-        with self.get_connection() as conn:
-            t = conn.table(self.table)
-            return t.truncate()
+        with self._connect(write=True) as conn:
+            t = self.get_table(conn)
+            t.truncate()
+            self._sync_index(conn)
 
 
 def unlink(path: str | os.PathLike):
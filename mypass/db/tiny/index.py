@@ -0,0 +1,114 @@
+import threading
+from typing import Iterable, Mapping, Hashable, Optional
+
+_UNBOUND = object()
+
+
+class HashIndex:
+    """Maps the values of a single field to the ids of the documents containing them."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: dict[Hashable, set[int]] = {}
+        self._values: dict[int, Hashable] = {}
+
+    def clear(self):
+        self._ids.clear()
+        self._values.clear()
+
+    def add(self, doc_id: int, document: Mapping):
+        try:
+            value = document[self.field]
+            ids = self._ids.setdefault(value, set())
+        except (KeyError, TypeError):
+            # missing and unhashable values are not indexed, they never equal a hashable criteria value
+            return
+        ids.add(doc_id)
+        self._values[doc_id] = value
+
+    def remove(self, doc_id: int):
+        try:
+            value = self._values.pop(doc_id)
+        except KeyError:
+            return
+        ids = self._ids[value]
+        ids.discard(doc_id)
+        if not ids:
+            del self._ids[value]
+
+    def lookup(self, value) -> set[int]:
+        """
+        Raises:
+            TypeError: If the value is not hashable, thus cannot be looked up.
+        """
+        return self._ids.get(value, set())
+
+    def __len__(self):
+        return len(self._values)
+
+
+class TableIndex:
+    """
+    Secondary hash indexes of a single table.
+
+    The indexes are bound to one version of the raw table data (dict of str ids to documents).
+    TinyDB replaces the raw table dict on every write, so a different object means that
+    the table changed without the index noticing it (e.g. the file was reloaded), and the indexes are rebuilt.
+    Concurrent readers should hold `lock` while syncing and looking up the indexes.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self._indexes = {field: HashIndex(field) for field in fields}
+        self._table = _UNBOUND
+        self.lock = threading.Lock()
+
+    @property
+    def fields(self):
+        return tuple(self._indexes)
+
+    def sync(self, raw_table: Mapping[str, Mapping] | None):
+        if raw_table is self._table:
+            return
+        for index in self._indexes.values():
+            index.clear()
+        if raw_table is not None:
+            for doc_id, document in raw_table.items():
+                for index in self._indexes.values():
+                    index.add(int(doc_id), document)
+        self._table = raw_table
+
+    def update(self, raw_table: Mapping[str, Mapping] | None, doc_ids: Iterable[int]):
+        """
+        Re-indexes the documents changed by a write, and binds the indexes to the new raw table.
+        Should be called with the table synced before the write.
+        """
+        if raw_table is None:
+            self.sync(raw_table)
+            return
+        for doc_id in doc_ids:
+            document = raw_table.get(str(doc_id), None)
+            for index in self._indexes.values():
+                index.remove(doc_id)
+                if document is not None:
+                    index.add(doc_id, document)
+        self._table = raw_table
+
+    def candidates(self, crit: Mapping | None) -> Optional[set[int]]:
+        """
+        Returns the ids of the documents matching every indexed equality criterion,
+        or None if no index can be used for the criteria.
+        Non-indexed criteria are not checked, the result should be filtered by the full criteria.
+        """
+        if not crit:
+            return None
+        found = []
+        for field, index in self._indexes.items():
+            if field in crit:
+                try:
+                    found.append(index.lookup(crit[field]))
+                except TypeError:
+                    continue
+        if not found:
+            return None
+        found.sort(key=len)
+        return found[0].intersection(*found[1:])
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class WaitStats:
+    """Number of acquisitions of a lock, and the time spent waiting for them."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def add(self, wait: float):
+        self.acquired += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def merge(self, other: 'WaitStats'):
+        self.acquired += other.acquired
+        self.wait_total += other.wait_total
+        self.wait_max = max(self.wait_max, other.wait_max)
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            'acquired': self.acquired,
+            'wait_total': self.wait_total,
+            'wait_max': self.wait_max,
+            'wait_mean': self.wait_total / self.acquired if self.acquired else 0.0,
+        }
+
+
+class FileLock:
+    """
+    Advisory lock shared with other processes (`fcntl.flock` of a lock file), shared for readers,
+    exclusive for writers. The lock is held by the process, not by a thread, thus it is not reentrant,
+    and it is taken by `ReadWriteLock` once for all of its holders.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        Parameters:
+            path (str | os.PathLike): Path of the lock file, created if missing.
+
+        Raises:
+            OSError: If file locks are not supported on this platform (no `fcntl` module).
+        """
+        if fcntl is None:
+            raise OSError('File locks require the fcntl module, which is not available on this platform.')
+        self.path = Path(path)
+        self._fd = None
+
+    def acquire(self, shared: bool):
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ReadWriteLock:
+    """
+    Lock of a database allowing any number of concurrent readers, or a single writer.
+
+    Writers are preferred: once a writer is waiting, new readers wait too, so a steady stream of reads
+    cannot starve the writes. Threads already holding the lock can enter it again:
+    the writer can read or write, a reader can read, but it cannot upgrade to writing.
+    If a `file_lock` is set, it is taken shared by the first reader and exclusive by the writer of the process,
+    so readers and writers of other processes are excluded too.
+    The time spent waiting for the lock is collected separately for readers and writers (see `stats`).
+    """
+
+    def __init__(self, file_lock: FileLock = None):
+        self.file_lock = file_lock
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: dict[int, int] = {}
+        self._writer: int | None = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._stats = {'read': WaitStats(), 'write': WaitStats()}
+
+    def _acquire_read(self, me: int):
+        start = time.perf_counter()
+        with self._cond:
+            if me in self._readers:
+                self._readers[me] += 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            if not self._readers and self.file_lock is not None:
+                self.file_lock.acquire(shared=True)
+            self._readers[me] = 1
+            self._stats['read'].add(time.perf_counter() - start)
+
+    def _release_read(self, me: int):
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+                return
+            del self._readers[me]
+            if not self._readers:
+                if self.file_lock is not None:
+                    self.file_lock.release()
+                self._cond.notify_all()
+
+    def _acquire_write(self, me: int):
+        start = time.perf_counter()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError('Cannot acquire the write lock while holding the read lock.')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                if self.file_lock is not None:
+                    self.file_lock.acquire(shared=False)
+            finally:
+                self._waiting_writers -= 1
+                # readers blocked by this writer might proceed, if acquiring the file lock failed
+                self._cond.notify_all()
+            self._writer = me
+            self._writer_depth = 1
+            self._stats['write'].add(time.perf_counter() - start)
+
+    def _release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth:
+                return
+            self._writer = None
+            if self.file_lock is not None:
+                self.file_lock.release()
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            # the writer reads under its own lock
+            yield
+            return
+        self._acquire_read(me)
+        try:
+            yield
+        finally:
+            self._release_read(me)
+
+    @contextmanager
+    def write(self):
+        self._acquire_write(threading.get_ident())
+        try:
+            yield
+        finally:
+            self._release_write()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Acquisitions and wait times (in seconds) of the readers and of the writers."""
+        with self._cond:
+            return {mode: stats.as_dict() for mode, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._cond:
+            self._stats = {'read': WaitStats(), 'write': WaitStats()}
+
+
+def combine_stats(stats: Iterable[dict[str, dict[str, float]]]) -> dict[str, dict[str, float]]:
+    """Sums the statistics of multiple locks (e.g. the shards of a table)."""
+    combined = {'read': WaitStats(), 'write': WaitStats()}
+    for lock_stats in stats:
+        for mode, values in lock_stats.items():
+            other = WaitStats()
+            other.acquired, other.wait_total, other.wait_max = \
+                values['acquired'], values['wait_total'], values['wait_max']
+            combined[mode].merge(other)
+    return {mode: wait_stats.as_dict() for mode, wait_stats in combined.items()}
+
+
+_locks: dict[str | None, ReadWriteLock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_lock(path: str | os.PathLike | None, file_lock: bool = False) -> ReadWriteLock:
+    """
+    Returns the lock of the database, shared by every dao of the same file in this process.
+    Databases without a file (e.g. memory storages) share a single lock.
+
+    Parameters:
+        path (str | os.PathLike | None): Path of the database file.
+        file_lock (bool): If True, the lock also excludes other processes through `<path>.lock`.
+            Once enabled for a database, the file lock is used by every dao of it.
+    """
+    key = str(Path(path).resolve()) if path is not None else None
+    with _locks_lock:
+        lock = _locks.get(key, None)
+        if lock is None:
+            lock = _locks[key] = ReadWriteLock()
+        if file_lock and lock.file_lock is None:
+            if path is None:
+                raise ValueError('File locks require a database file.')
+            lock.file_lock = FileLock(Path(path).with_name(f'{Path(path).name}.lock'))
+        return lock
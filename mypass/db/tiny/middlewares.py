@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from tinydb.middlewares import Middleware
+
+
+def file_signature(path: str | os.PathLike | None):
+    """Returns an (inode, size, mtime) triple identifying the current state of the file, or None if missing."""
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class StatCachingMiddleware(Middleware):
+    """
+    Keeps the parsed database in memory between operations.
+
+    The underlying storage is only read again if the backing file changed since the last read or write.
+    Changes are detected by comparing the inode, size and modification time of the file,
+    so writes made by other processes are picked up on the next read.
+    If the file was replaced (inode changed) or removed, the underlying storage is reopened.
+
+    Storages without a backing file (no `path` argument), and storages keeping the data in memory themselves
+    (`caches_data` attribute, e.g. `LogStorage`) are not cached, every read goes to the storage.
+    Reads are thread-safe, connections sharing the middleware should hold `lock` while writing.
+    """
+
+    def __init__(self, storage_cls):
+        super().__init__(storage_cls)
+        self.lock = threading.RLock()
+        self._args = ()
+        self._kwargs = {}
+        self._path = None
+        self._data = None
+        self._loaded = False
+        self._signature = None
+
+    def __call__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        path = kwargs.get('path', args[0] if args else None)
+        self._path = Path(path) if path is not None else None
+        middleware = super().__call__(*args, **kwargs)
+        if getattr(self.storage, 'caches_data', False):
+            self._path = None
+        return middleware
+
+    @property
+    def path(self):
+        return self._path
+
+    def _reopen(self):
+        self.storage.close()
+        self.storage = self._storage_cls(*self._args, **self._kwargs)
+
+    def invalidate(self):
+        self._data = None
+        self._loaded = False
+        self._signature = None
+
+    def read(self):
+        if self._path is None:
+            return self.storage.read()
+        # concurrent readers might reload the file at the same time
+        with self.lock:
+            return self._read()
+
+    def _read(self):
+        # stat before reading, so a change racing with the read only causes an extra reload later
+        signature = file_signature(self._path)
+        if self._loaded and signature is not None and signature == self._signature:
+            return self._data
+
+        if signature is None or (self._signature is not None and signature[0] != self._signature[0]):
+            self._reopen()
+            signature = file_signature(self._path)
+        self._data = self.storage.read()
+        self._signature = signature
+        self._loaded = True
+        return self._data
+
+    def write(self, data):
+        try:
+            self.storage.write(data)
+        except BaseException:
+            # the cached data might already be modified in place by tinydb
+            self.invalidate()
+            raise
+        if self._path is not None:
+            self._data = data
+            self._signature = file_signature(self._path)
+            self._loaded = True
+
+    def wait_durable(self):
+        """Blocks until the writes of the calling thread are persisted. Writes are synchronous here."""
+
+    def close(self):
+        self.invalidate()
+        self.storage.close()
+
+
+class GroupCommitMiddleware(StatCachingMiddleware):
+    """
+    Write-behind extension of `StatCachingMiddleware`.
+
+    Writes only update the in-memory data, and a background thread persists all pending writes in one flush,
+    either when `max_batch` writes are pending, or when the oldest pending write is `max_latency` seconds old.
+    Writers should call `wait_durable` after releasing `lock`, which returns once their writes are flushed.
+    Storages providing `serialize` and `write_serialized` (like `FileStorage`) are written outside the lock,
+    so readers and writers are only blocked while the data is serialized.
+    """
+
+    def __init__(self, storage_cls, max_latency: float = 0.005, max_batch: int = 128):
+        """
+        Parameters:
+            storage_cls: The storage class to wrap.
+            max_latency (float): Maximum seconds a write waits for other writes to join its flush.
+            max_batch (int): Number of pending writes triggering a flush immediately.
+        """
+        super().__init__(storage_cls)
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._cond = threading.Condition(self.lock)
+        self._local = threading.local()
+        self._seq = 0
+        self._durable_seq = 0
+        # sequence ranges (start, end] of the failed flushes with their error, consecutive failures are merged
+        self._failures: list[tuple[int, int, Exception]] = []
+        self._first_pending = None
+        self._flushing = False
+        self._closed = False
+        self._flusher = None
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name='tinydb-group-commit', daemon=True)
+            self._flusher.start()
+
+    def read(self):
+        with self.lock:
+            if self._seq != self._durable_seq or self._flushing:
+                # in-memory data is ahead of the file
+                return self._data
+            return super().read()
+
+    def write(self, data):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Writing to a closed database.')
+            self._data = data
+            self._loaded = True
+            self._seq += 1
+            self._local.ticket = self._seq
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+            self._ensure_flusher()
+            self._cond.notify_all()
+
+    def wait_durable(self):
+        ticket = getattr(self._local, 'ticket', 0)
+        with self._cond:
+            while self._durable_seq < ticket:
+                self._cond.wait()
+            self._local.ticket = 0
+            error = self._failure_of(ticket)
+            if error is not None:
+                raise IOError(f'Flushing the database failed: {error}') from error
+
+    def _failure_of(self, ticket: int) -> Exception | None:
+        i = bisect_left(self._failures, ticket, key=lambda failure: failure[1])
+        if i < len(self._failures) and self._failures[i][0] < ticket:
+            return self._failures[i][2]
+        return None
+
+    def flush(self):
+        """Persists every pending write immediately."""
+        with self._cond:
+            self._flush()
+
+    def _flush(self):
+        # called while holding the lock
+        while self._flushing:
+            self._cond.wait()
+        if self._seq == self._durable_seq:
+            return
+        start, seq = self._durable_seq, self._seq
+        self._first_pending = None
+        try:
+            if hasattr(self.storage, 'write_serialized'):
+                serialized = self.storage.serialize(self._data)
+                self._flushing = True
+                self._cond.release()
+                try:
+                    self.storage.write_serialized(serialized)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+            else:
+                self.storage.write(self._data)
+        except Exception as e:
+            # every unflushed change is dropped (including the ones written meanwhile), the next read reloads the file
+            seq = self._seq
+            if self._failures and self._failures[-1][1] == start:
+                start = self._failures.pop()[0]
+            self._failures.append((start, seq, e))
+            self.invalidate()
+        else:
+            self._signature = file_signature(self._path)
+        self._durable_seq = seq
+        self._cond.notify_all()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while not self._closed and self._seq == self._durable_seq:
+                    self._cond.wait()
+                if self._seq == self._durable_seq:
+                    return
+                while not self._closed and self._seq - self._durable_seq < self.max_batch:
+                    remaining = self._first_pending + self.max_latency - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        super().close()
@@ -1,21 +1,26 @@
-from typing import Iterable, Optional, Generic, TypeVar
+from typing import Iterable, Optional, Generic, TypeVar, Iterator
 
 from tinydb.table import Document
 
 from mypass.db.repository import CrudRepository
 from mypass.db.tiny.dao import TinyDao
 from mypass.db.utils import create_query
+from mypass.utils import project_fields
 
 _ID = TypeVar('_ID')
 _T = TypeVar('_T')
 
 
 class TinyRepository(CrudRepository, Generic[_ID, _T]):
+    # fields with a secondary index, used when the repository creates its own dao
+    indexes: tuple[str, ...] = ()
+
     def __init__(self, dao: TinyDao = None, *args, **kwargs):
         assert dao is None or (len(args) == 0 and len(kwargs) == 0), \
             'When dao is specified, there should not be any arguments and/or keyword arguments present.'
         super().__init__()
         if dao is None:
+            kwargs.setdefault('indexes', self.indexes)
             try:
                 dao = TinyDao(*args, **kwargs)
             except TypeError:
@@ -25,11 +30,19 @@ class TinyRepository(CrudRepository, Generic[_ID, _T]):
     def get_table_name(self):
         return self.dao.table
 
+    def storage_paths(self, __ids: Iterable[_ID] = None) -> Optional[Iterable[str]]:
+        return self.dao.storage_paths(__ids)
+
     def create(self, entity: _T) -> _ID:
         if entity.id is not None:
             entity = Document(dict(entity), doc_id=entity.id)
         return self.dao.create(entity=entity)
 
+    def create_many(self, entities: Iterable[_T]) -> list[_ID]:
+        documents = [
+            Document(dict(entity), doc_id=entity.id) if entity.id is not None else entity for entity in entities]
+        return self.dao.create_many(documents)
+
     def find_one(self, entity: _T) -> Optional[_T]:
         return self.dao.read_one(cond=create_query(dict(entity), 'and'))
 
@@ -38,26 +51,57 @@ class TinyRepository(CrudRepository, Generic[_ID, _T]):
         if document is not None:
             return self.entity_cls(document.doc_id, **document)
 
-    def find_by_ids(self, __ids: Iterable[_ID]) -> Iterable[_T]:
-        documents = self.dao.read(doc_ids=__ids)
+    def find_by_ids(
+            self, __ids: Iterable[_ID], *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        documents = self.dao.read(doc_ids=__ids, limit=limit, after=cursor, fields=fields)
         return [self.entity_cls(document.doc_id, **document) for document in documents]
 
-    def find_by_crit(self, crit: _T) -> Iterable[_T]:
-        documents = self.dao.read(cond=create_query(dict(crit), 'and'))
+    def find_by_crit(
+            self, crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        documents = self.dao.read(cond=create_query(dict(crit), 'and'), limit=limit, after=cursor, fields=fields)
         return [self.entity_cls(document.doc_id, **document) for document in documents]
 
-    def find(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_T]:
-        cond_documents = self.dao.read(cond=create_query(dict(crit), 'and'))
+    def find(
+            self, __ids: Iterable[_ID], crit: _T, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None
+    ) -> Iterable[_T]:
+        query = create_query(dict(crit), 'and')
         allowed_ids = set(__ids)
+        if limit is not None or cursor is not None:
+            # the page is taken from the given ids (ordered), filtered by the criteria before the projection
+            documents = self.dao.read(doc_ids=allowed_ids, limit=len(allowed_ids), after=cursor)
+            documents = [document for document in documents if query(document)][:limit]
+            return [
+                self.entity_cls(document.doc_id, **project_fields(document, fields)) for document in documents]
+        cond_documents = self.dao.read(cond=query, fields=fields)
         return [
             self.entity_cls(document.doc_id, **document)
             for document in cond_documents if document.doc_id in allowed_ids
         ]
 
-    def find_all(self) -> Iterable[_T]:
-        documents = self.dao.read()
+    def find_all(self, *, limit: int = None, cursor: _ID = None, fields: Iterable[str] = None) -> Iterable[_T]:
+        documents = self.dao.read(limit=limit, after=cursor, fields=fields)
         return [self.entity_cls(document.doc_id, **document) for document in documents]
 
+    def _iter_entities(self, documents: Iterable[Document]) -> Iterator[_T]:
+        for document in documents:
+            yield self.entity_cls(document.doc_id, **document)
+
+    def iter_by_ids(self, __ids: Iterable[_ID], *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(doc_ids=__ids, fields=fields))
+
+    def iter_by_crit(self, crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(cond=create_query(dict(crit), 'and'), fields=fields))
+
+    def iter_find(self, __ids: Iterable[_ID], crit: _T, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        allowed_ids = set(__ids)
+        documents = self.dao.iter(cond=create_query(dict(crit), 'and'), fields=fields)
+        return self._iter_entities(document for document in documents if document.doc_id in allowed_ids)
+
+    def iter_all(self, *, fields: Iterable[str] = None) -> Iterator[_T]:
+        return self._iter_entities(self.dao.iter(fields=fields))
+
     def update_by_id(self, __id: _ID, update: _T) -> Optional[_ID]:
         try:
             return self.dao.update(entity=update, doc_ids=[__id])[0]
@@ -65,9 +109,11 @@ class TinyRepository(CrudRepository, Generic[_ID, _T]):
             return None
 
     def update_by_ids(self, __ids: Iterable[_ID], update: _T) -> Iterable[_ID]:
-        # filter out invalid ids first (prevent throwing KeyError)
-        __ids = [pk for pk in __ids if self.find_by_id(pk) is not None]
-        return self.dao.update(entity=update, doc_ids=__ids)
+        # invalid ids are skipped in the same write
+        return self.dao.update_many((pk, update) for pk in __ids)
+
+    def bulk_update(self, updates: Iterable[tuple[_ID, _T]]) -> Iterable[_ID]:
+        return self.dao.update_many(updates)
 
     def update_by_crit(self, crit: _T, update: _T) -> Iterable[_ID]:
         return self.dao.update(entity=update, cond=create_query(dict(crit), 'and'))
@@ -92,7 +138,7 @@ class TinyRepository(CrudRepository, Generic[_ID, _T]):
         return self.dao.delete(doc_ids=__ids)
 
     def remove_by_crit(self, crit: _T) -> Iterable[_ID]:
-        return self.dao.delete(cond=crit)
+        return self.dao.delete(cond=create_query(dict(crit), 'and'))
 
     def remove(self, __ids: Iterable[_ID], crit: _T) -> Iterable[_ID]:
         cond_documents = self.dao.read(cond=create_query(dict(crit), 'and'))
@@ -0,0 +1,330 @@
+import json
+import os
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, Mapping, Iterator, Optional
+
+from tinydb.queries import QueryLike
+from tinydb.table import Document
+
+from mypass.db.utils import Query
+from mypass.types import const
+from mypass.types.op import DEL
+from .dao import TinyDao
+from .locks import combine_stats
+
+
+def shard_of(value, shards: int) -> int:
+    """Stable (process independent) hash bucket of a JSON value."""
+    return zlib.crc32(json.dumps(value, sort_keys=True).encode('utf-8')) % shards
+
+
+class ShardedTinyDao:
+    """
+    Data access object splitting a single table into multiple TinyDB databases (shards).
+
+    Every document is stored in the shard selected by the hash of its `shard_key` field (the owner of a vault entry),
+    in its own file (`<folder>/<table>-<shard>.json`, or the extension of the shards' `serializer`),
+    so a write only rewrites the file of the owning shard.
+    Documents without the field are stored in the shard of the `None` value.
+
+    Ids are global integers encoding the shard: `global_id = local_id * shards + shard`,
+    thus operations by id are routed without lookups, and the ids of different shards never collide.
+    Conditions with an equality criterion on the shard key (`Query` conditions or hints) are routed to a single shard,
+    any other read is executed on every shard, and the results are merged in id order.
+
+    The interface is the same as of `TinyDao`, so it can be passed to any `TinyRepository`.
+    A document cannot change its shard: updating the shard key to a value of a different shard raises ValueError.
+    Updates hold the write locks of the affected shards while checking and writing,
+    so documents written concurrently cannot slip past the check.
+    """
+
+    def __init__(
+            self,
+            table: str,
+            folder: str | os.PathLike,
+            shards: int = 16,
+            shard_key: str = const.UID_FIELD,
+            **kwargs
+    ):
+        """
+        Parameters:
+            table (str): Name of the table.
+            folder (str | os.PathLike): Folder of the shard files.
+            shards (int): Number of shards. Changing it requires migrating the data, as ids encode the shard.
+            shard_key (str): Field selecting the shard of a document.
+            kwargs: Keyword arguments of the `TinyDao` of each shard (e.g. `persistent`, `indexes`).
+        """
+        assert shards > 0, 'At least one shard is required.'
+        self.table = table
+        self.folder = Path(folder)
+        self.shards = shards
+        self.shard_key = shard_key
+        width = len(str(shards - 1))
+        serializer = kwargs.get('serializer', None)
+        extension = serializer.extension if serializer is not None else '.json'
+        self._daos = [
+            TinyDao(table, path=self.folder / f'{table}-{shard:0{width}d}{extension}', **kwargs)
+            for shard in range(shards)]
+
+    @property
+    def persistent(self):
+        return self._daos[0].persistent
+
+    @property
+    def path(self):
+        return self.folder
+
+    def shard_paths(self) -> list[Path]:
+        return [dao.path for dao in self._daos]
+
+    def storage_paths(self, __ids: Iterable[int] = None) -> Optional[Iterable[str]]:
+        if __ids is None:
+            return [str(dao.path) for dao in self._daos]
+        return [str(self._daos[shard].path) for shard in sorted({doc_id % self.shards for doc_id in __ids})]
+
+    def lock_stats(self) -> dict[str, dict[str, float]]:
+        """Acquisitions and wait times of the database locks, summed over the shards."""
+        return combine_stats(dao.lock_stats() for dao in self._daos)
+
+    def get_shard(self, document: Mapping) -> int:
+        value = document.get(self.shard_key, None)
+        return shard_of(None if value is DEL else value, self.shards)
+
+    def _global(self, shard: int, doc_id: int) -> int:
+        return doc_id * self.shards + shard
+
+    def _split(self, doc_ids: Iterable[int]) -> dict[int, list[int]]:
+        local_ids = defaultdict(list)
+        for doc_id in doc_ids:
+            local_ids[doc_id % self.shards].append(doc_id // self.shards)
+        return local_ids
+
+    def _local_after(self, shard: int, after: int | None) -> int | None:
+        # greatest local id of the shard, whose global id is not greater than `after`
+        return None if after is None else (after - shard) // self.shards
+
+    def _globalize(self, shard: int, documents: Iterable[Document]) -> Iterator[Document]:
+        for document in documents:
+            document.doc_id = self._global(shard, document.doc_id)
+            yield document
+
+    def _route(self, cond: QueryLike | None, hint: Mapping | None) -> Iterable[int]:
+        if hint is None and isinstance(cond, Query) and cond.logic == 'and':
+            hint = cond.criteria
+        if hint is not None and self.shard_key in hint:
+            return self._existing([shard_of(hint[self.shard_key], self.shards)])
+        return self._existing(range(self.shards))
+
+    def _existing(self, shards: Iterable[int]) -> list[int]:
+        # shards never written to have no file, and are not opened (thus created) by reads
+        return [shard for shard in shards if self._daos[shard].path.exists()]
+
+    @contextmanager
+    def _write_locks(self, shards: Iterable[int]):
+        # taken in shard order, so concurrent writers of overlapping shards cannot deadlock
+        with ExitStack() as stack:
+            for shard in sorted(shards):
+                stack.enter_context(self._daos[shard].get_lock().write())
+            yield
+
+    def _check_moves(self, entity: Mapping, shards: Iterable[int], select) -> None:
+        # raises if the update would move any selected document into another shard
+        if self.shard_key not in entity:
+            return
+        target = self.get_shard(entity)
+        for shard in shards:
+            if shard != target and select(shard):
+                raise ValueError(
+                    f'Updating field "{self.shard_key}" cannot move documents between shards '
+                    f'(from shard {shard} to {target}).')
+
+    def init_db(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def close(self):
+        for dao in self._daos:
+            dao.close()
+
+    def unlink(self):
+        for dao in self._daos:
+            if dao.path.exists():
+                dao.unlink()
+            else:
+                dao.close()
+
+    def create(self, entity: Mapping) -> int:
+        shard = self.get_shard(entity)
+        if isinstance(entity, Document):
+            if entity.doc_id % self.shards != shard:
+                raise ValueError(f'Id {entity.doc_id} does not belong to shard {shard} of the document.')
+            entity = Document(entity, doc_id=entity.doc_id // self.shards)
+        self.init_db()
+        return self._global(shard, self._daos[shard].create(entity))
+
+    def create_many(self, entities: Iterable[Mapping]) -> list[int]:
+        """
+        Inserts the entities with a single write for each affected shard,
+        and returns the new ids in the order of the entities.
+        Inserting into each shard is atomic, but the batch as a whole is not.
+        """
+        batches = defaultdict(list)
+        positions = defaultdict(list)
+        count = 0
+        for position, entity in enumerate(entities):
+            shard = self.get_shard(entity)
+            if isinstance(entity, Document):
+                if entity.doc_id % self.shards != shard:
+                    raise ValueError(f'Id {entity.doc_id} does not belong to shard {shard} of the document.')
+                entity = Document(entity, doc_id=entity.doc_id // self.shards)
+            batches[shard].append(entity)
+            positions[shard].append(position)
+            count += 1
+        self.init_db()
+        doc_ids = [0] * count
+        for shard, batch in batches.items():
+            for position, doc_id in zip(positions[shard], self._daos[shard].create_many(batch)):
+                doc_ids[position] = self._global(shard, doc_id)
+        return doc_ids
+
+    def read_one(self, *, cond: QueryLike = None, doc_id: int = None, hint: Mapping = None):
+        assert doc_id is None or cond is None, 'Specifying both `doc_id` and `cond` is invalid.'
+        assert doc_id is not None or cond is not None, 'Specify either `doc_id` or `cond`.'
+        if doc_id is not None:
+            shard = doc_id % self.shards
+            if not self._existing([shard]):
+                return None
+            document = self._daos[shard].read_one(doc_id=doc_id // self.shards)
+            return next(self._globalize(shard, [document])) if document is not None else None
+        # the first document in id order, as read from a single table
+        found = self.read(cond=cond, hint=hint, limit=1)
+        return found[0] if found else None
+
+    def read(
+            self,
+            *,
+            cond: QueryLike = None,
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None,
+            limit: int = None,
+            after: int = None,
+            fields: Iterable[str] = None
+    ) -> list[Document]:
+        """
+        Reads the matching documents of every affected shard, merged in id order.
+        Parameters are the same as of `TinyDao.read`, a page is read from every shard, and the pages are merged.
+        """
+        assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
+        if fields is not None:
+            fields = tuple(fields)
+        if doc_ids is not None:
+            targets = [(shard, local_ids) for shard, local_ids in self._split(doc_ids).items()]
+            targets = [(shard, local_ids) for shard, local_ids in targets if self._existing([shard])]
+        else:
+            targets = [(shard, None) for shard in self._route(cond, hint)]
+        documents = []
+        for shard, local_ids in targets:
+            found = self._daos[shard].read(
+                cond=cond, doc_ids=local_ids, hint=hint,
+                limit=limit, after=self._local_after(shard, after), fields=fields)
+            documents.extend(self._globalize(shard, found))
+        documents.sort(key=lambda document: document.doc_id)
+        return documents[:limit] if limit is not None else documents
+
+    def iter(
+            self,
+            *,
+            cond: QueryLike = None,
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None,
+            fields: Iterable[str] = None,
+            chunk_size: int = 256
+    ) -> Iterator[Document]:
+        """Yields the matching documents shard by shard (see `TinyDao.iter`)."""
+        assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
+        if fields is not None:
+            fields = tuple(fields)
+        if doc_ids is not None:
+            targets = [(shard, local_ids) for shard, local_ids in sorted(self._split(doc_ids).items())]
+            targets = [(shard, local_ids) for shard, local_ids in targets if self._existing([shard])]
+        else:
+            targets = [(shard, None) for shard in self._route(cond, hint)]
+        return chain.from_iterable(
+            self._globalize(shard, self._daos[shard].iter(
+                cond=cond, doc_ids=local_ids, hint=hint, fields=fields, chunk_size=chunk_size))
+            for shard, local_ids in targets)
+
+    def update(
+            self,
+            entity: Mapping,
+            *,
+            cond: QueryLike = None,
+            doc_ids: Iterable[int] = None,
+            hint: Mapping = None
+    ) -> list[int]:
+        assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
+        if doc_ids is not None:
+            local_ids = self._split(doc_ids)
+            shards = self._existing(local_ids)
+        else:
+            shards = list(self._route(cond, hint))
+        updated_ids = []
+        with self._write_locks(shards):
+            if doc_ids is not None:
+                self._check_moves(
+                    entity, shards, lambda shard: self._daos[shard].read(doc_ids=local_ids[shard], fields=()))
+            else:
+                self._check_moves(
+                    entity, shards, lambda shard: self._daos[shard].read(cond=cond, hint=hint, limit=1, fields=()))
+            for shard in shards:
+                local_doc_ids = local_ids[shard] if doc_ids is not None else None
+                updated = self._daos[shard].update(entity, cond=cond, doc_ids=local_doc_ids, hint=hint)
+                updated_ids.extend(self._global(shard, doc_id) for doc_id in updated)
+        return updated_ids
+
+    def update_many(self, updates: Iterable[tuple[int, Mapping]]) -> list[int]:
+        """
+        Updates each document with its own update object, with a single write for each affected shard.
+        Ids not present in the table are skipped.
+
+        Returns:
+            list[int]: The updated ids in the order of the updates.
+        """
+        batches = defaultdict(list)
+        order = []
+        for doc_id, entity in updates:
+            shard = doc_id % self.shards
+            batches[shard].append((doc_id // self.shards, entity))
+            order.append(doc_id)
+        shards = self._existing(batches)
+        updated = set()
+        with self._write_locks(shards):
+            for shard in shards:
+                for doc_id, entity in batches[shard]:
+                    self._check_moves(
+                        entity, [shard], lambda s: self._daos[s].read(doc_ids=[doc_id], fields=()))
+            for shard in shards:
+                updated.update(
+                    self._global(shard, doc_id) for doc_id in self._daos[shard].update_many(batches[shard]))
+        return [doc_id for doc_id in order if doc_id in updated]
+
+    def delete(self, *, cond: QueryLike = None, doc_ids: Iterable[int] = None, hint: Mapping = None) -> list[int]:
+        assert doc_ids is None or cond is None, 'Specifying both `doc_ids` and `cond` is invalid.'
+        removed_ids = []
+        if doc_ids is not None:
+            local_ids = self._split(doc_ids)
+            for shard in self._existing(local_ids):
+                removed = self._daos[shard].delete(doc_ids=local_ids[shard])
+                removed_ids.extend(self._global(shard, doc_id) for doc_id in removed)
+            return removed_ids
+        for shard in self._route(cond, hint):
+            removed = self._daos[shard].delete(cond=cond, hint=hint)
+            removed_ids.extend(self._global(shard, doc_id) for doc_id in removed)
+        return removed_ids
+
+    def delete_all(self):
+        for shard in self._existing(range(self.shards)):
+            self._daos[shard].delete_all()
@@ -0,0 +1,482 @@
+import copy
+import io
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Mapping, Iterator
+
+from tinydb import Storage
+from tinydb.storages import touch
+
+from mypass.db.serializers import Serializer, JsonSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class FileStorage(Storage):
+    """
+    File storage compatible with TinyDB's `JSONStorage` (with the default JSON serializer),
+    which can serialize and write the data in separate steps, and has a configurable fsync policy
+    and serialization format.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            create_dirs=False,
+            encoding=None,
+            access_mode='r+',
+            fsync: bool = True,
+            serializer: Serializer = None,
+            **kwargs
+    ):
+        """
+        Parameters:
+            path (str): Path of the database file.
+            create_dirs (bool): Creates missing parent directories if True.
+            encoding (str): Encoding of the database file (used by the default JSON serializer).
+            access_mode (str): Mode in which the file is opened, one of 'r' or 'r+'.
+            fsync (bool): If True, every write is flushed to the disk with `os.fsync`,
+                otherwise writes are only handed over to the operating system. Defaults to True.
+            serializer (Serializer): Format of the database file, defaults to JSON.
+            kwargs: Keyword arguments passed to `json.dumps` by the default JSON serializer.
+        """
+        super().__init__()
+        self._mode = access_mode
+        self._fsync = fsync
+        self.kwargs = kwargs
+        self.serializer = serializer if serializer is not None else JsonSerializer(encoding, **kwargs)
+
+        if '+' in self._mode:
+            touch(path, create_dirs=create_dirs)
+        self._handle = open(path, mode=f'{self._mode}b')
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        self._handle.seek(0)
+        raw = self._handle.read()
+        if not raw:
+            return None
+        return self.serializer.loads(raw)
+
+    def serialize(self, data: Dict[str, Dict[str, Any]]) -> bytes:
+        return self.serializer.dumps(data)
+
+    def write_serialized(self, serialized: bytes):
+        self._handle.seek(0)
+        try:
+            self._handle.write(serialized)
+        except io.UnsupportedOperation:
+            raise IOError(f'Cannot write to the database. Access mode is "{self._mode}"')
+        self._handle.flush()
+        if self._fsync:
+            os.fsync(self._handle.fileno())
+        self._handle.truncate()
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        self.write_serialized(self.serialize(data))
+
+
+def _copy_document(document: Mapping) -> dict:
+    # nested values might be modified in place by update operations, so they are copied too
+    return {k: copy.deepcopy(v) if isinstance(v, (dict, list)) else v for k, v in document.items()}
+
+
+class _TrackedDocument(dict):
+    """Document of `LogStorage`, flagged as changed by any modification of its own keys."""
+
+    __slots__ = ('changed',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = False
+
+    def __setitem__(self, key, value):
+        self.changed = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.changed = True
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self.changed = True
+        return super().__ior__(other)
+
+    def update(self, *args, **kwargs):
+        self.changed = True
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self.changed = True
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.changed = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.changed = True
+        return super().popitem()
+
+    def clear(self):
+        self.changed = True
+        super().clear()
+
+
+class LogStorage(Storage):
+    """
+    Append-only log storage keeping the whole database in memory.
+
+    The database consists of a snapshot file (`path`, same format as TinyDB's `JSONStorage`)
+    and a log file (`<path>.log`). Every write appends only the changes (inserted or updated documents,
+    deleted documents and dropped tables) to the log as a single JSON line, so the size of the appended record
+    depends on the size of the change, not on the size of the database. On startup, the snapshot is loaded
+    and the log is replayed.
+
+    Changes are found without comparing the content of documents, and without a copy of the database:
+    TinyDB rebuilds the dict of the written table on every write, so other tables are skipped by identity,
+    and in the written table, documents are compared by identity (inserted ones are new objects),
+    and documents modified in place are flagged by their class. Thus, the CPU cost of a write is a pass over
+    the ids of the written table (as the rebuild of the table by TinyDB itself), plus the size of the change.
+    Nested values of documents should be replaced, not modified in place (as the update operations do),
+    otherwise the change is not logged.
+
+    Once the log grows beyond `compact_threshold` bytes, it is rotated (`<path>.log.old`),
+    and a background thread writes a new snapshot and removes the rotated log.
+    Writes are not blocked by the compaction. A crash during compaction is recovered on startup
+    by replaying the rotated log too, as replaying a change twice leads to the same state.
+
+    The storage is meant to be used by a single process, changes made by other processes are not picked up.
+    """
+
+    caches_data = True
+
+    def __init__(
+            self,
+            path: str,
+            create_dirs=False,
+            encoding=None,
+            access_mode='r+',
+            fsync: bool = True,
+            compact_threshold: int = 4 * 1024 * 1024,
+            **kwargs
+    ):
+        """
+        Parameters:
+            path (str): Path of the snapshot file, the log is stored next to it.
+            create_dirs (bool): Creates missing parent directories if True.
+            encoding (str): Encoding of the database files.
+            access_mode (str): Mode in which the database is opened, one of 'r' or 'r+'.
+            fsync (bool): If True, every appended change is flushed to the disk with `os.fsync`,
+                otherwise it is only handed over to the operating system. Defaults to True.
+            compact_threshold (int): Size of the log in bytes, which triggers a compaction.
+            kwargs: Keyword arguments passed to `json.dumps`.
+        """
+        super().__init__()
+        self.path = Path(path)
+        self.log_path = self.path.with_name(f'{self.path.name}.log')
+        self.old_log_path = self.path.with_name(f'{self.path.name}.log.old')
+        self._mode = access_mode
+        self._encoding = encoding
+        self._fsync = fsync
+        self.compact_threshold = compact_threshold
+        self.kwargs = kwargs
+        self._lock = threading.Lock()
+        self._compactor: threading.Thread | None = None
+        self._log = None
+
+        if '+' in self._mode:
+            touch(str(self.path), create_dirs=create_dirs)
+        self._data = {table: {doc_id: _TrackedDocument(doc) for doc_id, doc in docs.items()}
+                      for table, docs in self._load().items()}
+        # table dicts as of the last write, TinyDB replaces the dict of a table when writing it
+        self._tables: dict[str, dict[str, dict]] = dict(self._data)
+        if '+' in self._mode:
+            self._log = open(self.log_path, 'a', encoding=self._encoding or 'utf-8')
+            self._log_size = self._log.tell()
+
+    @property
+    def log_size(self) -> int:
+        return self._log_size if self._log is not None else 0
+
+    def _load(self) -> dict[str, dict[str, dict]]:
+        try:
+            with open(self.path, 'r', encoding=self._encoding) as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ''
+        state = json.loads(content) if content else {}
+        for log_path in (self.old_log_path, self.log_path):
+            self._replay(log_path, state)
+        return state
+
+    def _replay(self, log_path: Path, state: dict):
+        try:
+            with open(log_path, 'rb') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for i, line in enumerate(lines):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError('Incomplete record.')
+                record = json.loads(line.decode(self._encoding or 'utf-8'))
+            except ValueError:
+                if i == len(lines) - 1:
+                    # the last change was not written completely (e.g. crash), thus it was never acknowledged
+                    logger.warning(f'Dropping the incomplete last record of {log_path}.')
+                    if '+' in self._mode:
+                        with open(log_path, 'r+b') as f:
+                            f.truncate(sum(len(previous) for previous in lines[:i]))
+                    return
+                raise
+            self._apply(record, state)
+
+    @staticmethod
+    def _apply(record: Mapping, state: dict):
+        for table in record.get('drop', ()):
+            state.pop(table, None)
+        for table, docs in record.get('put', {}).items():
+            state.setdefault(table, {}).update(docs)
+        for table, doc_ids in record.get('del', {}).items():
+            docs = state.get(table, {})
+            for doc_id in doc_ids:
+                docs.pop(doc_id, None)
+
+    def _diff(self, data: Mapping[str, Mapping[str, Mapping]]) -> dict:
+        record = {}
+        dropped = [table for table in self._tables if table not in data]
+        if dropped:
+            record['drop'] = dropped
+        for table, docs in data.items():
+            previous = self._tables.get(table, None)
+            if docs is previous:
+                continue
+            if previous is None:
+                record.setdefault('put', {})[table] = dict(docs)
+                continue
+            put = {
+                doc_id: doc for doc_id, doc in docs.items()
+                if type(doc) is not _TrackedDocument or doc.changed or previous.get(doc_id, None) is not doc}
+            if put:
+                record.setdefault('put', {})[table] = put
+            # every document of the table is either kept, updated or inserted, unless some are deleted
+            inserted = sum(1 for doc_id in put if doc_id not in previous)
+            if len(previous) + inserted > len(docs):
+                deleted = [doc_id for doc_id in previous if doc_id not in docs]
+                if deleted:
+                    record.setdefault('del', {})[table] = deleted
+        return record
+
+    @staticmethod
+    def _track(data: dict[str, dict[str, dict]], put: Mapping[str, Mapping[str, Mapping]]):
+        # logged documents are tracked from now on, as unchanged
+        for table, docs in put.items():
+            target = data[table]
+            for doc_id, doc in docs.items():
+                if type(doc) is _TrackedDocument:
+                    doc.changed = False
+                else:
+                    target[doc_id] = _TrackedDocument(doc)
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self._data if self._data else None
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        if self._log is None:
+            raise IOError(f'Cannot write to the database. Access mode is "{self._mode}"')
+        with self._lock:
+            record = self._diff(data)
+            if record:
+                line = json.dumps(record, **self.kwargs) + '\n'
+                self._log.write(line)
+                self._log.flush()
+                if self._fsync:
+                    os.fsync(self._log.fileno())
+                self._log_size += len(line)
+                self._track(data, record.get('put', {}))
+            self._data = data
+            self._tables = dict(data)
+            if self._log_size >= self.compact_threshold:
+                self._start_compaction()
+
+    def _rotate(self):
+        # called while holding the lock
+        self._log.close()
+        if self.old_log_path.exists():
+            # the previous compaction failed, the rotated log is kept, and the new changes are appended to it
+            with open(self.old_log_path, 'ab') as old, open(self.log_path, 'rb') as log:
+                shutil.copyfileobj(log, old)
+            os.remove(self.log_path)
+        else:
+            os.replace(self.log_path, self.old_log_path)
+        self._log = open(self.log_path, 'a', encoding=self._encoding or 'utf-8')
+        self._log_size = 0
+
+    def _start_compaction(self):
+        # called while holding the lock
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._rotate()
+        # documents are modified in place by the writes, the snapshot is written from a copy
+        state = {table: {doc_id: _copy_document(doc) for doc_id, doc in docs.items()}
+                 for table, docs in self._data.items()}
+        self._compactor = threading.Thread(target=self._compact, args=(state,), name='tinydb-log-compaction')
+        self._compactor.start()
+
+    def _compact(self, state: dict):
+        tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding=self._encoding) as f:
+                json.dump(state, f, **self.kwargs)
+                f.flush()
+                if self._fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            os.remove(self.old_log_path)
+        except Exception as e:
+            logger.error(f'Compacting the database log failed: {e}')
+
+    def compact(self):
+        """Writes a new snapshot of the database, and waits until it is done."""
+        with self._lock:
+            if self._log is None:
+                raise IOError(f'Cannot write to the database. Access mode is "{self._mode}"')
+            self._start_compaction()
+            compactor = self._compactor
+        compactor.join()
+
+    def close(self) -> None:
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# a string, optionally followed by an object without nested objects as its value (`"key": {...}`), or a brace
+_TOKEN = re.compile(
+    rb'"((?:[^"\\]++|\\.)*+)"(?:\s*+:\s*+(\{(?:[^"{}]++|"(?:[^"\\]++|\\.)*+")*+\}))?|([{}])')
+
+
+def _decode_key(raw: bytes) -> str:
+    return json.loads(b'"' + raw + b'"') if b'\\' in raw else raw.decode('utf-8')
+
+
+class MappedTable(Mapping):
+    """
+    Read-only raw table of a memory-mapped database.
+    Keeps only the location of every document in the file, and parses a document each time it is accessed.
+    """
+
+    def __init__(self, buffer: mmap.mmap, spans: dict[str, tuple[int, int]], encoding: str = None):
+        self._buffer = buffer
+        self._spans = spans
+        self._encoding = encoding
+
+    def __getitem__(self, doc_id: str) -> dict:
+        start, end = self._spans[doc_id]
+        raw = self._buffer[start:end]
+        return json.loads(raw.decode(self._encoding) if self._encoding else raw)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._spans
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+
+class MmapStorage(Storage):
+    """
+    Read-only storage memory-mapping a JSON database file (format of TinyDB's `JSONStorage`).
+
+    Reading the database does not load the file into a string, nor parse it: the mapped file is scanned once
+    for the locations of the tables and documents, and every document is parsed only when it is accessed
+    (see `MappedTable`). A lookup by id parses a single document, only scans (e.g. queries without an index)
+    parse every document of the table, one at a time. Parsed documents are not kept, pages of the file
+    are cached by the operating system instead of the Python heap.
+
+    Meant to be used with persistent connections, which keep the scanned locations until the file changes.
+    The file must be replaced atomically by writers (e.g. `os.replace`, like `LogStorage` compaction),
+    truncating a mapped file in place makes reading its mapping fail.
+    """
+
+    def __init__(self, path: str, encoding: str = None, access_mode: str = 'r', **kwargs):
+        """
+        Parameters:
+            path (str): Path of the database file.
+            encoding (str): Encoding of the database file, defaults to UTF-8 (or any encoding detected by `json`).
+            access_mode (str): Only 'r' is supported, as the storage is read-only.
+            kwargs: Other keyword arguments of file storages (e.g. `create_dirs`) are ignored.
+        """
+        super().__init__()
+        if '+' in access_mode or 'w' in access_mode or 'a' in access_mode:
+            raise IOError(f'Memory-mapped storage is read-only, got access mode "{access_mode}".')
+        self._path = path
+        self._mode = access_mode
+        self._encoding = encoding
+
+    def _map(self) -> mmap.mmap | None:
+        try:
+            with open(self._path, 'rb') as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return None
+                # the mapping stays valid after closing the file, until every table referring to it is released
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def read(self) -> Optional[Dict[str, Mapping[str, Any]]]:
+        buffer = self._map()
+        if buffer is None:
+            return None
+        # documents are the objects at depth 3 (root -> table -> document)
+        tables = {}
+        spans = {}
+        table, doc_id, key = None, None, None
+        depth, doc_start = 0, 0
+        for match in _TOKEN.finditer(buffer):
+            raw_key, flat, brace = match.groups()
+            if flat is not None:
+                # a whole object without nested objects, the common case of a document
+                if depth == 2:
+                    spans[_decode_key(raw_key)] = match.span(2)
+                elif depth == 1:
+                    tables[_decode_key(raw_key)] = MappedTable(buffer, {}, self._encoding)
+            elif brace == b'{':
+                depth += 1
+                if depth == 2:
+                    table, spans = key, {}
+                elif depth == 3:
+                    doc_id, doc_start = key, match.start()
+            elif brace == b'}':
+                if depth == 3:
+                    spans[doc_id] = (doc_start, match.end())
+                elif depth == 2:
+                    tables[table] = MappedTable(buffer, spans, self._encoding)
+                depth -= 1
+            elif depth < 3:
+                # key of the next object, if it is followed by one
+                key = _decode_key(raw_key)
+        if depth != 0:
+            raise ValueError(f'Invalid database file {self._path}, unbalanced braces.')
+        return tables
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        raise IOError(f'Cannot write to the database. Access mode is "{self._mode}"')
+
+    def close(self) -> None:
+        # mappings are released with the last table referring to them, tables still in use remain readable
+        pass
@@ -0,0 +1,41 @@
+from typing import Iterable, Callable, Mapping
+
+from tinydb.table import Table
+
+
+class TinyTable(Table):
+    """TinyDB table extended with batched operations, which need exactly one read and one write."""
+
+    def get(self, cond=None, doc_id: int = None, doc_ids: list = None):
+        """
+        Same as `Table.get`, but documents are looked up by their ids, instead of scanning the table.
+        Documents are returned in ascending id order.
+        """
+        if doc_id is None and doc_ids is not None:
+            table = self._read_table()
+            found = []
+            for key in sorted({int(i) for i in doc_ids}):
+                document = table.get(str(key), None)
+                if document is not None:
+                    found.append(self.document_class(document, self.document_id_class(key)))
+            return found
+        return super().get(cond=cond, doc_id=doc_id, doc_ids=doc_ids)
+
+    def update_existing(self, updates: Iterable[tuple[int, Callable[[dict], None]]]) -> list[int]:
+        """
+        Applies a separate update operation to each document, skipping ids not present in the table.
+
+        Returns:
+            list[int]: Ids of the updated documents in the order of the updates.
+        """
+        updated_ids = []
+
+        def updater(table: dict[int, Mapping]):
+            for doc_id, operation in updates:
+                document = table.get(doc_id, None)
+                if document is not None:
+                    operation(document)
+                    updated_ids.append(doc_id)
+
+        self._update_table(updater)
+        return updated_ids
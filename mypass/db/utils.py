@@ -1,4 +1,5 @@
-from typing import Literal, Callable, Any, Iterable
+from functools import lru_cache
+from typing import Literal, Callable, Any, Iterable, Mapping
 
 from mypass.exceptions import MasterPasswordExistsError, UserNotExistsError, InvalidUpdateError, RequiresIdError, \
     EmptyRecordInsertionError, EmptyQueryError, RecordNotFoundError
@@ -7,18 +8,104 @@ from mypass.types import const
 from mypass.utils import gen_uuid
 from .repository import CrudRepository
 
+_MISSING = object()
+
+
+class _CompiledCriteria:
+    """
+    Evaluates criteria of a given shape (set of keys and logic) against documents.
+
+    The first `sample_size` evaluations check every key, and count how often each key matches.
+    Afterward, keys are evaluated with short-circuit, the most selective ones first
+    (for `and` the least often matching keys, for `or` the most often matching keys).
+    """
+
+    sample_size = 64
+
+    def __init__(self, keys: tuple[str, ...], logic: Literal['and', 'or']):
+        self.keys = keys
+        self.logic = logic
+        self.order = keys
+        self._samples = 0
+        self._matches = dict.fromkeys(keys, 0)
+
+    def _sample(self, document: Mapping, criteria: Mapping):
+        get = document.get
+        results = [get(k, _MISSING) == criteria[k] for k in self.keys]
+        for k, result in zip(self.keys, results):
+            self._matches[k] += result
+        self._samples += 1
+        if self._samples >= self.sample_size:
+            self.order = tuple(sorted(self.keys, key=self._matches.__getitem__, reverse=self.logic == 'or'))
+        return all(results) if self.logic == 'and' else any(results)
+
+    def __call__(self, document: Mapping, criteria: Mapping) -> bool:
+        if self._samples < self.sample_size:
+            return self._sample(document, criteria)
+        get = document.get
+        if self.logic == 'and':
+            for k in self.order:
+                if get(k, _MISSING) != criteria[k]:
+                    return False
+            return True
+        for k in self.order:
+            if get(k, _MISSING) == criteria[k]:
+                return True
+        return False
+
+
+@lru_cache(maxsize=256)
+def compile_criteria(keys: tuple[str, ...], logic: Literal['and', 'or']) -> _CompiledCriteria:
+    """Returns the shared compiled evaluator of a criteria shape."""
+    return _CompiledCriteria(keys, logic)
+
+
+class Query:
+    """
+    Reusable predicate built from a criteria mapping, comparing the values of documents for equality.
+    Missing keys evaluate to false.
+
+    Backends record how they executed the query (index lookup or full scan), which is reported by `explain`.
+    """
+
+    __slots__ = ('criteria', 'logic', 'plan', '_compiled')
+
+    def __init__(self, criteria: Mapping, logic: Literal['and', 'or'] = 'and'):
+        self.criteria = dict(criteria)
+        self.logic = logic
+        self.plan: dict | None = None
+        self._compiled = compile_criteria(tuple(sorted(self.criteria)), logic)
+
+    def __call__(self, document: Mapping) -> bool:
+        return self._compiled(document, self.criteria)
+
+    def record_plan(self, strategy: Literal['index', 'scan'], *, index: Iterable[str] = (), examined: int = None):
+        self.plan = {'strategy': strategy, 'index': list(index), 'examined': examined}
+
+    def explain(self) -> dict:
+        """
+        Returns the execution plan of the last run of the query:
+        the used strategy (`index`, `scan` or None if not executed yet), the indexed fields used,
+        the number of examined documents, and the evaluation order of the keys.
+        """
+        plan = self.plan if self.plan is not None else {'strategy': None, 'index': [], 'examined': None}
+        return {**plan, 'logic': self.logic, 'order': list(self._compiled.order)}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.criteria}, logic="{self.logic}")'
 
-def create_query_all(query_like: dict):
+
+def create_query_all(query_like: Mapping):
     """Missing keys will cause filter to return false."""
-    return lambda q: all([q[k] == v if k in q else False for k, v in query_like.items()])
+    return Query(query_like, 'and')
 
 
-def create_query_any(query_like: dict):
+def create_query_any(query_like: Mapping):
     """Missing keys will evaluate to false."""
-    return lambda q: any([q[k] == v if k in q else False for k, v in query_like.items()])
+    return Query(query_like, 'or')
 
 
-def create_query(query_like: dict, logic: Literal['and', 'or']) -> Callable[[Any], bool]:
+def create_query(query_like: Mapping, logic: Literal['and', 'or']) -> Callable[[Any], bool]:
     """Missing keys will evaluate to false."""
     if logic == 'and':
         return create_query_all(query_like)
@@ -55,7 +142,7 @@ class MasterDbSupport:
             try:
                 return self.repo.create(entity=entity)
             except RequiresIdError:
-                entity.id = gen_uuid(self.repo.id_cls.__class__.__name__)
+                entity.id = gen_uuid(self.repo.id_cls.__name__)
                 return self.repo.create(entity=entity)
         raise MasterPasswordExistsError('Trying to store multiple master passwords for the same user.')
 
@@ -120,9 +207,35 @@ class VaultDbSupport:
         try:
             return self.repo.create(entity=entity)
         except RequiresIdError:
-            entity.id = gen_uuid(self.repo.id_cls.__class__.__name__)
+            entity.id = gen_uuid(self.repo.id_cls.__name__)
             return self.repo.create(entity=entity)
 
+    def create_vault_entries(self, __uid=None, *, entities: Iterable[VaultEntity]):
+        """
+        Creates multiple entries inside password vault db with a single batched write (if the repository supports it).
+        If given, special UID field will be inserted inside every entity.
+
+        Raises:
+            EmptyRecordInsertionError: Raises if any of the records is empty, nothing is inserted in that case.
+
+        Returns:
+            list[str | int]: Identifications of the created entries, in the order of the entities.
+        """
+
+        entities = list(entities)
+        if any(entity.is_empty() for entity in entities):
+            raise EmptyRecordInsertionError('Cannot insert empty record into vault table.')
+        if __uid is not None:
+            for entity in entities:
+                entity[const.UID_FIELD] = __uid
+        try:
+            return self.repo.create_many(entities)
+        except RequiresIdError:
+            for entity in entities:
+                if not entity.id:
+                    entity.id = gen_uuid(self.repo.id_cls.__name__)
+            return self.repo.create_many(entities)
+
     def read_vault_entry(self, __uid=None, *, crit: VaultEntity = None, pk: int | str = None):
         """
         Reads an entry from password vault.
@@ -154,10 +267,22 @@ class VaultDbSupport:
             raise RecordNotFoundError(f'Requested record with criteria {crit} not found.')
         return item
 
-    def read_vault_entries(self, __uid=None, *, crit: VaultEntity = None, pks: Iterable[int | str] = None):
+    def read_vault_entries(
+            self,
+            __uid=None,
+            *,
+            crit: VaultEntity = None,
+            pks: Iterable[int | str] = None,
+            limit: int = None,
+            cursor: int | str = None,
+            fields: Iterable[str] = None
+    ):
         """
         Reads multiple entries from password vault based on given conditions.
         If given, special UID field will be inserted inside entity criteria.
+        If `limit` or `cursor` is given, a single page of entries is read, ordered by id:
+        at most `limit` entries with an id greater than `cursor` (the id of the last entry of the previous page).
+        If `fields` is given, the entities only contain the listed fields.
 
         Returns:
             Iterable[VaultEntity]: The vault entities found based on given conditions.
@@ -168,13 +293,41 @@ class VaultDbSupport:
                 crit = VaultEntity()
             crit[const.UID_FIELD] = __uid
         if pks is None and crit is None:
-            return self.repo.find_all()
+            return self.repo.find_all(limit=limit, cursor=cursor, fields=fields)
         if pks is not None and crit is not None:
-            return self.repo.find(pks, crit=crit)
+            return self.repo.find(pks, crit=crit, limit=limit, cursor=cursor, fields=fields)
         if pks is not None:
-            return self.repo.find_by_ids(pks)
+            return self.repo.find_by_ids(pks, limit=limit, cursor=cursor, fields=fields)
         if crit is not None:
-            return self.repo.find_by_crit(crit=crit)
+            return self.repo.find_by_crit(crit=crit, limit=limit, cursor=cursor, fields=fields)
+
+    def iter_vault_entries(
+            self,
+            __uid=None,
+            *,
+            crit: VaultEntity = None,
+            pks: Iterable[int | str] = None,
+            fields: Iterable[str] = None
+    ):
+        """
+        Same as `read_vault_entries`, but the entries are read lazily one by one,
+        so the results can be streamed without building a list of every entry.
+
+        Returns:
+            Iterator[VaultEntity]: The vault entities found based on given conditions.
+        """
+
+        if __uid is not None:
+            if crit is None:
+                crit = VaultEntity()
+            crit[const.UID_FIELD] = __uid
+        if pks is None and crit is None:
+            return self.repo.iter_all(fields=fields)
+        if pks is not None and crit is not None:
+            return self.repo.iter_find(pks, crit=crit, fields=fields)
+        if pks is not None:
+            return self.repo.iter_by_ids(pks, fields=fields)
+        return self.repo.iter_by_crit(crit=crit, fields=fields)
 
     def update_vault_entry(self, __uid=None, *, update: VaultEntity, pk: int | str):
         """
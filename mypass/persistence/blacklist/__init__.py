@@ -1 +1,3 @@
-from .memory import blacklist as memory_blacklist
+from .base import Blacklist
+from .memory import blacklist as memory_blacklist, ExpiringMemBlacklist
+from .sqlite import SqliteBlacklist
@@ -0,0 +1,39 @@
+import abc
+
+
+class Blacklist(abc.ABC):
+    """
+    Set of revoked token ids (JTIs), checked on every authenticated request.
+    Membership checks should be cheap, writes (logouts) are rare.
+    """
+
+    @abc.abstractmethod
+    def __contains__(self, item) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def add(self, element, exp: float = None):
+        """
+        Parameters:
+            element: Id of the token (JTI).
+            exp (float): Expiration time of the token (`exp` claim), after which it can be forgotten.
+        """
+        pass
+
+    @abc.abstractmethod
+    def remove(self, element):
+        pass
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+    def purge(self):
+        """Forgets the expired tokens, if the blacklist does not do so on its own."""
+
+    def close(self):
+        """Releases the resources of the blacklist."""
@@ -1,55 +1,115 @@
+import heapq
+import logging
+import threading
+import time
 from multiprocessing import Lock
+from typing import Callable
 
+from .base import Blacklist
 
-class MemBlacklist:
-    instance: 'MemBlacklist' = None
+logger = logging.getLogger(__name__)
 
-    def __new__(cls, lock):
-        if MemBlacklist.instance is None:
-            cls.instance = super().__new__(cls)
-        return cls.instance
 
-    def __init__(self, lock: Lock = None):
-        self._blacklist = set()
-        self._lock = lock
+class ExpiringMemBlacklist(Blacklist):
+    """
+    Bounded in-memory blacklist of token ids (JTIs), which forgets every token once it expires.
+
+    Tokens are kept in a dict (JTI -> expiration time) for O(1) lock-free membership checks,
+    and in a min-heap ordered by expiration time. Expired tokens are evicted from the top of the heap
+    whenever a token is added (or `purge` is called), so the cost of eviction is spread over the writes.
+    An expired token cannot be used anyway, so forgetting it does not allow it again.
+
+    The number of kept tokens is capped by `max_size`: if the blacklist is full of unexpired tokens,
+    the token expiring first is evicted (and a warning is logged), as it is the one usable for the shortest time.
+    """
+
+    def __init__(
+            self,
+            max_size: int = 100_000,
+            default_ttl: float = 30 * 24 * 60 * 60,
+            lock: Lock = None,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Parameters:
+            max_size (int): Maximum number of kept tokens.
+            default_ttl (float): Seconds a token is kept, if it is added without an expiration time
+                (the default lifetime of refresh tokens).
+            lock (Lock): Lock of the writers, defaults to a thread lock. Membership checks are not locked.
+            clock (Callable[[], float]): Current time in seconds since the epoch, as the `exp` claim of tokens.
+        """
+        assert max_size > 0, 'The blacklist should keep at least one token.'
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._lock = lock if lock is not None else threading.Lock()
+        self._clock = clock
+        self._expirations: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
 
     def __contains__(self, item):
-        return item in self._blacklist
+        exp = self._expirations.get(item, None)
+        return exp is not None and exp > self._clock()
+
+    def __len__(self):
+        return len(self._expirations)
+
+    def _evict(self, now: float):
+        # heap entries of removed or re-added tokens are stale, they are dropped without evicting anything
+        heap, expirations = self._heap, self._expirations
+        while heap and (heap[0][0] <= now or len(expirations) > self.max_size):
+            exp, jti = heapq.heappop(heap)
+            if expirations.get(jti, None) != exp:
+                continue
+            if exp > now:
+                logger.warning(
+                    f'Token blacklist is full ({self.max_size} tokens), forgetting token {jti} before it expires.')
+            del expirations[jti]
+        if len(heap) > 2 * len(expirations) + 64:
+            # too many stale entries (e.g. after many removals), the heap is rebuilt
+            self._heap = [(exp, jti) for jti, exp in expirations.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, element, exp: float = None):
+        """
+        Parameters:
+            element: Id of the token (JTI).
+            exp (float): Expiration time of the token (`exp` claim), defaults to now + `default_ttl`.
+        """
+        with self._lock:
+            now = self._clock()
+            if exp is None:
+                exp = now + self.default_ttl
+            if exp <= now:
+                return
+            self._expirations[element] = exp
+            heapq.heappush(self._heap, (exp, element))
+            self._evict(now)
 
-    def add(self, element):
-        if self._lock is not None:
-            with self._lock:
-                return self._blacklist.add(element)
-        else:
-            return self._blacklist.add(element)
+    def purge(self):
+        """Evicts every expired token immediately."""
+        with self._lock:
+            self._evict(self._clock())
 
     def pop(self):
-        if self._lock is not None:
-            with self._lock:
-                return self._blacklist.pop()
-        else:
-            return self._blacklist.pop()
+        with self._lock:
+            jti, _ = self._expirations.popitem()
+            return jti
 
     def remove(self, element):
-        if self._lock is not None:
-            with self._lock:
-                return self._blacklist.remove(element)
-        else:
-            return self._blacklist.remove(element)
+        with self._lock:
+            del self._expirations[element]
 
     def clear(self):
-        if self._lock is not None:
-            with self._lock:
-                return self._blacklist.clear()
-        else:
-            return self._blacklist.clear()
+        with self._lock:
+            self._expirations.clear()
+            self._heap.clear()
 
     def __str__(self):
-        return str({'session': self._blacklist, 'lock': self._lock})
+        return str({'session': set(self._expirations), 'max_size': self.max_size, 'lock': self._lock})
 
     def __repr__(self):
         return str(self)
 
 
 _lock = Lock()
-blacklist = MemBlacklist(lock=_lock)
+blacklist = ExpiringMemBlacklist(lock=_lock)
@@ -0,0 +1,187 @@
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from mypass.utils import SqliteConnections
+from .base import Blacklist
+
+logger = logging.getLogger(__name__)
+
+# version (bumped by additions) and epoch (bumped by removals) of the blacklist
+_COUNTERS = struct.Struct('<QQ')
+
+
+class SqliteBlacklist(Blacklist):
+    """
+    Blacklist shared by every process using the same database file.
+
+    Tokens are stored in an SQLite table (WAL mode), and every process keeps a copy of them in memory.
+    Next to the database, a small memory-mapped file holds two counters: the version is bumped by every addition,
+    the epoch by every removal. A membership check only compares the mapped counters with the ones of the last
+    synchronization (no system call, no lock), and looks the token up in the local copy. If the version changed,
+    only the tokens added since the last synchronization are read, if the epoch changed, every token is read again.
+
+    Counters are bumped after the change is committed, inside a separate write transaction,
+    so bumps of concurrent writers are never lost, and a process seeing a bump always sees the change.
+    Expired tokens are deleted by writes (and `purge`), and are not copied into memory.
+    """
+
+    def __init__(
+            self,
+            path: str | os.PathLike,
+            max_size: int = 100_000,
+            default_ttl: float = 30 * 24 * 60 * 60,
+            timeout: float = 5.0,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Parameters:
+            path (str | os.PathLike): Path of the database file, the counters are stored in `<path>.version`.
+            max_size (int): Maximum number of kept tokens, the tokens expiring first are forgotten beyond it.
+            default_ttl (float): Seconds a token is kept, if it is added without an expiration time.
+            timeout (float): Seconds to wait for the lock of another writer.
+            clock (Callable[[], float]): Current time in seconds since the epoch, as the `exp` claim of tokens.
+        """
+        assert max_size > 0, 'The blacklist should keep at least one token.'
+        self._path = Path(path)
+        self.version_path = self._path.with_name(f'{self._path.name}.version')
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._connections = SqliteConnections(self._path, timeout=timeout, create_schema=self._create_schema)
+        self._sync_lock = threading.Lock()
+        self._cache: dict[str, float] = {}
+        self._seen: tuple[int, int] | None = None
+        self._last_seq = 0
+        self._counters = self._map_counters()
+
+    @property
+    def path(self):
+        return self._path
+
+    def _map_counters(self) -> mmap.mmap:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.version_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < _COUNTERS.size:
+                # extending the file is idempotent, concurrent processes cannot reset the counters
+                os.ftruncate(fd, _COUNTERS.size)
+            return mmap.mmap(fd, _COUNTERS.size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        # sequence numbers are never reused (AUTOINCREMENT), so no addition is skipped by the readers
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tokens '
+            '(seq INTEGER PRIMARY KEY AUTOINCREMENT, jti TEXT NOT NULL UNIQUE, exp REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS tokens_exp ON tokens (exp)')
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread, and opens it on first use."""
+        return self._connections.get()
+
+    def _transaction(self):
+        return self._connections.transaction()
+
+    def _bump(self, removed: bool):
+        # the write transaction serializes the bumps of every process
+        with self._transaction():
+            version, epoch = _COUNTERS.unpack_from(self._counters)
+            if removed:
+                epoch += 1
+            else:
+                version += 1
+            _COUNTERS.pack_into(self._counters, 0, version, epoch)
+
+    def _sync(self):
+        seen = _COUNTERS.unpack_from(self._counters)
+        if seen == self._seen:
+            return
+        with self._sync_lock:
+            # counters are read before the tokens, so a change racing with the read is synchronized again later
+            seen = _COUNTERS.unpack_from(self._counters)
+            if seen == self._seen:
+                return
+            conn = self.get_connection()
+            now = self._clock()
+            if self._seen is None or seen[1] != self._seen[1] or len(self._cache) > self.max_size:
+                rows = conn.execute('SELECT seq, jti, exp FROM tokens').fetchall()
+                self._cache = {jti: exp for _, jti, exp in rows if exp > now}
+            else:
+                rows = conn.execute('SELECT seq, jti, exp FROM tokens WHERE seq > ?', (self._last_seq,)).fetchall()
+                for _, jti, exp in rows:
+                    self._cache[jti] = exp
+            self._last_seq = max((seq for seq, _, _ in rows), default=self._last_seq)
+            self._seen = seen
+
+    def __contains__(self, item) -> bool:
+        self._sync()
+        exp = self._cache.get(item, None)
+        return exp is not None and exp > self._clock()
+
+    def __len__(self) -> int:
+        row = self.get_connection().execute('SELECT count(*) FROM tokens WHERE exp > ?', (self._clock(),)).fetchone()
+        return row[0]
+
+    def add(self, element, exp: float = None):
+        now = self._clock()
+        if exp is None:
+            exp = now + self.default_ttl
+        if exp <= now:
+            return
+        with self._transaction() as conn:
+            # replacing assigns a new sequence number, so readers pick up a changed expiration too
+            conn.execute('INSERT OR REPLACE INTO tokens (jti, exp) VALUES (?, ?)', (str(element), exp))
+            conn.execute('DELETE FROM tokens WHERE exp <= ?', (now,))
+            excess = conn.execute('SELECT count(*) FROM tokens').fetchone()[0] - self.max_size
+            if excess > 0:
+                logger.warning(
+                    f'Token blacklist is full ({self.max_size} tokens), forgetting {excess} tokens before they expire.')
+                conn.execute(
+                    'DELETE FROM tokens WHERE seq IN (SELECT seq FROM tokens ORDER BY exp LIMIT ?)', (excess,))
+        self._bump(removed=excess > 0)
+
+    def remove(self, element):
+        """
+        Raises:
+            KeyError: If the token is not in the blacklist.
+        """
+        with self._transaction() as conn:
+            removed = conn.execute('DELETE FROM tokens WHERE jti = ?', (str(element),)).rowcount
+        if not removed:
+            raise KeyError(element)
+        self._bump(removed=True)
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM tokens')
+        self._bump(removed=True)
+
+    def purge(self):
+        # expired tokens are never in the local copies, they are not considered to be removed
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM tokens WHERE exp <= ?', (self._clock(),))
+
+    def close(self):
+        """Closes the connection of every thread."""
+        self._connections.close()
+
+    def unlink(self):
+        self._connections.unlink()
+        self._counters.close()
+        if self.version_path.exists():
+            self.version_path.unlink()
+
+    def __str__(self):
+        return str({'path': str(self._path), 'max_size': self.max_size})
+
+    def __repr__(self):
+        return str(self)
@@ -1,17 +1,40 @@
 from typing import Mapping, overload
 
 
+_MISSING = object()
+_INTERNAL = frozenset(('_extra', '_size'))
+
+
+def _is_dunder(name: str) -> bool:
+    return name.startswith('__') and name.endswith('__')
+
+
 class ElasticClass(Mapping):
     """
     Base class for storing elastic data.
 
-    All attributes and items are generated on the fly as needed,
-    and non-existing ones are returned as None.
+    Known fields are the public names listed in the `__slots__` of subclasses, and are stored in slots.
+    Any other field is stored in a plain dict. Both are accessible as items and as attributes.
+    Unset fields are not part of the mapping, and accessing them raises an error.
+    Fields named as class attributes (e.g. `items`) are only accessible as items.
 
     The class cannot store None values.
     None values are handled by only returning them if needed, but they are not stored by the class itself.
     """
 
+    __slots__ = ('_extra', '_size')
+    _field_names: tuple[str, ...] = ()
+    _field_set: frozenset[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        names = []
+        for base in reversed(cls.__mro__):
+            slots = base.__dict__.get('__slots__', ())
+            names.extend(name for name in ((slots,) if isinstance(slots, str) else slots) if not name.startswith('_'))
+        cls._field_names = tuple(dict.fromkeys(names))
+        cls._field_set = frozenset(cls._field_names)
+
     def __init__(self, **kwargs):
         """
         Initializing a data class for storing elastic data.
@@ -19,36 +42,121 @@ class ElasticClass(Mapping):
         Parameters:
             kwargs: keyword arguments, where every key should be a string
         """
-        self.__blacklist = {'_abc_impl', '_is_protocol'}
-        for k in kwargs:
-            if kwargs[k] is not None:
-                setattr(self, k, kwargs[k])
-
-    def __getitem__(self, __item):
+        extra = {}
+        size = 0
+        field_set = self._field_set
+        for k, v in kwargs.items():
+            if v is None:
+                continue
+            if k in field_set:
+                object.__setattr__(self, k, v)
+            else:
+                extra[k] = v
+            size += 1
+        object.__setattr__(self, '_extra', extra)
+        object.__setattr__(self, '_size', size)
+
+    def _has_field(self, name):
         try:
-            return getattr(self, __item)
+            object.__getattribute__(self, name)
         except AttributeError:
-            raise KeyError(f'{__item} is not present inside {self.__class__.__name__}')
+            return False
+        return True
+
+    def __getitem__(self, __item):
+        if __item in self._field_set:
+            try:
+                return object.__getattribute__(self, __item)
+            except AttributeError:
+                pass
+        else:
+            try:
+                return self._extra[__item]
+            except KeyError:
+                pass
+        raise KeyError(f'{__item} is not present inside {self.__class__.__name__}')
 
     def __setitem__(self, __key, __value):
-        setattr(self, __key, __value)
+        if __key in self._field_set:
+            if not self._has_field(__key):
+                object.__setattr__(self, '_size', self._size + 1)
+            object.__setattr__(self, __key, __value)
+        else:
+            if __key not in self._extra:
+                object.__setattr__(self, '_size', self._size + 1)
+            self._extra[__key] = __value
+
+    def __delitem__(self, __key):
+        if __key in self._field_set and self._has_field(__key):
+            object.__delattr__(self, __key)
+        elif __key in self._extra:
+            del self._extra[__key]
+        else:
+            raise KeyError(f'{__key} is not present inside {self.__class__.__name__}')
+        object.__setattr__(self, '_size', self._size - 1)
+
+    def __getattr__(self, __name):
+        # called only if the attribute is not found otherwise, i.e. for extra fields and unset known fields,
+        # internal slots are unset before `__setstate__` (pickle and copy), and dunder names are never fields
+        if __name not in self._field_set and __name not in _INTERNAL and not _is_dunder(__name):
+            try:
+                return object.__getattribute__(self, '_extra')[__name]
+            except KeyError:
+                pass
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{__name}'")
+
+    def __setattr__(self, __name, __value):
+        if __name in self._field_set:
+            self[__name] = __value
+            return
+        attr = getattr(type(self), __name, _MISSING)
+        if attr is _MISSING:
+            self[__name] = __value
+        elif hasattr(type(attr), '__set__'):
+            # properties and private slots
+            object.__setattr__(self, __name, __value)
+        else:
+            # reading the attribute would return the class attribute (e.g. a method), not the field
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object attribute '{__name}' is a class attribute, "
+                f"set the field as an item instead (e.g. entity['{__name}'] = value)")
+
+    def __delattr__(self, __name):
+        try:
+            del self[__name]
+        except KeyError:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{__name}'")
 
     def __contains__(self, item):
-        return hasattr(self, item)
+        if item in self._field_set:
+            return self._has_field(item)
+        return item in self._extra
 
-    def _is_mangled(self, field_name):
-        return any(field_name.startswith(f'_{base.__name__}__') for base in self.__class__.mro())
+    def __len__(self):
+        return self._size
 
-    def _get_parts(self):
-        for name in vars(self):
-            if not name.startswith('__') and not self._is_mangled(name) and name not in self.__blacklist:
+    def __iter__(self):
+        for name in self._field_names:
+            if self._has_field(name):
                 yield name
+        yield from self._extra
 
-    def __len__(self):
-        return len(tuple(self._get_parts()))
+    def items(self):
+        return self.to_dict().items()
 
-    def __iter__(self):
-        return self._get_parts()
+    def values(self):
+        return self.to_dict().values()
+
+    def to_dict(self) -> dict:
+        """Returns the fields as a new dict."""
+        data = {}
+        for name in self._field_names:
+            try:
+                data[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+        data.update(self._extra)
+        return data
 
     def __str__(self):
         parts_repr = ', '.join([
@@ -60,10 +168,16 @@ class ElasticClass(Mapping):
         return str(self)
 
     def is_empty(self):
-        return len(self) <= 0
+        return self._size <= 0
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state: dict):
+        ElasticClass.__init__(self, **state)
 
     def __copy__(self):
-        return type(self)(**self)
+        return type(self)(**self.to_dict())
 
     def copy(self):
         return self.__copy__()
@@ -77,19 +191,19 @@ class ElasticClass(Mapping):
         ...
 
     def pop(self, __item, __default=...):
-        if __default is ... and not hasattr(self, __item):
-            raise AttributeError(f'Object {self} has not attribute "{__item}".')
-        if not hasattr(self, __item):
+        if __item not in self:
+            if __default is ...:
+                raise AttributeError(f'Object {self} has not attribute "{__item}".')
             return __default
         val = self[__item]
-        delattr(self, __item)
+        del self[__item]
         return val
 
     def update(self, other: Mapping):
         for k, v in other.items():
-            setattr(self, k, v)
+            self[k] = v
 
     def __or__(self, other: Mapping):
-        result = type(self)(**self)
+        result = type(self)(**self.to_dict())
         result.update(other)
         return result
@@ -15,6 +15,8 @@ def table(t: str):
 
 
 class Entity(ElasticClass, Generic[_ID]):
+    __slots__ = ('__id',)
+
     def __init__(self, __id: _ID, value: Mapping):
         super().__init__(**value)
         self.__id = __id
@@ -27,9 +29,19 @@ class Entity(ElasticClass, Generic[_ID]):
     def id(self, __id: _ID):
         self.__id = __id
 
+    def __getstate__(self):
+        return self.__id, super().__getstate__()
+
+    def __setstate__(self, state: tuple[_ID, dict]):
+        __id, fields = state
+        super().__setstate__(fields)
+        self.__id = __id
+
 
 @table('master')
 class MasterEntity(Entity[int | str]):
+    __slots__ = ('user', 'token', 'pw', 'salt')
+
     user: Optional[str]
     token: Optional[str]
     pw: Optional[str]
@@ -49,6 +61,8 @@ class MasterEntity(Entity[int | str]):
 
 @table('vault')
 class VaultEntity(Entity[int | str]):
+    __slots__ = ('user', 'pw', 'salt', 'label', 'email', 'site')
+
     pw: Optional[str]
     salt: Optional[str]
     user: Optional[str]
@@ -1,5 +1,6 @@
-from .common import entity_as_dict, entities_as_dict
+from .common import entity_as_dict, entities_as_dict, iter_json_array, project_fields
 from .crypto import hash_fn, gen_uuid
 from .descriptors import GetSetDescriptor, GetDescriptor, SetDescriptor
 from .gittools import GitSupport
 from .tinydb import document_as_dict, documents_as_dict
+from .sqlite import SqliteConnections
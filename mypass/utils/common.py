@@ -1,22 +1,46 @@
-from typing import Iterable
+import json
+from typing import Iterable, Iterator, Callable, Mapping
 
-from mypass.types import const
+from mypass.types import const, ElasticClass
 
 
 def is_protected_key(k: str):
     return k.startswith('_') and k.upper() == k
 
 
+def project_fields(document: Mapping, fields: Iterable[str] | None) -> Mapping:
+    """Returns a dict of the given fields present in the document, or the document itself if fields are None."""
+    if fields is None:
+        return document
+    return {k: document[k] for k in fields if k in document}
+
+
 def entity_as_dict(entity, keep_id: bool = False, remove_special: bool = True) -> dict:
     if remove_special:
         # remove every special field except `ID_FIELD` which will be inserted when finishing up
         for k in entity.copy():
             if is_protected_key(k):
                 del entity[k]
+    data = entity.to_dict() if isinstance(entity, ElasticClass) else dict(entity)
     if keep_id:
-        return {const.ID_FIELD: entity.id, **entity}
-    return dict(entity)
+        return {const.ID_FIELD: entity.id, **data}
+    return data
 
 
 def entities_as_dict(entities: Iterable, keep_id: bool = False, remove_special: bool = True):
     return [entity_as_dict(entity, keep_id=keep_id, remove_special=remove_special) for entity in entities]
+
+
+def iter_json_array(
+        entities: Iterable,
+        keep_id: bool = False,
+        remove_special: bool = True,
+        dumps: Callable[[dict], str] = json.dumps
+) -> Iterator[str]:
+    """Yields the JSON array of the entities in chunks, converting and serializing a single entity at a time."""
+    yield '['
+    separator = ''
+    for entity in entities:
+        yield separator + dumps(entity_as_dict(entity, keep_id=keep_id, remove_special=remove_special))
+        separator = ','
+    yield ']'
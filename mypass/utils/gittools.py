@@ -1,5 +1,7 @@
+import hashlib
 import os
-from typing import TypedDict, overload, NotRequired
+from pathlib import Path
+from typing import TypedDict, overload, NotRequired, Iterable
 from urllib.parse import urlparse
 
 from git import InvalidGitRepositoryError, Repo
@@ -28,11 +30,21 @@ INITIAL_BRANCH = 'main'
 REMOTE = 'origin'
 
 
+def blob_sha(path: str | os.PathLike) -> bytes:
+    """Returns the (binary) sha of the git blob of the file, as stored in the entries of the index."""
+    content = Path(path).read_bytes()
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).digest()
+
+
 def get_staged_files(repo: Repo):
     statuses = repo.git.status('--porcelain').splitlines()
     return dict([status.split(maxsplit=1)[::-1] for status in statuses])
 
 
+def commit_message(staged_files: dict[str, str]):
+    return 'Committed changes:\n' + '\n'.join(f'    {path} -- {status}' for path, status in staged_files.items())
+
+
 def configure_remote_with_auth(remote_url: str, auth: _Auth):
     assert auth is not None, 'Parameter `auth` should not be None.'
     parsed_url = urlparse(remote_url)
@@ -161,12 +173,49 @@ class GitSupport:
         with self as r:
             r.git.add(all=True)
 
-    def commit(self):
+    def stage(self, paths: Iterable[str | os.PathLike]) -> dict[str, str]:
+        """
+        Stages exactly the given paths through the in-process index, without scanning the working tree.
+        Existing files are added (unless their content is the same as in the index),
+        missing ones are removed from the index. Relative paths are resolved from the current working directory.
+
+        Returns:
+            dict[str, str]: Staged paths relative to the working tree, mapped to their status (A, M or D).
+        Raises:
+            ValueError: If a path is outside the working tree.
+        """
         with self as r:
-            staged_files = get_staged_files(r)
-            message = 'Committed changes:\n' + '\n'.join(
-                f'    {path} -- {status}' for path, status in staged_files.items())
-            r.index.commit(message)
+            root = Path(r.working_tree_dir).resolve()
+            index = r.index
+            staged_files = {}
+            for path in paths:
+                path = Path(path).resolve()
+                rel_path = path.relative_to(root).as_posix()
+                entry = index.entries.get((rel_path, 0), None)
+                tracked = entry is not None
+                if path.is_file():
+                    if not tracked:
+                        staged_files[rel_path] = 'A'
+                    elif blob_sha(path) != entry.binsha:
+                        staged_files[rel_path] = 'M'
+                elif tracked:
+                    del index.entries[(rel_path, 0)]
+                    staged_files[rel_path] = 'D'
+            to_add = [p for p, status in staged_files.items() if status != 'D']
+            if to_add:
+                index.add(to_add, write=False)
+            index.write()
+            return staged_files
+
+    def commit(self, staged_files: dict[str, str] = None):
+        """
+        Commits the index. The commit message lists the given staged files,
+        if they are not given, the staged files are read from `git status`.
+        """
+        with self as r:
+            if staged_files is None:
+                staged_files = get_staged_files(r)
+            r.index.commit(commit_message(staged_files))
 
     def add_commit(self):
         self.add_all()
@@ -177,9 +226,20 @@ class GitSupport:
             for remote in r.remotes:
                 remote.push(refspec=f'{self.active_branch}:{remote.name}')
 
-    def stage_commit_push(self):
-        self.add_all()
-        self.commit()
+    def stage_commit_push(self, paths: Iterable[str | os.PathLike] = None):
+        """
+        Stages, commits and pushes the changes.
+        If paths are given, only those paths are staged (see `stage`), and nothing happens if none changed.
+        Otherwise, every change of the working tree is staged.
+        """
+        if paths is None:
+            self.add_all()
+            self.commit()
+        else:
+            staged_files = self.stage(paths)
+            if not staged_files:
+                return
+            self.commit(staged_files)
         self.push()
 
     @property
@@ -1,12 +1,19 @@
+import flask
 from werkzeug.exceptions import UnsupportedMediaType
 
+from mypass.persistence.blacklist.base import Blacklist
 from mypass.persistence.blacklist.memory import blacklist
 
 
+def get_blacklist() -> Blacklist:
+    """Blacklist of the application (`blacklist` config), defaults to the in-memory blacklist of the process."""
+    return flask.current_app.config.get('blacklist', blacklist)
+
+
 # noinspection PyUnusedLocal
 def check_if_token_in_blacklist(jwt_header, jwt_payload):
     jti = jwt_payload['jti']
-    return jti in blacklist
+    return jti in get_blacklist()
 
 
 def base_error_handler(err: Exception):
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+
+class SqliteConnections:
+    """
+    Connections to an SQLite database in WAL mode, so readers are not blocked by a writer (and a writer
+    is not blocked by readers). Every thread gets its own connection, which is opened on first use
+    and reused afterward. Writes run inside `BEGIN IMMEDIATE` transactions.
+    """
+
+    def __init__(
+            self,
+            path: str | os.PathLike,
+            timeout: float = 5.0,
+            synchronous: str = 'NORMAL',
+            create_schema: Callable[[sqlite3.Connection], None] = None
+    ):
+        """
+        Parameters:
+            path (str | os.PathLike): Path of the database file.
+            timeout (float): Seconds to wait for the lock of another writer.
+            synchronous (str): SQLite `synchronous` pragma, NORMAL is durable in WAL mode except for power loss.
+            create_schema (Callable[[sqlite3.Connection], None]): Called with the first opened connection.
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self._create_schema = create_schema
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._schema_ready = create_schema is None
+
+    def get(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread, and opens it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # connections are only used by their own thread, but `close` closes them from any thread
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            with self._lock:
+                self._connections.append(conn)
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction of the calling thread, committed on success and rolled back on errors."""
+        conn = self.get()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def close(self):
+        """Closes the connection of every thread."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def unlink(self):
+        """Closes the connections, and removes the database file with its WAL and shared memory files."""
+        self.close()
+        for path in (self.path, self.path.with_name(f'{self.path.name}-wal'),
+                     self.path.with_name(f'{self.path.name}-shm')):
+            if path.exists():
+                path.unlink()
@@ -10,13 +10,18 @@ from werkzeug.exceptions import UnsupportedMediaType
 
 from mypass import hooks
 from mypass.api import AuthApi, DbApi
-from mypass.db import MasterDbSupport, VaultDbSupport
-from mypass.db.tiny import VaultTinyRepository, MasterTinyRepository
+from mypass.db import CrudRepository, MasterDbSupport, VaultDbSupport
+from mypass.db.serializers import SERIALIZERS, get_serializer
+from mypass.db.sqlite import MasterSqliteRepository, VaultSqliteRepository
+from mypass.db.tiny import VaultTinyRepository, MasterTinyRepository, ShardedTinyDao
+from mypass.persistence.blacklist import Blacklist, SqliteBlacklist, memory_blacklist
+from mypass.types import VaultEntity
 from mypass.utils import hash_fn
 
 HOST = 'localhost'
 PORT = 5758
 JWT_KEY = 'sourcehaven-db'
+THREADS = 8
 
 
 class MyPassArgs(Namespace):
@@ -25,11 +30,28 @@ class MyPassArgs(Namespace):
     port: int
     jwt_key: str
     api_key: str
-
-
-def run(debug=False, host=HOST, port=PORT, jwt_key=JWT_KEY, api_key=None):
-    db_path = Path.home().joinpath('.mypass', 'db', 'tinydb', 'db.json')
-
+    shards: int
+    backend: str
+    format: str
+    file_lock: bool
+    blacklist: str
+    threads: int
+
+
+def create_app(
+        master_repo: CrudRepository, vault_repo: CrudRepository, jwt_key=JWT_KEY, api_key=None,
+        blacklist: Blacklist = memory_blacklist
+) -> Flask:
+    """
+    Creates the application serving the api endpoints on top of the given repositories.
+
+    Parameters:
+        master_repo (CrudRepository): Repository of the master passwords.
+        vault_repo (CrudRepository): Repository of the vault entries.
+        jwt_key (str): Secret key signing the tokens.
+        api_key (str): Secret api key of the login (not hashed), if None, any password is accepted.
+        blacklist (Blacklist): Storage of the logged out tokens.
+    """
     if api_key is not None:
         api_key = hash_fn(api_key)
 
@@ -39,8 +61,9 @@ def run(debug=False, host=HOST, port=PORT, jwt_key=JWT_KEY, api_key=None):
     app.config['JWT_BLACKLIST_ENABLED'] = True
     app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
     app.config['API_KEY'] = api_key
-    app.config['master_controller'] = MasterDbSupport(repo=MasterTinyRepository(path=db_path))
-    app.config['vault_controller'] = VaultDbSupport(repo=VaultTinyRepository(path=db_path))
+    app.config['blacklist'] = blacklist
+    app.config['master_controller'] = MasterDbSupport(repo=master_repo)
+    app.config['vault_controller'] = VaultDbSupport(repo=vault_repo)
     app.config.from_object(__name__)
 
     # register api endpoints
@@ -52,11 +75,40 @@ def run(debug=False, host=HOST, port=PORT, jwt_key=JWT_KEY, api_key=None):
 
     jwt = JWTManager(app)
     jwt.token_in_blocklist_loader(hooks.check_if_token_in_blacklist)
+    return app
+
+
+def run(
+        debug=False, host=HOST, port=PORT, jwt_key=JWT_KEY, api_key=None, shards=0, backend='tiny',
+        serializer='json', file_lock=False, blacklist='memory', threads=THREADS
+):
+    serializer = get_serializer(serializer)
+    db_path = Path.home().joinpath('.mypass', 'db', 'tinydb', 'db').with_suffix(serializer.extension)
+    if backend == 'sqlite':
+        if serializer.name != 'json':
+            print(f'USER WARNING :: Serialization format "{serializer.name}" is ignored by the sqlite backend.')
+        sqlite_path = Path.home().joinpath('.mypass', 'db', 'sqlite', 'db.sqlite3')
+        master_repo = MasterSqliteRepository(path=sqlite_path)
+        vault_repo = VaultSqliteRepository(path=sqlite_path)
+    else:
+        master_repo = MasterTinyRepository(path=db_path, persistent=True, serializer=serializer, file_lock=file_lock)
+        if shards > 0:
+            vault_repo = VaultTinyRepository(dao=ShardedTinyDao(
+                VaultEntity.table, db_path.with_name('vault'), shards=shards,
+                persistent=True, indexes=VaultTinyRepository.indexes, serializer=serializer, file_lock=file_lock))
+        else:
+            vault_repo = VaultTinyRepository(path=db_path, persistent=True, serializer=serializer, file_lock=file_lock)
+
+    if blacklist == 'sqlite':
+        blacklist = SqliteBlacklist(Path.home().joinpath('.mypass', 'db', 'blacklist', 'blacklist.sqlite3'))
+    else:
+        blacklist = memory_blacklist
 
+    app = create_app(master_repo, vault_repo, jwt_key=jwt_key, api_key=api_key, blacklist=blacklist)
     if debug:
         app.run(host=host, port=port, debug=True)
     else:
-        waitress.serve(app, host=host, port=port, channel_timeout=10, threads=8)
+        waitress.serve(app, host=host, port=port, channel_timeout=10, threads=threads)
 
 
 if __name__ == '__main__':
@@ -76,10 +128,36 @@ if __name__ == '__main__':
     arg_parser.add_argument(
         '-P', '--api-key', type=str, default=None,
         help=f'specifies the secret api key by the application, defaults to "{None}" (should be set)')
+    arg_parser.add_argument(
+        '-s', '--shards', type=int, default=0,
+        help='stores the vault in the given number of shard files (bucketed by user), '
+             'defaults to 0 (single db.json; existing entries are not migrated between the two layouts)')
+    arg_parser.add_argument(
+        '-b', '--backend', type=str, default='tiny', choices=['tiny', 'sqlite'],
+        help='specifies the database backend, defaults to "tiny" '
+             '(use `python -m mypass.db.sqlite.migrate` to copy a tiny database into sqlite)')
+    arg_parser.add_argument(
+        '-f', '--format', type=str, default='json', choices=list(SERIALIZERS),
+        help='specifies the serialization format of the tiny database files, defaults to "json" '
+             '(the file extension follows the format, existing files are not converted; msgpack requires msgpack)')
+    arg_parser.add_argument(
+        '-L', '--file-lock', action='store_true', default=False,
+        help='locks the tiny database files against other processes too (fcntl), '
+             'needed when multiple service processes share the database')
+    arg_parser.add_argument(
+        '-B', '--blacklist', type=str, default='memory', choices=['memory', 'sqlite'],
+        help='specifies the storage of logged out tokens, defaults to "memory" '
+             '(use "sqlite" to share logouts between multiple service processes)')
+    arg_parser.add_argument(
+        '-t', '--threads', type=int, default=THREADS,
+        help=f'specifies the number of threads serving the requests, defaults to {THREADS}')
 
     args = arg_parser.parse_args(namespace=MyPassArgs)
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
     else:
         logging.basicConfig(level=logging.ERROR)
-    run(debug=args.debug, host=args.host, port=args.port, jwt_key=args.jwt_key, api_key=args.api_key)
+    run(
+        debug=args.debug, host=args.host, port=args.port, jwt_key=args.jwt_key, api_key=args.api_key,
+        shards=args.shards, backend=args.backend, serializer=args.format, file_lock=args.file_lock,
+        blacklist=args.blacklist, threads=args.threads)
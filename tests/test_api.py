@@ -0,0 +1,111 @@
+import json
+
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from mypass.api import DbApi
+from mypass.db import VaultDbSupport
+from mypass.db.tiny import VaultTinyRepository
+from mypass.types import VaultEntity
+from mypass.types.const import UID_FIELD
+from mypass.utils import iter_json_array
+from tests._utils import AtomicMemoryStorage, persistent_storage
+
+
+class TestIterJsonArray:
+    def test_chunks(self):
+        entities = [VaultEntity(1, user='a'), VaultEntity(2, user='b', _salt='x')]
+        chunks = list(iter_json_array(entities, keep_id=True, remove_special=False))
+        assert_that(chunks).is_length(4)
+        assert_that(json.loads(''.join(chunks))).is_equal_to(
+            [{'_id': 1, 'user': 'a'}, {'_id': 2, 'user': 'b', '_salt': 'x'}])
+        assert_that(''.join(iter_json_array([]))).is_equal_to('[]')
+
+
+class TestVaultReadStream:
+    def read(self, body=None, query=''):
+        kwargs = {'json': body} if body is not None else {}
+        return self.client.post(f'/api/db/vault/read{query}', headers=self.headers, **kwargs)
+
+    def test_stream(self):
+        response = self.read({'uid': 1, 'crit': {}, 'stream': True})
+        assert_that(response.status_code).is_equal_to(200)
+        assert_that(response.headers).does_not_contain_key('Content-Length')
+        assert_that(response.mimetype).is_equal_to('application/json')
+        assert_that(response.get_json()).is_equal_to(self.read({'uid': 1, 'crit': {}}).get_json())
+        assert_that([e['_id'] for e in response.get_json()]).is_equal_to([2, 4])
+
+    def test_stream_all(self):
+        response = self.read(query='?stream=1')
+        assert_that(response.headers).does_not_contain_key('Content-Length')
+        assert_that(response.get_json()).is_length(5)
+        assert_that(response.get_json()).is_equal_to(self.read().get_json())
+
+    def test_not_streamed(self):
+        response = self.read({'ids': [1, 2], 'stream': False})
+        assert_that(response.headers).contains_key('Content-Length')
+        assert_that(response.get_json()).is_length(2)
+
+    def test_pages(self):
+        response = self.read({'limit': 2})
+        assert_that(response.status_code).is_equal_to(200)
+        assert_that([e['_id'] for e in response.get_json()['items']]).is_equal_to([1, 2])
+        assert_that(response.get_json()['next_cursor']).is_equal_to(2)
+        response = self.read({'uid': 0, 'crit': {}, 'limit': 2, 'cursor': 1})
+        assert_that(response.get_json()).is_equal_to({
+            'items': [{'_id': 3, 'user': 'user2', UID_FIELD: 0}, {'_id': 5, 'user': 'user4', UID_FIELD: 0}],
+            'next_cursor': 5})
+        response = self.read({'uid': 0, 'crit': {}, 'limit': 2, 'cursor': 5})
+        assert_that(response.get_json()).is_equal_to({'items': [], 'next_cursor': None})
+        response = self.read(query='?limit=3&cursor=3')
+        assert_that([e['_id'] for e in response.get_json()['items']]).is_equal_to([4, 5])
+        assert_that(response.get_json()['next_cursor']).is_none()
+
+    def test_fields(self):
+        response = self.read({'crit': {'user': 'user1'}, 'fields': ['user']})
+        assert_that(response.get_json()).is_equal_to([{'_id': 2, 'user': 'user1'}])
+        response = self.read({'id': 2, 'fields': [UID_FIELD]})
+        assert_that(response.get_json()).is_equal_to({'_id': 2, UID_FIELD: 1})
+        response = self.read({'uid': 1, 'crit': {}, 'fields': [], 'stream': True})
+        assert_that(response.get_json()).is_equal_to([{'_id': 2}, {'_id': 4}])
+        response = self.read(query='?fields=user&limit=1')
+        assert_that(response.get_json()['items']).is_equal_to([{'_id': 1, 'user': 'user0'}])
+        assert_that(self.read({'ids': [1], 'fields': 'user'}).status_code).is_equal_to(200)
+        assert_that(self.read({'ids': [1], 'fields': {'user': 1}}).status_code).is_equal_to(400)
+
+    def test_pages_throws(self):
+        assert_that(self.read({'limit': 0}).status_code).is_equal_to(400)
+        assert_that(self.read({'limit': 'many'}).status_code).is_equal_to(400)
+        assert_that(self.read(query='?cursor=first').status_code).is_equal_to(400)
+
+    def test_create_many(self):
+        entries = [
+            {'fields': {'user': 'bulk0'}}, {'id': 50, 'fields': {'user': 'bulk1'}}, {'fields': {'user': 'bulk2'}}]
+        response = self.client.post(
+            '/api/db/vault/create_many', json={'uid': 7, 'entries': entries}, headers=self.headers)
+        assert_that(response.status_code).is_equal_to(201)
+        ids = response.get_json()['_ids']
+        assert_that(ids).is_length(3)
+        assert_that(ids[1]).is_equal_to(50)
+        users = [self.read({'uid': 7, 'id': pk}).get_json()['user'] for pk in ids]
+        assert_that(users).is_equal_to(['bulk0', 'bulk1', 'bulk2'])
+
+    @classmethod
+    def setup_class(cls):
+        app = Flask(__name__)
+        app.config['JWT_SECRET_KEY'] = 'mypass-test-secret-key-of-32-bytes'
+        repo = VaultTinyRepository(table='api-table', storage=AtomicMemoryStorage, persistent=True)
+        for i in range(5):
+            repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}))
+        app.config['vault_controller'] = VaultDbSupport(repo=repo)
+        app.register_blueprint(DbApi)
+        JWTManager(app)
+        with app.app_context():
+            cls.headers = {'Authorization': f'Bearer {create_access_token(identity="test")}'}
+        cls.client = app.test_client()
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
@@ -0,0 +1,178 @@
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+from flask import Flask
+from flask_jwt_extended import JWTManager, decode_token
+
+from mypass.api import AuthApi
+from mypass.persistence.blacklist import ExpiringMemBlacklist, SqliteBlacklist, memory_blacklist
+from mypass.utils import hooks
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestExpiringMemBlacklist:
+    def test_expiration(self):
+        clock = FakeClock()
+        tokens = ExpiringMemBlacklist(clock=clock)
+        tokens.add('short', exp=1010)
+        tokens.add('long', exp=2000)
+        tokens.add('default')
+        tokens.add('expired', exp=900)
+        assert_that('short' in tokens).is_true()
+        assert_that('expired' in tokens).is_false()
+        assert_that(tokens).is_length(3)
+        clock.now = 1500
+        assert_that('short' in tokens).is_false()
+        tokens.purge()
+        assert_that(tokens).is_length(2)
+        clock.now = 1000 + tokens.default_ttl
+        tokens.add('new', exp=clock.now + 1)
+        assert_that(tokens).is_length(1)
+        assert_that('new' in tokens).is_true()
+
+    def test_max_size(self):
+        tokens = ExpiringMemBlacklist(max_size=3, clock=FakeClock())
+        for i, exp in enumerate([1050, 1010, 1030, 1040]):
+            tokens.add(f'token{i}', exp=exp)
+        # the token expiring first is forgotten
+        assert_that(tokens).is_length(3)
+        assert_that('token1' in tokens).is_false()
+        assert_that(all(f'token{i}' in tokens for i in (0, 2, 3))).is_true()
+
+    def test_readd_and_remove(self):
+        clock = FakeClock()
+        tokens = ExpiringMemBlacklist(clock=clock)
+        tokens.add('token', exp=1010)
+        tokens.add('token', exp=1100)
+        clock.now = 1050
+        tokens.purge()
+        assert_that('token' in tokens).is_true()
+        tokens.remove('token')
+        for i in range(500):
+            tokens.add(f'removed{i}', exp=2000)
+            tokens.remove(f'removed{i}')
+        # stale heap entries of removed tokens do not accumulate
+        assert_that(len(tokens._heap)).is_less_than(200)
+        tokens.clear()
+        assert_that(tokens).is_length(0)
+
+
+def _add_tokens(path: str, tokens: list[str]):
+    blacklist = SqliteBlacklist(path)
+    for token in tokens:
+        blacklist.add(token)
+    blacklist.close()
+
+
+class TestSqliteBlacklist:
+    def test_shared_between_instances(self):
+        # every process has its own instance
+        writer, reader = SqliteBlacklist(self.path, clock=self.clock), SqliteBlacklist(self.path, clock=self.clock)
+        assert_that('token' in reader).is_false()
+        writer.add('token', exp=2000)
+        assert_that('token' in reader).is_true()
+        writer.add('other', exp=1500)
+        assert_that('other' in reader).is_true()
+        writer.remove('token')
+        assert_that('token' in reader).is_false()
+        assert_that('other' in reader).is_true()
+        assert_that(writer.remove).raises(KeyError).when_called_with('token')
+        reader.clear()
+        assert_that('other' in writer).is_false()
+        writer.close()
+        reader.close()
+
+    def test_expiration_and_max_size(self):
+        blacklist = SqliteBlacklist(self.path, max_size=3, clock=self.clock)
+        reader = SqliteBlacklist(self.path, max_size=3, clock=self.clock)
+        blacklist.add('expired', exp=900)
+        for i, exp in enumerate([1050, 1010, 1030, 1040]):
+            blacklist.add(f'token{i}', exp=exp)
+        assert_that(blacklist).is_length(3)
+        assert_that('expired' in reader).is_false()
+        assert_that('token1' in reader).is_false()
+        assert_that(all(f'token{i}' in reader for i in (0, 2, 3))).is_true()
+        self.clock.now = 1035
+        assert_that('token2' in reader).is_false()
+        blacklist.purge()
+        assert_that(blacklist).is_length(2)
+        blacklist.close()
+        reader.close()
+
+    def test_shared_between_processes(self):
+        blacklist = SqliteBlacklist(self.path)
+        assert_that('process-0-0' in blacklist).is_false()
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            list(executor.map(
+                _add_tokens, [str(self.path)] * 2, [[f'process-{p}-{i}' for i in range(10)] for p in range(2)]))
+        assert_that(all(f'process-{p}-{i}' in blacklist for p in range(2) for i in range(10))).is_true()
+        assert_that(blacklist).is_length(20)
+        blacklist.close()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    def setup_method(self):
+        self.path = Path(self.tmp_dir.name) / 'blacklist.sqlite3'
+        self.clock = FakeClock()
+        SqliteBlacklist(self.path).unlink()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
+
+
+class TestLogout:
+    blacklist = memory_blacklist
+
+    def test_logout_blacklists_until_expiration(self):
+        tokens = self.client.post('/api/auth/login', json={'pw': 'any'}).get_json()
+        headers = {'Authorization': f'Bearer {tokens["access_token"]}'}
+        assert_that(self.client.delete('/api/auth/logout', headers=headers).status_code).is_equal_to(204)
+        with self.app.app_context():
+            claims = decode_token(tokens['access_token'], allow_expired=True)
+            assert_that(hooks.check_if_token_in_blacklist({}, claims)).is_true()
+        assert_that(self.client.delete('/api/auth/logout', headers=headers).status_code).is_equal_to(401)
+        # logging in again does not allow the revoked token
+        assert_that(self.client.post('/api/auth/login', json={'pw': 'any'}).status_code).is_equal_to(201)
+        assert_that(claims['jti'] in self.blacklist).is_true()
+        assert_that(self.client.delete('/api/auth/logout', headers=headers).status_code).is_equal_to(401)
+
+    @classmethod
+    def setup_class(cls):
+        cls.app = Flask(__name__)
+        cls.app.config['JWT_SECRET_KEY'] = 'mypass-test-secret-key-of-32-bytes'
+        cls.app.config['API_KEY'] = None
+        cls.app.config['blacklist'] = cls.blacklist
+        cls.app.register_blueprint(AuthApi)
+        jwt = JWTManager(cls.app)
+        jwt.token_in_blocklist_loader(hooks.check_if_token_in_blacklist)
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.blacklist.clear()
+
+
+class TestSqliteLogout(TestLogout):
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.blacklist = SqliteBlacklist(Path(cls.tmp_dir.name) / 'blacklist.sqlite3')
+        super().setup_class()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.blacklist.unlink()
+        cls.tmp_dir.cleanup()
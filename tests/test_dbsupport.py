@@ -1,4 +1,7 @@
 import abc
+import tempfile
+from pathlib import Path
+from typing import Mapping
 
 # noinspection PyPackageRequirements
 import pytest
@@ -7,6 +10,7 @@ from assertpy import assert_that
 
 from _utils import AtomicMemoryStorage, persistent_storage, seed_uuid
 from mypass.db import MasterDbSupport, VaultDbSupport
+from mypass.db.sqlite import MasterSqliteRepository, VaultSqliteRepository
 from mypass.db.tiny import MasterTinyRepository, VaultTinyRepository
 from mypass.exceptions import MasterPasswordExistsError, UserNotExistsError, InvalidUpdateError, \
     EmptyRecordInsertionError, RecordNotFoundError, EmptyQueryError
@@ -20,6 +24,11 @@ class MasterDbSupportTester(abc.ABC):
     dbsupport: MasterDbSupport
     objects: list[MasterEntity]
 
+    def records(self) -> Mapping[str, Mapping]:
+        """Stored documents by their id (as string)."""
+        assert_that(persistent_storage).contains_key('test-table')
+        return persistent_storage['test-table']
+
     @pytest.mark.dependency(name='self::test_create')
     def test_create(self):
         pk1 = self.dbsupport.create_master_password(self.objects[0])
@@ -30,8 +39,7 @@ class MasterDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_create'])
     def test_records(self):
-        assert_that(persistent_storage).contains_key('test-table')
-        table = persistent_storage['test-table']
+        table = self.records()
         assert_that(table).contains_key(str(self.objects[0].id), str(self.objects[1].id), str(self.objects[2].id))
         assert_that(table[str(self.objects[0].id)]).is_equal_to(dict(self.objects[0]))
         assert_that(table[str(self.objects[1].id)]).is_equal_to(dict(self.objects[1]))
@@ -71,7 +79,7 @@ class MasterDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_update'])
     def test_records_after_update(self):
-        table = persistent_storage['test-table']
+        table = self.records()
         changed1 = dict(self.objects[0])
         changed1['pw'] = 'EverChanging'
         changed2 = dict(self.objects[1])
@@ -94,6 +102,11 @@ class VaultDbSupportTester(abc.ABC):
     dbsupport: VaultDbSupport
     objects: list[VaultEntity]
 
+    def records(self) -> Mapping[str, Mapping]:
+        """Stored documents by their id (as string)."""
+        assert_that(persistent_storage).contains_key('test-table')
+        return persistent_storage['test-table']
+
     @pytest.mark.dependency(name='self::test_create')
     def test_create(self):
         pk1 = self.dbsupport.create_vault_entry(self.objects[0].pop(UID_FIELD, None), entity=self.objects[0])
@@ -106,8 +119,7 @@ class VaultDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_create'])
     def test_records(self):
-        assert_that(persistent_storage).contains_key('test-table')
-        table = persistent_storage['test-table']
+        table = self.records()
         assert_that(table).contains_key(str(self.objects[0].id), str(self.objects[1].id), str(self.objects[2].id))
         assert_that(table[str(self.objects[0].id)]).is_equal_to(dict(self.objects[0]))
         assert_that(table[str(self.objects[1].id)]).is_equal_to(dict(self.objects[1]))
@@ -189,7 +201,7 @@ class VaultDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_update'])
     def test_records_after_update(self):
-        table = persistent_storage['test-table']
+        table = self.records()
         changed1 = dict(self.objects[0])
         changed1['pw'] = 'EverChanging'
         changed2 = dict(self.objects[1])
@@ -218,7 +230,7 @@ class VaultDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_updates'])
     def test_records_after_updates(self):
-        table = persistent_storage['test-table']
+        table = self.records()
         changed1 = dict(self.objects[2])
         changed1['pw'] = 'EverChanging'
         changed2 = dict(self.objects[4])
@@ -248,7 +260,7 @@ class VaultDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_delete'])
     def test_records_after_delete(self):
-        table = persistent_storage['test-table']
+        table = self.records()
         assert_that(table).is_length(len(self.objects) - 2)
         assert_that(table).does_not_contain_key(*[self.objects[4].id, self.objects[7].id])
 
@@ -260,7 +272,7 @@ class VaultDbSupportTester(abc.ABC):
 
     @pytest.mark.dependency(depends=['self::test_deletes'])
     def test_records_after_deletes(self):
-        table = persistent_storage['test-table']
+        table = self.records()
         assert_that(table).is_length(len(self.objects) - 4)
         assert_that(table).does_not_contain_key(*[
             self.objects[4].id, self.objects[7].id, self.objects[8].id, self.objects[9].id])
@@ -311,3 +323,53 @@ class TestTinyVaultDbSupport(VaultDbSupportTester):
         objects[5][UID_FIELD] = 7
         objects[6][UID_FIELD] = 14
         cls.objects = objects
+
+
+class TestPersistentTinyMasterDbSupport(TestTinyMasterDbSupport):
+    @classmethod
+    def setup_class(cls):
+        super().setup_class()
+        cls.repo = MasterTinyRepository(table='test-table', storage=AtomicMemoryStorage, persistent=True)
+        cls.dbsupport = MasterDbSupport(repo=cls.repo)
+
+
+class TestPersistentTinyVaultDbSupport(TestTinyVaultDbSupport):
+    @classmethod
+    def setup_class(cls):
+        super().setup_class()
+        cls.repo = VaultTinyRepository(table='test-table', storage=AtomicMemoryStorage, persistent=True)
+        cls.dbsupport = VaultDbSupport(repo=cls.repo)
+
+
+class TestSqliteMasterDbSupport(TestTinyMasterDbSupport):
+    def records(self) -> Mapping[str, Mapping]:
+        return self.repo.dao.dump()
+
+    @classmethod
+    def setup_class(cls):
+        super().setup_class()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.repo = MasterSqliteRepository(table='test-table', path=Path(cls.tmp_dir.name) / 'db.sqlite3')
+        cls.dbsupport = MasterDbSupport(repo=cls.repo)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.repo.dao.unlink()
+        cls.tmp_dir.cleanup()
+
+
+class TestSqliteVaultDbSupport(TestTinyVaultDbSupport):
+    def records(self) -> Mapping[str, Mapping]:
+        return self.repo.dao.dump()
+
+    @classmethod
+    def setup_class(cls):
+        super().setup_class()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.repo = VaultSqliteRepository(table='test-table', path=Path(cls.tmp_dir.name) / 'db.sqlite3')
+        cls.dbsupport = VaultDbSupport(repo=cls.repo)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.repo.dao.unlink()
+        cls.tmp_dir.cleanup()
@@ -0,0 +1,97 @@
+import copy
+import pickle
+
+# noinspection PyPackageRequirements
+import pytest
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.types import MasterEntity, VaultEntity
+from mypass.types.const import UID_FIELD
+from mypass.utils import entity_as_dict
+
+
+class TestEntity:
+    def test_slots(self):
+        entity = VaultEntity(1, user='mypass-user', pw='secret')
+        assert_that(hasattr(entity, '__dict__')).is_false()
+        assert_that(VaultEntity._field_names).is_equal_to(('user', 'pw', 'salt', 'label', 'email', 'site'))
+        assert_that(MasterEntity._field_names).is_equal_to(('user', 'token', 'pw', 'salt'))
+
+    def test_mapping(self):
+        entity = VaultEntity(1, site='example.com', user='mypass-user', _salt='salty', extra=None)
+        assert_that(entity.id).is_equal_to(1)
+        assert_that(list(entity)).is_equal_to(['user', 'site', '_salt'])
+        assert_that(entity).is_length(3)
+        assert_that(entity).contains_key('user', '_salt').does_not_contain_key('pw', 'extra', 'id')
+        assert_that(entity['_salt']).is_equal_to('salty')
+        assert_that(entity._salt).is_equal_to('salty')
+        assert_that(entity.site).is_equal_to('example.com')
+        assert_that(dict(entity)).is_equal_to({'user': 'mypass-user', 'site': 'example.com', '_salt': 'salty'})
+        with pytest.raises(KeyError):
+            _ = entity['pw']
+        with pytest.raises(AttributeError):
+            _ = entity.pw
+
+    def test_length_tracking(self):
+        entity = VaultEntity()
+        assert_that(entity.is_empty()).is_true()
+        entity.pw = 'secret'
+        entity['pw'] = 'other'
+        entity[UID_FIELD] = 1
+        entity.extra = 'extra'
+        assert_that(entity).is_length(3)
+        del entity['pw']
+        assert_that(entity.pop(UID_FIELD)).is_equal_to(1)
+        assert_that(entity.pop(UID_FIELD, None)).is_none()
+        assert_that(entity.pop).raises(AttributeError).when_called_with('pw')
+        del entity.extra
+        assert_that(entity).is_length(0)
+        assert_that(entity.is_empty()).is_true()
+
+    def test_fields_named_as_class_attributes(self):
+        entity = VaultEntity(1, user='mypass-user', items=['item'])
+        # attribute access of these names is the class attribute, so the fields are only set and read as items
+        assert_that(setattr).raises(AttributeError).when_called_with(entity, 'copy', 5)
+        assert_that(setattr).raises(AttributeError).when_called_with(entity, 'get', 'got')
+        assert_that(entity.copy).is_not_equal_to(5)
+        entity['get'] = 'got'
+        entity.id = 2
+        assert_that(entity).is_length(3)
+        assert_that(entity['get']).is_equal_to('got')
+        assert_that(entity.get('get')).is_equal_to('got')
+        assert_that(dict(entity)).is_equal_to({'user': 'mypass-user', 'items': ['item'], 'get': 'got'})
+        assert_that(entity.id).is_equal_to(2)
+        del entity['items']
+        assert_that(entity).does_not_contain_key('items').is_length(2)
+
+    def test_pickle_and_deepcopy(self):
+        entity = VaultEntity(1, user='mypass-user', _salt='salty', tags=['a'])
+        master = MasterEntity('master', user='mypass-user')
+        master['extra'] = {'k': 1}
+        for original in (entity, master):
+            for restored in (pickle.loads(pickle.dumps(original)), copy.deepcopy(original)):
+                assert_that(type(restored)).is_same_as(type(original))
+                assert_that(restored.id).is_equal_to(original.id)
+                assert_that(dict(restored)).is_equal_to(dict(original))
+                assert_that(restored).is_length(len(original))
+        copied = copy.deepcopy(entity)
+        copied.tags.append('b')
+        copied.pw = 'secret'
+        assert_that(entity.tags).is_equal_to(['a'])
+        assert_that(entity).does_not_contain_key('pw')
+        assert_that(hasattr(VaultEntity.__new__(VaultEntity), '_extra')).is_false()
+
+    def test_copy_and_update(self):
+        entity = VaultEntity(1, user='mypass-user', _salt='salty')
+        copied = copy.copy(entity)
+        assert_that(copied).is_equal_to(entity).is_not_same_as(entity)
+        merged = entity | {'pw': 'secret', 'user': 'other'}
+        assert_that(dict(merged)).is_equal_to({'user': 'other', 'pw': 'secret', '_salt': 'salty'})
+        assert_that(entity).does_not_contain_key('pw')
+
+    def test_entity_as_dict(self):
+        entity = VaultEntity(1, user='mypass-user', _UID='uid', _salt='salty')
+        assert_that(entity_as_dict(entity, keep_id=True, remove_special=False)).is_equal_to(
+            {'_id': 1, 'user': 'mypass-user', '_UID': 'uid', '_salt': 'salty'})
+        assert_that(entity_as_dict(entity)).is_equal_to({'user': 'mypass-user', '_salt': 'salty'})
@@ -0,0 +1,379 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.db.fs import FileSystemDao, FileSystemIndex, VaultFileSystemRepository
+from mypass.db.serializers import LengthPrefixedSerializer
+from mypass.exceptions import RequiresIdError
+from mypass.types import VaultEntity
+from mypass.types.const import UID_FIELD
+
+
+class CountingFileSystemDao(FileSystemDao):
+    def __init__(self, max_workers=None):
+        super().__init__(max_workers=max_workers)
+        self.examined = 0
+        self.reads = 0
+
+    def read_one(self, path, into=None, fields=None):
+        self.reads += 1
+        return super().read_one(path, into=into, fields=fields)
+
+    def find_documents(self, paths, crit, into=None, fields=None):
+        paths = list(paths)
+        self.examined += len(paths)
+        return super().find_documents(paths, crit, into=into, fields=fields)
+
+
+class TestFileSystemIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        cls.root = cls.tmp_dir / 'vault'
+        cls.root.mkdir()
+        for i in range(6):
+            (cls.root / f'{i}.json').write_text(json.dumps({UID_FIELD: i % 2, 'site': f'site-{i}'}))
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_candidates(self):
+        index = FileSystemIndex(self.root, (UID_FIELD, 'site'))
+        assert_that(index).is_length(6)
+        assert_that(index.candidates({UID_FIELD: 1})).is_equal_to(
+            [self.root / '1.json', self.root / '3.json', self.root / '5.json'])
+        assert_that(index.candidates({UID_FIELD: 1, 'site': 'site-3'})).is_equal_to([self.root / '3.json'])
+        assert_that(index.candidates({UID_FIELD: 2})).is_empty()
+        assert_that(index.candidates({'pw': 'secret'})).is_none()
+        assert_that(index.candidates({})).is_none()
+
+    def test_persisted(self):
+        index = FileSystemIndex(self.root, (UID_FIELD,))
+        assert_that(str(index.path)).exists()
+        saved = json.loads(index.path.read_text())
+        assert_that(saved['fields']).is_equal_to([UID_FIELD])
+        assert_that(saved['files']).is_length(6)
+
+    def test_load_parses_changed_files_only(self):
+        reads = []
+
+        def reader(path):
+            reads.append(Path(path).name)
+            return json.loads(Path(path).read_text())
+
+        FileSystemIndex(self.root, (UID_FIELD,), reader=reader)
+        reads.clear()
+        index = FileSystemIndex(self.root, (UID_FIELD,), reader=reader)
+        assert_that(reads).is_empty()
+
+        (self.root / '0.json').write_text(json.dumps({UID_FIELD: 7, 'site': 'changed-site'}))
+        (self.root / 'new.json').write_text(json.dumps({UID_FIELD: 7}))
+        (self.root / '5.json').unlink()
+        index.load()
+        assert_that(sorted(reads)).is_equal_to(['0.json', 'new.json'])
+        assert_that(index.candidates({UID_FIELD: 7})).is_equal_to([self.root / '0.json', self.root / 'new.json'])
+        assert_that(index.candidates({UID_FIELD: 1})).is_equal_to([self.root / '1.json', self.root / '3.json'])
+
+    def test_fields_changed(self):
+        FileSystemIndex(self.root, (UID_FIELD,))
+        index = FileSystemIndex(self.root, ('site',))
+        assert_that(index.candidates({'site': 'site-1'})).is_equal_to([self.root / '1.json'])
+
+
+class TestIndexedNumericCriteria:
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        cls.root = cls.tmp_dir / 'vault'
+        cls.root.mkdir()
+        cls.dao = FileSystemDao()
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_same_as_scan(self):
+        values = [1, 1.0, True, 0, 0.0, False, 2, 2.5, '1', None, [1, 2], [True, 2.0], {'a': 1}, {'a': 1.0}]
+        for i, value in enumerate(values):
+            (self.root / f'{i}.json').write_text(json.dumps({UID_FIELD: value}))
+        indexed = VaultFileSystemRepository(self.root, self.dao)
+        scanned = VaultFileSystemRepository(self.root, self.dao, indexes=())
+        for value in values + [1.5, [1.0, 2], {'a': True}]:
+            found = sorted(e.id for e in indexed.find_by_crit({UID_FIELD: value}))
+            assert_that(found).described_as(repr(value)).is_equal_to(
+                sorted(e.id for e in scanned.find_by_crit({UID_FIELD: value})))
+        assert_that(indexed.find_by_crit({UID_FIELD: 1})).is_length(3)
+
+
+class TestIndexedFileSystemRepository:
+    max_workers = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        cls.root = cls.tmp_dir / 'vault'
+        cls.root.mkdir()
+        cls.dao = CountingFileSystemDao(max_workers=cls.max_workers)
+        cls.repo = VaultFileSystemRepository(cls.root, cls.dao)
+        for i in range(10):
+            cls.repo.create(VaultEntity(f'entry-{i}', user=f'user-{i}', site='x', **{UID_FIELD: i % 5}))
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_find_by_crit(self):
+        self.dao.examined = self.dao.reads = 0
+        found = list(self.repo.find_by_crit({UID_FIELD: 3, 'site': 'x'}))
+        assert_that([e.id for e in found]).is_equal_to(
+            [str(self.root / 'entry-3.json'), str(self.root / 'entry-8.json')])
+        # only the candidates are examined, and matched files are not read again
+        assert_that(self.dao.examined).is_equal_to(2)
+        assert_that(self.dao.reads).is_equal_to(0)
+
+    def test_find_by_crit_scan(self):
+        found = list(self.repo.find_by_crit({'user': 'user-4'}))
+        assert_that(found).is_length(1)
+        assert_that(found[0][UID_FIELD]).is_equal_to(4)
+
+    def test_iter(self):
+        self.dao.reads = 0
+        entities = self.repo.iter_by_crit({UID_FIELD: 3})
+        assert_that(self.dao.reads).is_equal_to(0)
+        assert_that([e.id for e in entities]).is_equal_to(
+            [str(self.root / 'entry-3.json'), str(self.root / 'entry-8.json')])
+        assert_that(self.dao.reads).is_equal_to(2)
+        assert_that(list(self.repo.iter_by_ids(['entry-2', 'missing']))).is_equal_to(
+            [self.repo.find_by_id('entry-2')])
+        assert_that(list(self.repo.iter_find(['entry-2', 'entry-4'], {'user': 'user-4'}))).is_length(1)
+        assert_that(list(self.repo.iter_all())).is_equal_to(list(self.repo.find_all()))
+
+    def test_pagination(self):
+        page = self.repo.find_by_crit({'site': 'x'}, limit=3)
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-0', 'entry-1', 'entry-2'])
+        page = self.repo.find_by_crit({'site': 'x'}, limit=3, cursor=page[-1].id)
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-3', 'entry-4', 'entry-5'])
+        page = self.repo.find_by_crit({UID_FIELD: 3}, limit=3, cursor='entry-3')
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-8'])
+        page = self.repo.find_all(limit=2, cursor='entry-7')
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-8', 'entry-9'])
+        page = self.repo.find_by_ids(['entry-9', 'entry-2', 'entry-5'], limit=2)
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-2', 'entry-5'])
+        page = self.repo.find(['entry-9', 'entry-2', 'entry-4'], {UID_FIELD: 4}, cursor='entry-4')
+        assert_that([Path(e.id).stem for e in page]).is_equal_to(['entry-9'])
+
+    def test_projection(self):
+        entities = self.repo.find_by_crit({UID_FIELD: 3}, fields=['user'])
+        assert_that([dict(e) for e in entities]).is_equal_to([{'user': 'user-3'}, {'user': 'user-8'}])
+        entities = self.repo.find_by_crit({UID_FIELD: 3}, fields=['site', UID_FIELD], limit=1)
+        assert_that([dict(e) for e in entities]).is_equal_to([{'site': 'x', UID_FIELD: 3}])
+        entities = self.repo.find(['entry-2', 'entry-7'], {UID_FIELD: 2}, fields=['user'])
+        assert_that([dict(e) for e in entities]).is_equal_to([{'user': 'user-2'}, {'user': 'user-7'}])
+        entities = self.repo.find_by_ids(['entry-0'], fields=['nope'])
+        assert_that([(Path(e.id).stem, dict(e)) for e in entities]).is_equal_to([('entry-0', {})])
+        entities = self.repo.iter_by_crit({UID_FIELD: 4}, fields=['user'])
+        assert_that([dict(e) for e in entities]).is_equal_to([{'user': 'user-4'}, {'user': 'user-9'}])
+
+    def test_update_and_remove_by_crit(self):
+        updated = self.repo.update_by_crit({UID_FIELD: 1}, {UID_FIELD: 42})
+        assert_that(updated).is_length(2)
+        assert_that(self.repo.find_by_crit({UID_FIELD: 1})).is_empty()
+        assert_that(self.repo.find_by_crit({UID_FIELD: 42})).is_length(2)
+
+        removed = self.repo.remove_by_crit({UID_FIELD: 42})
+        assert_that(removed).is_length(2)
+        assert_that(self.repo.find_by_crit({UID_FIELD: 42})).is_empty()
+        assert_that(self.repo.find_by_id('entry-1')).is_none()
+
+    def test_index_reloaded(self):
+        repo = VaultFileSystemRepository(self.root, FileSystemDao())
+        assert_that(repo.find_by_crit({UID_FIELD: 2})).is_length(2)
+        assert_that(len(repo.index)).is_equal_to(len(repo.dao.find_all_files(self.root)))
+
+    def test_find_all(self):
+        assert_that(list(self.repo.find_all())).is_length(len(self.repo.dao.find_all_files(self.root)))
+
+    def test_unindexed(self):
+        repo = VaultFileSystemRepository(self.root, FileSystemDao(), indexes=())
+        assert_that(repo.index).is_none()
+        assert_that(repo.find_by_crit({UID_FIELD: 2})).is_length(2)
+
+
+class TestFileSystemIndexLog:
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def _repo(self, name: str, size: int, dao: FileSystemDao = None) -> VaultFileSystemRepository:
+        root = self.tmp_dir / name
+        if not root.exists():
+            root.mkdir()
+            for i in range(size):
+                (root / f'{i:05d}.json').write_text(json.dumps({UID_FIELD: i % 10}))
+        return VaultFileSystemRepository(root, dao or FileSystemDao())
+
+    def _write_cost(self, repo: VaultFileSystemRepository) -> int:
+        saved = repo.index.path.stat()
+        logged = repo.index.log_path.stat().st_size if repo.index.log_path.exists() else 0
+        repo.create(VaultEntity('entry', user='user', **{UID_FIELD: 3}))
+        repo.update_by_id('entry', VaultEntity(pw='changed'))
+        repo.remove_by_id('entry')
+        # the index itself is not rewritten, only the log grows
+        assert_that(repo.index.path.stat().st_mtime_ns).is_equal_to(saved.st_mtime_ns)
+        return repo.index.log_path.stat().st_size - logged
+
+    def test_write_cost_independent_of_size(self):
+        small, large = self._repo('small', 10), self._repo('large', 2000)
+        assert_that(self._write_cost(large)).is_equal_to(self._write_cost(small))
+
+    def test_log_replayed_and_compacted(self):
+        repo = self._repo('replayed', 20)
+        repo.create(VaultEntity('logged', user='user', **{UID_FIELD: 42}))
+        repo.remove_by_id('00001')
+        dao = CountingFileSystemDao()
+        reloaded = self._repo('replayed', 20, dao)
+        # the logged changes are loaded without parsing the files again
+        assert_that(dao.reads).is_equal_to(0)
+        assert_that(reloaded.index.candidates({UID_FIELD: 42})).is_equal_to([reloaded.root_folder / 'logged.json'])
+        assert_that(reloaded.index.candidates({UID_FIELD: 1})).is_length(1)
+        reloaded.create(VaultEntity('compacted', user='user', **{UID_FIELD: 42}))
+        reloaded.close()
+        assert_that(str(reloaded.index.log_path)).does_not_exist()
+        saved = json.loads(reloaded.index.path.read_text())
+        assert_that(saved['files']).contains_key('logged.json', 'compacted.json').does_not_contain_key('00001.json')
+
+    def test_compact_threshold(self):
+        repo = self._repo('threshold', 0)
+        repo.index.compact_threshold = 3
+        repo.create_many([VaultEntity(f'many-{i}', **{UID_FIELD: 1}) for i in range(2)])
+        assert_that(str(repo.index.log_path)).exists()
+        repo.create(VaultEntity('third', **{UID_FIELD: 1}))
+        assert_that(str(repo.index.log_path)).does_not_exist()
+        assert_that(json.loads(repo.index.path.read_text())['files']).is_length(3)
+        # once the index has more files than the threshold, the log is compacted after as many records
+        repo.create_many([VaultEntity(f'more-{i}', **{UID_FIELD: 1}) for i in range(3)])
+        assert_that(str(repo.index.log_path)).exists()
+        repo.remove_by_ids([f'more-{i}' for i in range(3)])
+        assert_that(str(repo.index.log_path)).does_not_exist()
+
+
+class TestFileSystemRepositoryCreateMany:
+    max_workers = None
+    serializer = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        cls.root = cls.tmp_dir / 'vault'
+        cls.root.mkdir()
+        cls.dao = FileSystemDao(max_workers=cls.max_workers, serializer=cls.serializer)
+        cls.repo = VaultFileSystemRepository(cls.root, cls.dao)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_create_many(self):
+        ids = self.repo.create_many([VaultEntity(f'many-{i}', **{UID_FIELD: i % 2}) for i in range(6)])
+        assert_that(ids).is_equal_to([str(self.root / f'many-{i}{self.dao.serializer.extension}') for i in range(6)])
+        assert_that([Path(e.id).stem for e in self.repo.find_by_crit({UID_FIELD: 1})]).is_equal_to(
+            ['many-1', 'many-3', 'many-5'])
+
+    def test_requires_id(self):
+        entities = [VaultEntity('with-id', user='a'), VaultEntity(user='b')]
+        assert_that(self.repo.create_many).raises(RequiresIdError).when_called_with(entities)
+        assert_that(self.repo.find_by_id('with-id')).is_none()
+
+    def test_existing_file(self):
+        self.repo.create(VaultEntity('existing', user='a', **{UID_FIELD: 'existing'}))
+        entities = [VaultEntity('not-existing', user='b', **{UID_FIELD: 'existing'}),
+                    VaultEntity('existing', user='c', **{UID_FIELD: 'existing'})]
+        assert_that(self.repo.create_many).raises(FileExistsError).when_called_with(entities)
+        assert_that(self.repo.find_by_id('not-existing')).is_none()
+        assert_that([e.id for e in entities]).is_equal_to(['not-existing', 'existing'])
+        assert_that([Path(e.id).stem for e in self.repo.find_by_crit({UID_FIELD: 'existing'})]).is_equal_to(
+            ['existing'])
+        duplicated = [VaultEntity('duplicated', user='d'), VaultEntity('duplicated', user='e')]
+        assert_that(self.repo.create_many).raises(FileExistsError).when_called_with(duplicated)
+        assert_that(self.repo.find_by_id('duplicated')).is_none()
+
+    def test_partial_failure(self):
+        # the 3rd entity can not be serialized, the files written before are removed
+        entities = [VaultEntity(f'partial-{i}', user='a', **{UID_FIELD: 'partial'}) for i in range(5)]
+        entities[2]['pw'] = object()
+        assert_that(self.repo.create_many).raises(TypeError).when_called_with(entities)
+        assert_that([self.repo.find_by_id(f'partial-{i}') for i in range(5)]).is_equal_to([None] * 5)
+        assert_that(list(self.repo.find_by_crit({UID_FIELD: 'partial'}))).is_empty()
+        assert_that(self.repo.index.candidates({UID_FIELD: 'partial'})).is_empty()
+        assert_that(entities[0].id).is_equal_to('partial-0')
+
+
+class TestParallelFileSystemRepositoryCreateMany(TestFileSystemRepositoryCreateMany):
+    max_workers = 4
+
+
+class TestLengthPrefixedFileSystemRepository(TestFileSystemRepositoryCreateMany):
+    serializer = LengthPrefixedSerializer()
+
+    def test_file_format(self):
+        self.repo.create(VaultEntity('formatted', user='formatted', **{UID_FIELD: 7}))
+        assert_that(str(self.root / 'formatted.json')).does_not_exist()
+        with open(self.root / 'formatted.lp', 'rb') as f:
+            assert_that(self.serializer.loads(f.read())).is_equal_to({'user': 'formatted', UID_FIELD: 7})
+        self.repo.update_by_crit({UID_FIELD: 7}, VaultEntity(pw='updated'))
+        assert_that(self.repo.find_by_id('formatted').pw).is_equal_to('updated')
+
+
+class TestParallelIndexedFileSystemRepository(TestIndexedFileSystemRepository):
+    max_workers = 4
+
+
+class TestParallelFileSystemDao:
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        cls.serial = FileSystemDao()
+        cls.dao = FileSystemDao(max_workers=8)
+        cls.paths = [cls.tmp_dir / f'{i}.json' for i in range(64)]
+        for i, path in enumerate(cls.paths):
+            cls.dao.create(path, {UID_FIELD: i % 3, 'n': i})
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_parallel(self):
+        assert_that(self.serial.parallel).is_false()
+        assert_that(FileSystemDao(max_workers=1).parallel).is_false()
+        assert_that(self.dao.parallel).is_true()
+
+    def test_read_order(self):
+        docs = self.dao.read(self.paths)
+        assert_that([doc['n'] for doc in docs]).is_equal_to(list(range(64)))
+        assert_that(docs).is_equal_to(self.serial.read(self.paths))
+
+    def test_find_order(self):
+        found = self.dao.find(reversed(self.paths), {UID_FIELD: 1})
+        assert_that(found).is_equal_to(self.serial.find(reversed(self.paths), {UID_FIELD: 1}))
+        assert_that(found).is_equal_to([path for path in reversed(self.paths) if int(path.stem) % 3 == 1])
+        docs = self.dao.find_documents(self.paths, {UID_FIELD: 2}, into=VaultEntity)
+        assert_that([doc.id for doc in docs]).is_equal_to([str(p) for p in self.paths if int(p.stem) % 3 == 2])
+
+    def test_update_and_delete_order(self):
+        paths = self.paths[:8]
+        assert_that(self.dao.update(paths, {'updated': True})).is_equal_to([True] * 8)
+        assert_that(all(doc['updated'] for doc in self.dao.read(paths))).is_true()
+        deleted = self.dao.delete([paths[0], self.tmp_dir / 'missing.json', paths[1]])
+        assert_that(deleted).is_equal_to([True, False, True])
@@ -0,0 +1,179 @@
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.db.git import GitCommitWorker, VaultGitRepository
+from mypass.db.tiny import VaultTinyRepository
+from mypass.types import VaultEntity
+from mypass.utils import GitSupport
+
+
+class FakeGit:
+    def __init__(self, fail=False):
+        self.commits = 0
+        self.staged = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def stage_commit_push(self, paths=None):
+        with self.lock:
+            self.commits += 1
+            self.staged.append(paths)
+        if self.fail:
+            raise RuntimeError('remote rejected')
+
+
+class TestGitCommitWorker:
+    def test_coalesce(self):
+        git = FakeGit()
+        worker = GitCommitWorker(git, debounce=0.05)
+        tickets = [worker.submit([f'file{i % 5}.json']) for i in range(20)]
+        assert_that(worker.metrics['queue_depth']).is_equal_to(20)
+        assert_that(worker.wait_durable(tickets[-1], timeout=5)).is_true()
+        assert_that(git.commits).is_equal_to(1)
+        assert_that(git.staged[0]).is_equal_to({f'file{i}.json' for i in range(5)})
+        assert_that(worker.metrics).contains_entry({'queue_depth': 0}, {'lag': 0.0}, {'commits': 1})
+        worker.close()
+
+    def test_flush(self):
+        git = FakeGit()
+        worker = GitCommitWorker(git, debounce=60)
+        worker.submit()
+        start = time.monotonic()
+        assert_that(worker.flush(timeout=5)).is_true()
+        assert_that(time.monotonic() - start).is_less_than(5)
+        assert_that(git.commits).is_equal_to(1)
+        worker.close()
+
+    def test_close_commits_pending(self):
+        git = FakeGit()
+        worker = GitCommitWorker(git, debounce=60)
+        worker.submit()
+        worker.close()
+        assert_that(git.commits).is_equal_to(1)
+
+    def test_failure(self):
+        worker = GitCommitWorker(FakeGit(fail=True), debounce=0)
+        ticket = worker.submit()
+        assert_that(worker.wait_durable).raises(IOError).when_called_with(ticket)
+        assert_that(worker.metrics['last_error']).contains('remote rejected')
+        assert_that(worker.metrics).contains_entry({'queue_depth': 1}, {'committed': 0}, {'failures': 1})
+        worker.close()
+
+    def test_older_ticket_durable_after_failure(self):
+        git = FakeGit()
+        worker = GitCommitWorker(git, debounce=0, retry_delay=60)
+        durable = worker.submit(['a.json'])
+        assert_that(worker.wait_durable(durable, timeout=5)).is_true()
+        git.fail = True
+        failed = worker.submit(['b.json'])
+        assert_that(worker.wait_durable).raises(IOError).when_called_with(failed, timeout=5)
+        assert_that(worker.wait_durable(durable, timeout=0)).is_true()
+        assert_that(worker.metrics).contains_entry({'queue_depth': 1}, {'committed': durable})
+        git.fail = False
+        assert_that(worker.flush(timeout=5)).is_true()
+        assert_that(git.staged[-1]).is_equal_to({'b.json'})
+        worker.close()
+
+    def test_retry_without_submit(self):
+        git = FakeGit(fail=True)
+        worker = GitCommitWorker(git, debounce=0, retry_delay=0.05)
+        ticket = worker.submit(['a.json'])
+        assert_that(worker.wait_durable).raises(IOError).when_called_with(ticket, timeout=5)
+        git.fail = False
+        deadline = time.monotonic() + 5
+        while worker.metrics['committed'] < ticket and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert_that(worker.wait_durable(ticket, timeout=0)).is_true()
+        assert_that(git.commits).is_greater_than_or_equal_to(2)
+        assert_that(git.staged[-1]).is_equal_to({'a.json'})
+        assert_that(worker.metrics).contains_entry({'queue_depth': 0}, {'failures': 0})
+        worker.close()
+
+
+class TestAsyncGitRepository:
+    def test_async_commit(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dao = VaultTinyRepository(path=Path(tmp_dir) / 'db.json')
+            repo = VaultGitRepository(dao=dao, async_commit=True, debounce=0.05, path=tmp_dir)
+            pk1 = repo.create(VaultEntity(user='mypass-user', pw='secret'))
+            pk2 = repo.create(VaultEntity(user='db-user', pw='secret'))
+            repo.update_by_ids([pk1, pk2], VaultEntity(pw='changed'))
+            assert_that(repo.flush(timeout=10)).is_true()
+            commits = list(repo.git.repo.iter_commits())
+            assert_that(commits).is_length(1)
+            assert_that(commits[0].message).contains('db.json -- A')
+            assert_that(repo.metrics).contains_entry({'queue_depth': 0})
+            repo.close()
+            repo.git.repo.close()
+
+    def test_create_many_single_commit(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dao = VaultTinyRepository(path=Path(tmp_dir) / 'db.json')
+            repo = VaultGitRepository(dao=dao, path=tmp_dir)
+            ids = repo.create_many([VaultEntity(user=f'user{i}', pw='secret') for i in range(5)])
+            assert_that(ids).is_equal_to([1, 2, 3, 4, 5])
+            assert_that(list(repo.git.repo.iter_commits())).is_length(1)
+            repo.close()
+            repo.git.repo.close()
+
+
+class TestGitSupportStaging:
+    def test_stage_touched_paths(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            git = GitSupport(path=tmp_dir)
+            (root / 'a.json').write_text('{}')
+            (root / 'b.json').write_text('{}')
+            (root / 'untouched.json').write_text('{}')
+            git.stage_commit_push([root / 'a.json', root / 'b.json'])
+            (root / 'a.json').write_text('{"pw": "changed"}')
+            (root / 'b.json').unlink()
+            git.stage_commit_push([root / 'a.json', root / 'b.json', root / 'never-existed.json'])
+            commits = list(git.repo.iter_commits())
+            assert_that(commits).is_length(2)
+            assert_that(commits[1].message).contains('a.json -- A', 'b.json -- A')
+            assert_that(commits[0].message).contains('a.json -- M', 'b.json -- D')
+            assert_that([blob.path for blob in commits[0].tree.traverse()]).is_equal_to(['a.json'])
+            git.repo.close()
+
+    def test_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            git = GitSupport(path=tmp_dir)
+            (root / 'a.json').write_text('{}')
+            (root / 'b.json').write_text('{}')
+            git.stage_commit_push([root / 'a.json', root / 'b.json'])
+            (root / 'a.json').write_text('{}')
+            git.stage_commit_push([root / 'a.json', root / 'b.json'])
+            assert_that(list(git.repo.iter_commits())).is_length(1)
+            (root / 'b.json').write_text('{"pw": "changed"}')
+            assert_that(git.stage([root / 'a.json', root / 'b.json'])).is_equal_to({'b.json': 'M'})
+            git.repo.close()
+
+    def test_relative_to_working_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            (root / 'repo').mkdir()
+            git = GitSupport(path=root / 'repo')
+            (root / 'repo' / 'a.json').write_text('{}')
+            cwd = os.getcwd()
+            os.chdir(root)
+            try:
+                assert_that(git.stage([Path('repo') / 'a.json'])).is_equal_to({'a.json': 'A'})
+                assert_that(git.stage).raises(ValueError).when_called_with(['a.json'])
+            finally:
+                os.chdir(cwd)
+            git.repo.close()
+
+    def test_nothing_to_commit(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            git = GitSupport(path=tmp_dir)
+            git.stage_commit_push([Path(tmp_dir) / 'missing.json'])
+            assert_that(git.repo.head.is_valid()).is_false()
+            git.repo.close()
@@ -0,0 +1,78 @@
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.db.fs.dao import FileSystemDao
+from mypass.db.tiny import TinyDao
+from mypass.db.utils import Query, create_query, compile_criteria
+from mypass.types.const import UID_FIELD
+from tests._utils import AtomicMemoryStorage, persistent_storage
+
+
+class TestQuery:
+    def test_and(self):
+        query = create_query({'user': 'mypass-user', 'site': 'x'}, 'and')
+        assert_that(query({'user': 'mypass-user', 'site': 'x', 'pw': 'secret'})).is_true()
+        assert_that(query({'user': 'mypass-user', 'site': 'y'})).is_false()
+        assert_that(query({'user': 'mypass-user'})).is_false()
+
+    def test_or(self):
+        query = create_query({'user': 'mypass-user', 'site': 'x'}, 'or')
+        assert_that(query({'user': 'mypass-user'})).is_true()
+        assert_that(query({'site': 'x'})).is_true()
+        assert_that(query({'pw': 'secret'})).is_false()
+
+    def test_empty(self):
+        assert_that(create_query({}, 'and')({'user': 'mypass-user'})).is_true()
+        assert_that(create_query({}, 'or')({'user': 'mypass-user'})).is_false()
+
+    def test_shape_cache(self):
+        q1 = Query({'a': 1, 'b': 2})
+        q2 = Query({'b': 3, 'a': 4})
+        assert_that(q1._compiled).is_same_as(q2._compiled)
+        assert_that(Query({'a': 1}, 'or')._compiled).is_not_same_as(Query({'a': 1}, 'and')._compiled)
+
+    def test_selectivity_order(self):
+        compiled = compile_criteria(('common', 'rare'), 'and')
+        query = Query({'common': 1, 'rare': 1})
+        for i in range(compiled.sample_size):
+            query({'common': 1, 'rare': i % 8})
+        assert_that(query.explain()['order']).is_equal_to(['rare', 'common'])
+
+
+class TestQueryExplain:
+    def test_tiny_index(self):
+        query = Query({UID_FIELD: 1, 'site': 'x'})
+        docs = self.dao.read(cond=query)
+        assert_that(docs).is_length(1)
+        plan = query.explain()
+        assert_that(plan['strategy']).is_equal_to('index')
+        assert_that(plan['index']).is_equal_to([UID_FIELD])
+        assert_that(plan['examined']).is_equal_to(2)
+
+    def test_tiny_scan(self):
+        query = Query({'site': 'x'})
+        assert_that(self.dao.read(cond=query)).is_length(2)
+        assert_that(query.explain()).contains_entry({'strategy': 'scan'}, {'examined': 4})
+        query = Query({UID_FIELD: 1, 'site': 'x'}, 'or')
+        assert_that(self.dao.read(cond=query)).is_length(3)
+        assert_that(query.explain()).contains_entry({'strategy': 'scan'})
+
+    def test_fs_scan(self, tmp_path):
+        dao = FileSystemDao()
+        dao.create(tmp_path / 'a.json', {'site': 'x'})
+        dao.create(tmp_path / 'b.json', {'site': 'y'})
+        query = Query({'site': 'x'})
+        assert_that(dao.find_in_folder(tmp_path, query)).is_equal_to([tmp_path / 'a.json'])
+        assert_that(query.explain()).contains_entry({'strategy': 'scan'}, {'examined': 2})
+
+    @classmethod
+    def setup_class(cls):
+        cls.dao = TinyDao('query-table', storage=AtomicMemoryStorage, persistent=True, indexes=[UID_FIELD])
+        cls.dao.create({UID_FIELD: 1, 'site': 'x'})
+        cls.dao.create({UID_FIELD: 1, 'site': 'y'})
+        cls.dao.create({UID_FIELD: 2, 'site': 'x'})
+        cls.dao.create({UID_FIELD: 2, 'site': 'z'})
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
@@ -0,0 +1,46 @@
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.db.serializers import JsonSerializer, LengthPrefixedSerializer, MsgpackSerializer, available_formats, \
+    get_serializer, msgpack
+
+DATA = {
+    'vault': {
+        '1': {'user': 'user-1', 'pw': 'gAAAAABk', 'site': 'é', 'tags': ['a', {'nested': None}], '_uid': 3},
+        '2': {},
+    },
+    'empty': {},
+    'scalar': 1.5,
+}
+
+
+class TestSerializers:
+    def test_round_trip(self):
+        for name in available_formats():
+            serializer = get_serializer(name)
+            raw = serializer.dumps(DATA)
+            assert_that(raw).is_instance_of(bytes)
+            assert_that(serializer.loads(raw)).is_equal_to(DATA)
+
+    def test_length_prefixed_depth(self):
+        for depth in (1, 2, 3):
+            serializer = LengthPrefixedSerializer(depth=depth)
+            assert_that(serializer.loads(serializer.dumps(DATA))).is_equal_to(DATA)
+
+    def test_length_prefixed_invalid(self):
+        serializer = LengthPrefixedSerializer()
+        raw = serializer.dumps(DATA)
+        assert_that(serializer.loads).raises(ValueError).when_called_with(JsonSerializer().dumps(DATA))
+        assert_that(serializer.loads).raises(ValueError).when_called_with(raw[:len(raw) // 2])
+
+    def test_json_options(self):
+        serializer = JsonSerializer(indent=2)
+        assert_that(serializer.dumps({'a': 1})).is_equal_to(b'{\n  "a": 1\n}')
+
+    def test_get_serializer(self):
+        assert_that(get_serializer).raises(ValueError).when_called_with('xml')
+        if msgpack is None:
+            assert_that(available_formats()).does_not_contain('msgpack')
+            assert_that(MsgpackSerializer).raises(ImportError).when_called_with()
+        else:
+            assert_that(available_formats()).contains('msgpack')
@@ -0,0 +1,167 @@
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# noinspection PyPackageRequirements
+from assertpy import assert_that
+
+from mypass.db import create_query
+from mypass.db.sqlite import SqliteDao, VaultSqliteRepository, MasterSqliteRepository
+from mypass.db.sqlite.migrate import migrate_tiny
+from mypass.db.tiny import TinyDao, VaultTinyRepository, MasterTinyRepository
+from mypass.types import VaultEntity, MasterEntity
+from mypass.types.const import UID_FIELD
+from mypass.types.op import DEL
+
+
+class TestSqliteRepository:
+    def test_wal_mode(self):
+        conn = self.repo.dao.get_connection()
+        assert_that(conn.execute('PRAGMA journal_mode').fetchone()[0]).is_equal_to('wal')
+
+    def test_connection_per_thread(self):
+        connections = []
+
+        def connect():
+            connections.append(self.repo.dao.get_connection())
+            connections.append(self.repo.dao.get_connection())
+
+        thread = threading.Thread(target=connect)
+        thread.start()
+        thread.join()
+        assert_that(connections[0]).is_same_as(connections[1])
+        assert_that(connections[0]).is_not_same_as(self.repo.dao.get_connection())
+
+    def test_indexed_query(self):
+        query = create_query({UID_FIELD: 3, 'site': 'x'}, 'and')
+        assert_that(self.repo.dao.read(cond=query)).is_length(2)
+        assert_that(query.explain()).contains_entry({'strategy': 'index'})
+        conn = self.repo.dao.get_connection()
+        plan = ' '.join(row[-1] for row in conn.execute(
+            f'EXPLAIN QUERY PLAN SELECT id FROM "{self.repo.get_table_name()}" WHERE "f_{UID_FIELD}" = 3'))
+        assert_that(plan).contains('USING INDEX')
+
+    def test_find(self):
+        assert_that([e.user for e in self.repo.find_by_crit({UID_FIELD: 3})]).is_equal_to(['user-3', 'user-8'])
+        assert_that(self.repo.find_one(VaultEntity(user='user-4'))[UID_FIELD]).is_equal_to(4)
+        assert_that(self.repo.find([1, 4, 5], VaultEntity(**{UID_FIELD: 3}))).is_length(1)
+        assert_that(self.repo.find_by_ids([2 ** 100, 3])).is_length(1)
+        assert_that(self.repo.find_by_id(2 ** 100)).is_none()
+
+    def test_pagination_and_projection(self):
+        page = self.repo.find_all(limit=3, cursor=4)
+        assert_that([e.id for e in page]).is_equal_to([5, 6, 7])
+        entities = self.repo.find_by_crit({'site': 'x'}, limit=2, cursor=8, fields=['user'])
+        assert_that([(e.id, dict(e)) for e in entities]).is_equal_to(
+            [(9, {'user': 'user-8'}), (10, {'user': 'user-9'})])
+        ids = [e.id for e in self.repo.iter_all()]
+        assert_that(ids).is_equal_to(sorted(ids)).is_length(10)
+        assert_that([i for i, _ in self.repo.dao.iter(chunk_size=3)]).is_equal_to(ids)
+
+    def test_update(self):
+        self.repo.update_by_crit({UID_FIELD: 0}, VaultEntity(pw='changed', site=DEL, tags=['a', 'b']))
+        entity = self.repo.find_by_crit({UID_FIELD: 0})[0]
+        assert_that(dict(entity)).is_equal_to({'user': 'user-0', UID_FIELD: 0, 'pw': 'changed', 'tags': ['a', 'b']})
+        assert_that(self.repo.find_by_crit({'tags': ['a', 'b']})).is_length(2)
+
+    def test_create_existing_id_throws(self):
+        assert_that(self.repo.create_many).raises(ValueError).when_called_with(
+            [VaultEntity(100, user='new'), VaultEntity(1, user='duplicate')])
+        assert_that(self.repo.find_by_id(100)).is_none()
+
+    def test_concurrent_writes(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(
+                lambda i: self.repo.create(VaultEntity(user=f'concurrent-{i}', **{UID_FIELD: 42})), range(64)))
+            list(executor.map(lambda pk: self.repo.update_by_id(pk, VaultEntity(pw='updated')), ids))
+        assert_that(set(ids)).is_length(64)
+        assert_that({e.pw for e in self.repo.find_by_crit({UID_FIELD: 42})}).is_equal_to({'updated'})
+        assert_that(self.repo.remove_by_crit({UID_FIELD: 42})).is_equal_to(sorted(ids))
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.repo = VaultSqliteRepository(path=Path(cls.tmp_dir.name) / 'db.sqlite3')
+        cls.repo.create_many([VaultEntity(user=f'user-{i}', site='x', **{UID_FIELD: i % 5}) for i in range(10)])
+
+    @classmethod
+    def teardown_class(cls):
+        cls.repo.dao.unlink()
+        cls.tmp_dir.cleanup()
+
+
+class TestSqliteMigration:
+    def test_migrate_tiny(self):
+        source = Path(self.tmp_dir.name) / 'db.json'
+        target = Path(self.tmp_dir.name) / 'db.sqlite3'
+        master = MasterTinyRepository(path=source)
+        vault = VaultTinyRepository(path=source)
+        master.create(MasterEntity(user='mypass-user', pw='secret'))
+        vault.create_many([VaultEntity(user=f'user-{i}', **{UID_FIELD: 1}) for i in range(5)])
+        vault.remove_by_id(2)
+
+        copied = migrate_tiny(source, target)
+        assert_that(copied).is_equal_to({'master': 1, 'vault': 4})
+        migrated = VaultSqliteRepository(path=target)
+        with open(source) as f:
+            raw = json.load(f)['vault']
+        assert_that(migrated.dao.dump()).is_equal_to(raw)
+        assert_that(migrated.find_by_crit({UID_FIELD: 1})).is_length(4)
+        assert_that(MasterSqliteRepository(path=target).find_one(MasterEntity(user='mypass-user')).pw).is_equal_to(
+            'secret')
+        assert_that(migrate_tiny).raises(ValueError).when_called_with(source, target, tables=['vault'])
+        assert_that(migrated.dao.count()).is_equal_to(4)
+        migrated.dao.close()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
+
+
+class TestSqliteDao:
+    def test_schema_upgrade(self):
+        path = Path(self.tmp_dir.name) / 'upgrade.sqlite3'
+        dao = SqliteDao('vault', path)
+        dao.create({'user': 'before', UID_FIELD: 7})
+        dao.close()
+        dao = SqliteDao('vault', path, indexes=(UID_FIELD,))
+        query = create_query({UID_FIELD: 7}, 'and')
+        assert_that(dao.read(cond=query)).is_equal_to([(1, {'user': 'before', UID_FIELD: 7})])
+        assert_that(query.explain()).contains_entry({'strategy': 'index'})
+        dao.unlink()
+
+    def test_nested_criteria_as_tiny(self):
+        sqlite_dao = SqliteDao('vault', Path(self.tmp_dir.name) / 'nested.sqlite3', indexes=('meta',))
+        tiny_dao = TinyDao('vault', Path(self.tmp_dir.name) / 'nested.json')
+        documents = [
+            {'meta': {'a': 1, 'b': {'c': 2, 'd': [3, {'e': 4, 'f': 5}]}}, 'tags': ['x', {'k': 1, 'j': 2}]},
+            {'meta': {'b': {'d': [3, {'f': 5, 'e': 4}], 'c': 2}, 'a': 1}, 'tags': ['x', {'j': 2, 'k': 1}]},
+            {'meta': {'a': 1}, 'tags': ['x']},
+        ]
+        for document in documents:
+            sqlite_dao.create(document)
+            tiny_dao.create(document)
+        sqlite_dao.update({'other': {'z': 1, 'y': 2}}, doc_ids=[3])
+        tiny_dao.update({'other': {'z': 1, 'y': 2}}, doc_ids=[3])
+
+        for crit in [{'meta': {'b': {'c': 2, 'd': [3, {'f': 5, 'e': 4}]}, 'a': 1}},
+                     {'tags': ['x', {'k': 1, 'j': 2}]}, {'tags': ['x']}, {'other': {'y': 2, 'z': 1}},
+                     {'meta': {'a': 1}, 'other': {'z': 1, 'y': 2}}, {'tags': [{'j': 2, 'k': 1}, 'x']}]:
+            expected = [(doc.doc_id, dict(doc)) for doc in tiny_dao.read(cond=create_query(crit, 'and'))]
+            assert_that(sqlite_dao.read(cond=create_query(crit, 'and'))).described_as(str(crit)).is_equal_to(expected)
+        assert_that(sqlite_dao.read(cond=create_query({'tags': ['x', {'k': 1, 'j': 2}]}, 'and'))).is_length(2)
+        sqlite_dao.unlink()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
@@ -1,8 +1,24 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
 # noinspection PyPackageRequirements
 from assertpy import assert_that
-from tinydb import TinyDB
+from tinydb import TinyDB, Query
+from tinydb.storages import MemoryStorage
 
-from mypass.db.tiny import TinyDao
+from mypass.db import create_query
+from mypass.db.serializers import LengthPrefixedSerializer
+from mypass.db.tiny import operations as ops
+from mypass.db.tiny import GroupCommitMiddleware, ReadWriteLock, TinyDao, VaultTinyRepository, ShardedTinyDao, \
+    LogStorage, MmapStorage, MappedTable, shard_of
+from mypass.types import VaultEntity
+from mypass.types.const import UID_FIELD
 from mypass.types.op import DEL
 from tests._utils import AtomicMemoryStorage, persistent_storage
 
@@ -50,3 +66,804 @@ class TestTinyDao:
     @classmethod
     def teardown_class(cls):
         persistent_storage.clear()
+
+
+class TestPersistentTinyDao:
+    def test_connection_is_shared(self):
+        other = TinyDao('other-table', path=self.path, persistent=True)
+        assert_that(other.get_connection()).is_same_as(self.dao.get_connection())
+
+    def test_cached_read(self):
+        entry_id = self.dao.create(entity=dict(user='mypass-user1', pw='secret-pw-1'))
+        storage = self.dao.get_connection().storage
+        # unchanged file should not be parsed again
+        assert_that(storage.read()).is_same_as(storage.read())
+        doc = self.dao.read_one(doc_id=entry_id)
+        assert_that(doc).contains_entry({'user': 'mypass-user1'})
+
+    def test_external_change(self):
+        entry_id = self.dao.create(entity=dict(user='mypass-user2', pw='secret-pw-2'))
+        # simulate another process replacing the file
+        with open(self.path) as f:
+            data = json.load(f)
+        data[self.dao.table][str(entry_id)]['pw'] = 'changed-outside'
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        doc = self.dao.read_one(doc_id=entry_id)
+        assert_that(doc).contains_entry({'pw': 'changed-outside'})
+        new_id = self.dao.create(entity=dict(user='mypass-user3'))
+        assert_that(new_id).is_greater_than(entry_id)
+        with open(self.path) as f:
+            assert_that(json.load(f)[self.dao.table]).contains_key(str(entry_id), str(new_id))
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.tmp_dir.name) / 'db.json'
+        cls.dao = TinyDao('test-table', path=cls.path, persistent=True)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.unlink()
+        cls.tmp_dir.cleanup()
+
+
+class TestGroupCommitTinyDao:
+    def test_concurrent_create(self):
+        def create(i):
+            entry_id = self.dao.create(entity=dict(user=f'mypass-user{i}'))
+            # the write has to be durable when create returns
+            with open(self.path) as f:
+                assert_that(json.load(f)[self.dao.table]).contains_key(str(entry_id))
+            return entry_id
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            entry_ids = list(executor.map(create, range(64)))
+        assert_that(set(entry_ids)).is_length(64)
+        assert_that(self.dao.read()).is_length(64)
+
+    def test_update(self):
+        self.dao.update(entity=dict(pw='group-committed'), doc_ids=[1, 2])
+        with open(self.path) as f:
+            table = json.load(f)[self.dao.table]
+        assert_that(table['1']).contains_entry({'pw': 'group-committed'})
+        assert_that(table['2']).contains_entry({'pw': 'group-committed'})
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.tmp_dir.name) / 'db.json'
+        cls.dao = TinyDao('test-table', path=cls.path, group_commit=dict(max_latency=0.01, max_batch=16), fsync=False)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.unlink()
+        cls.tmp_dir.cleanup()
+
+
+class FailingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.fail = False
+
+    def write(self, data):
+        if self.fail:
+            raise OSError('disk full')
+        super().write(data)
+
+
+class TestGroupCommitFailures:
+    def write_in_thread(self, data) -> Exception | None:
+        errors = []
+
+        def write():
+            self.storage.write(data)
+            try:
+                self.storage.wait_durable()
+            except IOError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        return errors[0] if errors else None
+
+    def test_failure_range(self):
+        # the write of this thread is flushed before the failure, but waited for only afterward
+        self.storage.write({'vault': {'1': {'user': 'durable'}}})
+        self.storage.flush()
+        self.storage.storage.fail = True
+        assert_that(self.write_in_thread({'vault': {'2': {'user': 'failed'}}})).is_instance_of(IOError)
+        assert_that(self.write_in_thread({'vault': {'3': {'user': 'failed-again'}}})).is_instance_of(IOError)
+        self.storage.wait_durable()
+        self.storage.storage.fail = False
+        assert_that(self.write_in_thread({'vault': {'4': {'user': 'recovered'}}})).is_none()
+        self.storage.storage.fail = True
+        self.storage.write({'vault': {'5': {'user': 'failed-late'}}})
+        self.storage.flush()
+        assert_that(self.storage.wait_durable).raises(IOError)
+        # consecutive failures are merged into a single range
+        assert_that([(start, end) for start, end, _ in self.storage._failures]).is_equal_to([(1, 3), (4, 5)])
+
+    def setup_method(self):
+        self.storage = GroupCommitMiddleware(FailingStorage, max_latency=0.001)()
+
+    def teardown_method(self):
+        self.storage.storage.fail = False
+        self.storage.close()
+
+
+class TestIndexedTinyDao:
+    def test_lookup(self):
+        for i in range(10):
+            self.dao.create(entity={'user': f'user{i % 3}', UID_FIELD: i % 2, 'pw': f'pw{i}'})
+        docs = self.dao.read(cond=lambda d: d.get('user') == 'user1', hint={'user': 'user1'})
+        assert_that([doc.doc_id for doc in docs]).is_equal_to([2, 5, 8])
+        docs = self.dao.read(
+            cond=lambda d: d.get('user') == 'user1' and d.get(UID_FIELD) == 1, hint={'user': 'user1', UID_FIELD: 1})
+        assert_that([doc.doc_id for doc in docs]).is_equal_to([2, 8])
+        doc = self.dao.read_one(cond=lambda d: d.get('user') == 'nobody', hint={'user': 'nobody'})
+        assert_that(doc).is_none()
+
+    def test_update_indexed_field(self):
+        updated = self.dao.update(
+            entity={'user': 'renamed'}, cond=lambda d: d.get('user') == 'user0', hint={'user': 'user0'})
+        assert_that(updated).is_equal_to([1, 4, 7, 10])
+        assert_that(self.dao.read(cond=lambda d: d.get('user') == 'user0', hint={'user': 'user0'})).is_empty()
+        docs = self.dao.read(cond=lambda d: d.get('user') == 'renamed', hint={'user': 'renamed'})
+        assert_that([doc.doc_id for doc in docs]).is_equal_to([1, 4, 7, 10])
+
+    def test_delete(self):
+        removed = self.dao.delete(cond=lambda d: d.get(UID_FIELD) == 0, hint={UID_FIELD: 0})
+        assert_that(removed).is_equal_to([1, 3, 5, 7, 9])
+        docs = self.dao.read(cond=lambda d: d.get('user') == 'renamed', hint={'user': 'renamed'})
+        assert_that([doc.doc_id for doc in docs]).is_equal_to([4, 10])
+
+    def test_external_change(self):
+        persistent_storage.data = {self.dao.table: {'1': {'user': 'outsider', UID_FIELD: 0}}}
+        docs = self.dao.read(cond=lambda d: d.get('user') == 'outsider', hint={'user': 'outsider'})
+        assert_that([doc.doc_id for doc in docs]).is_equal_to([1])
+
+    @classmethod
+    def setup_class(cls):
+        cls.dao = TinyDao('test-table', storage=AtomicMemoryStorage, persistent=True, indexes=['user', UID_FIELD])
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class CountingMemoryStorage(AtomicMemoryStorage):
+    reads = 0
+    writes = 0
+
+    def read(self):
+        CountingMemoryStorage.reads += 1
+        return super().read()
+
+    def write(self, data) -> None:
+        CountingMemoryStorage.writes += 1
+        super().write(data)
+
+
+class TestTinyRepositoryBatchUpdate:
+    def test_update_by_ids(self):
+        CountingMemoryStorage.reads = CountingMemoryStorage.writes = 0
+        updated = self.repo.update_by_ids([1, 3, 42, 5], VaultEntity(pw='batched'))
+        assert_that(updated).is_equal_to([1, 3, 5])
+        assert_that(CountingMemoryStorage.reads).is_equal_to(1)
+        assert_that(CountingMemoryStorage.writes).is_equal_to(1)
+        table = persistent_storage[self.repo.get_table_name()]
+        assert_that([table[str(i)].get('pw') for i in range(1, 6)]).is_equal_to(
+            ['batched', None, 'batched', None, 'batched'])
+
+    def test_bulk_update(self):
+        updated = self.repo.bulk_update([
+            (2, VaultEntity(label='two')), (42, VaultEntity(label='missing')), (4, VaultEntity(label='four', pw=DEL))])
+        assert_that(updated).is_equal_to([2, 4])
+        assert_that(self.repo.find_by_id(2).label).is_equal_to('two')
+        assert_that(self.repo.find_by_id(4).label).is_equal_to('four')
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(table='batch-table', storage=CountingMemoryStorage)
+        for i in range(5):
+            cls.repo.create(VaultEntity(user=f'user{i}'))
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class TestTinyRepositoryCreateMany:
+    def test_create_many(self):
+        CountingMemoryStorage.reads = CountingMemoryStorage.writes = 0
+        ids = self.repo.create_many([VaultEntity(user=f'many{i}') for i in range(4)])
+        assert_that(ids).is_equal_to([1, 2, 3, 4])
+        assert_that(CountingMemoryStorage.writes).is_equal_to(1)
+        assert_that([self.repo.find_by_id(pk).user for pk in ids]).is_equal_to([f'many{i}' for i in range(4)])
+
+    def test_create_many_with_ids(self):
+        ids = self.repo.create_many([VaultEntity(20, user='twenty'), VaultEntity(user='next')])
+        assert_that(ids[0]).is_equal_to(20)
+        assert_that([self.repo.find_by_id(pk).user for pk in ids]).is_equal_to(['twenty', 'next'])
+
+    def test_create_many_existing_id(self):
+        CountingMemoryStorage.writes = 0
+        assert_that(self.repo.create_many).raises(ValueError).when_called_with(
+            [VaultEntity(30, user='thirty'), VaultEntity(20, user='duplicate')])
+        assert_that(CountingMemoryStorage.writes).is_equal_to(0)
+        assert_that(self.repo.find_by_id(30)).is_none()
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(table='create-many-table', storage=CountingMemoryStorage)
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class TestTinyRepositoryIter:
+    def test_iter_all(self):
+        entities = self.repo.iter_all()
+        assert_that(isinstance(entities, list)).is_false()
+        assert_that(list(entities)).is_equal_to(list(self.repo.find_all()))
+
+    def test_iter_by_crit(self):
+        entities = list(self.repo.iter_by_crit(VaultEntity(**{UID_FIELD: 1})))
+        assert_that([e.id for e in entities]).is_equal_to([2, 4, 6, 8, 10])
+        entities = list(self.repo.iter_by_crit(VaultEntity(user='user3')))
+        assert_that([e.id for e in entities]).is_equal_to([4])
+
+    def test_iter_by_ids(self):
+        entities = list(self.repo.iter_by_ids([3, 42, 1]))
+        assert_that([e.id for e in entities]).contains_only(1, 3)
+        assert_that(entities).contains(self.repo.find_by_id(3))
+
+    def test_iter_find(self):
+        entities = list(self.repo.iter_find([1, 2, 3, 4], VaultEntity(**{UID_FIELD: 0})))
+        assert_that([e.id for e in entities]).is_equal_to([1, 3])
+
+    def test_iter_skips_removed(self):
+        entities = self.repo.iter_all()
+        assert_that(next(entities).id).is_equal_to(1)
+        self.repo.remove_by_id(11)
+        assert_that([e.id for e in entities]).does_not_contain(11).contains(10)
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(
+            table='iter-table', storage=AtomicMemoryStorage, persistent=True, indexes=(UID_FIELD,))
+        for i in range(11):
+            cls.repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}))
+        cls.repo.dao.iter = partial(TinyDao.iter, cls.repo.dao, chunk_size=3)
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class TestNonPersistentTinyRepositoryIter(TestTinyRepositoryIter):
+    def test_iter_skips_removed(self):
+        # documents are read at once without a persistent connection
+        ...
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(table='iter-table', storage=AtomicMemoryStorage)
+        for i in range(11):
+            cls.repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}))
+
+
+class TestTinyRepositoryPagination:
+    def pages(self, read, limit):
+        pages, cursor = [], None
+        while True:
+            page = list(read(limit=limit, cursor=cursor))
+            if page:
+                pages.append([e.id for e in page])
+            if len(page) < limit:
+                return pages
+            cursor = page[-1].id
+
+    def test_find_all(self):
+        assert_that(self.pages(self.repo.find_all, 4)).is_equal_to([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]])
+        assert_that([e.id for e in self.repo.find_all(cursor=9)]).is_equal_to([10, 11])
+
+    def test_find_by_crit(self):
+        crit = VaultEntity(**{UID_FIELD: 0})
+        pages = self.pages(lambda **kwargs: self.repo.find_by_crit(crit, **kwargs), 2)
+        assert_that(pages).is_equal_to([[1, 3], [5, 7], [9, 11]])
+
+    def test_find_by_ids(self):
+        pages = self.pages(lambda **kwargs: self.repo.find_by_ids([7, 2, 42, 5], **kwargs), 2)
+        assert_that(pages).is_equal_to([[2, 5], [7]])
+
+    def test_find(self):
+        crit = VaultEntity(**{UID_FIELD: 1})
+        pages = self.pages(lambda **kwargs: self.repo.find([8, 2, 3, 4, 6], crit, **kwargs), 2)
+        assert_that(pages).is_equal_to([[2, 4], [6, 8]])
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(
+            table='page-table', storage=AtomicMemoryStorage, persistent=True, indexes=(UID_FIELD,))
+        for i in range(11):
+            cls.repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}))
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class TestNonPersistentTinyRepositoryPagination(TestTinyRepositoryPagination):
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(table='page-table', storage=AtomicMemoryStorage)
+        for i in range(11):
+            cls.repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}))
+
+
+class TestTinyRepositoryProjection:
+    fields = ['label', 'site']
+
+    def test_find_by_crit(self):
+        entities = list(self.repo.find_by_crit(VaultEntity(user='user1'), fields=self.fields))
+        assert_that(entities).is_length(1)
+        assert_that(entities[0].id).is_equal_to(2)
+        assert_that(dict(entities[0])).is_equal_to({'label': 'label1', 'site': 'site1'})
+
+    def test_find_all(self):
+        entities = list(self.repo.find_all(fields=['user']))
+        assert_that([dict(e) for e in entities]).is_equal_to([{'user': f'user{i}'} for i in range(4)])
+        entities = list(self.repo.find_all(fields=['label'], limit=2, cursor=1))
+        assert_that([(e.id, dict(e)) for e in entities]).is_equal_to([(2, {'label': 'label1'}), (3, {})])
+
+    def test_find(self):
+        entities = list(self.repo.find([1, 2, 3], VaultEntity(**{UID_FIELD: 1}), fields=self.fields))
+        assert_that([(e.id, dict(e)) for e in entities]).is_equal_to([(2, {'label': 'label1', 'site': 'site1'})])
+        entities = list(self.repo.find([1, 2, 3], VaultEntity(**{UID_FIELD: 0}), fields=self.fields, limit=1))
+        assert_that([(e.id, dict(e)) for e in entities]).is_equal_to([(1, {'site': 'site0'})])
+
+    def test_find_by_ids_and_iter(self):
+        entities = list(self.repo.find_by_ids([1, 4], fields=['pw']))
+        assert_that([dict(e) for e in entities]).is_equal_to([{'pw': 'pw0'}, {'pw': 'pw3'}])
+        entities = list(self.repo.iter_by_crit(VaultEntity(**{UID_FIELD: 1}), fields=['user']))
+        assert_that([dict(e) for e in entities]).is_equal_to([{'user': 'user1'}, {'user': 'user3'}])
+        assert_that(list(self.repo.iter_all(fields=['user']))).is_equal_to(list(self.repo.find_all(fields=['user'])))
+
+    @classmethod
+    def setup_class(cls):
+        cls.repo = VaultTinyRepository(table='projection-table', storage=AtomicMemoryStorage, persistent=True)
+        for i in range(4):
+            label = f'label{i}' if i % 2 else None
+            cls.repo.create(VaultEntity(
+                user=f'user{i}', pw=f'pw{i}', label=label, site=f'site{i}', **{UID_FIELD: i % 2}))
+
+    @classmethod
+    def teardown_class(cls):
+        persistent_storage.clear()
+
+
+class TestShardedTinyRepository:
+    shards = 4
+
+    def test_create_routes_by_uid(self):
+        ids = [self.repo.create(VaultEntity(user=f'user{i}', **{UID_FIELD: i % 3})) for i in range(9)]
+        assert_that(set(ids)).is_length(9)
+        for uid in range(3):
+            shard = shard_of(uid, self.shards)
+            with open(self.dao.shard_paths()[shard]) as f:
+                users = {doc['user'] for doc in json.load(f)['vault'].values() if doc[UID_FIELD] == uid}
+            assert_that(users).is_equal_to({f'user{i}' for i in range(uid, 9, 3)})
+        assert_that([pk % self.shards for pk in ids]).is_equal_to([shard_of(i % 3, self.shards) for i in range(9)])
+
+    def test_write_touches_owner_shard_only(self):
+        shard = shard_of(1, self.shards)
+        paths = self.dao.shard_paths()
+        before = {path: path.stat().st_mtime_ns for path in paths if path.exists()}
+        pk = self.repo.create(VaultEntity(user='owner', **{UID_FIELD: 1}))
+        self.repo.update_by_id(pk, VaultEntity(pw='changed'))
+        after = {path: path.stat().st_mtime_ns for path in paths if path.exists()}
+        changed = [path for path in after if before.get(path) != after[path]]
+        assert_that(changed).is_equal_to([paths[shard]])
+        assert_that(self.repo.storage_paths([pk])).is_equal_to([str(paths[shard])])
+        assert_that(self.repo.find_by_id(pk).pw).is_equal_to('changed')
+        self.repo.remove_by_id(pk)
+
+    def test_find_across_shards(self):
+        entities = self.repo.find_all()
+        ids = [e.id for e in entities]
+        assert_that(ids).is_equal_to(sorted(ids)).is_length(9)
+        assert_that(self.repo.find_by_crit({UID_FIELD: 2})).is_length(3)
+        assert_that(self.repo.find_by_crit({'user': 'user4'})[0][UID_FIELD]).is_equal_to(1)
+        assert_that(self.repo.find_by_ids(ids[::-1][:3])).is_equal_to(entities[-3:])
+        assert_that(list(self.repo.iter_all())).contains_only(*entities)
+
+    def test_pagination(self):
+        ids = [e.id for e in self.repo.find_all()]
+        pages, cursor = [], None
+        while True:
+            page = self.repo.find_all(limit=4, cursor=cursor)
+            if not page:
+                break
+            pages.append([e.id for e in page])
+            cursor = page[-1].id
+        assert_that(pages).is_equal_to([ids[:4], ids[4:8], ids[8:]])
+
+    def test_create_many(self):
+        ids = self.repo.create_many([VaultEntity(user=f'bulk{i}', **{UID_FIELD: 10 + i}) for i in range(5)])
+        assert_that([self.repo.find_by_id(pk).user for pk in ids]).is_equal_to([f'bulk{i}' for i in range(5)])
+        assert_that(self.repo.remove_by_ids(ids)).contains_only(*ids)
+
+    def test_move_between_shards_throws(self):
+        other = next(uid for uid in range(100) if shard_of(uid, self.shards) != shard_of(0, self.shards))
+        pk = self.repo.find_by_crit({UID_FIELD: 0})[0].id
+        assert_that(self.repo.update_by_id).raises(ValueError).when_called_with(pk, VaultEntity(**{UID_FIELD: other}))
+        assert_that(self.repo.update_by_crit).raises(ValueError).when_called_with(
+            {UID_FIELD: 0}, VaultEntity(**{UID_FIELD: other}))
+        assert_that(self.repo.find_by_id(pk)[UID_FIELD]).is_equal_to(0)
+
+    def test_no_move_by_concurrent_create(self):
+        other = next(uid for uid in range(100) if shard_of(uid, self.shards) != shard_of(0, self.shards))
+        anchor = self.repo.create(VaultEntity(user='anchor', **{UID_FIELD: 0}))
+        check_moves = self.dao._check_moves
+        racer = threading.Thread(target=self.repo.create, args=(VaultEntity(user='racer', **{UID_FIELD: 0}),))
+
+        def check_then_race(*args):
+            check_moves(*args)
+            # a document created between the check and the write would be moved to another shard
+            racer.start()
+            time.sleep(0.2)
+
+        self.dao._check_moves = check_then_race
+        try:
+            assert_that(self.repo.update_by_crit({'user': 'racer'}, VaultEntity(**{UID_FIELD: other}))).is_empty()
+        finally:
+            del self.dao._check_moves
+        racer.join()
+        assert_that(self.repo.find_by_crit({UID_FIELD: 0, 'user': 'racer'})).is_length(1)
+        self.repo.remove_by_crit({'user': 'racer'})
+        self.repo.remove_by_id(anchor)
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.dao = ShardedTinyDao(
+            'vault', Path(cls.tmp_dir.name) / 'vault', shards=cls.shards, persistent=True, indexes=(UID_FIELD,))
+        cls.repo = VaultTinyRepository(dao=cls.dao)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.dao.unlink()
+        cls.tmp_dir.cleanup()
+
+
+class TestLogStorage:
+    def open(self, **kwargs):
+        return TinyDB(self.path, storage=LogStorage, **kwargs)
+
+    def test_append_per_change(self):
+        with self.open() as db:
+            db.table('vault').insert_multiple({'user': f'user{i}', 'pw': 'secret'} for i in range(200))
+            before = db.storage.log_size
+            db.table('vault').update({'pw': 'changed'}, doc_ids=[7])
+            # the size of the appended record does not depend on the size of the database
+            assert_that(db.storage.log_size - before).is_less_than(100)
+            db.table('vault').remove(doc_ids=[8, 9])
+            db.table('other').insert({'user': 'other'})
+            db.drop_table('other')
+        assert_that(self.path.stat().st_size).is_equal_to(0)
+        with self.open() as db:
+            table = db.table('vault')
+            assert_that(table).is_length(198)
+            assert_that(table.get(doc_id=7)).contains_entry({'pw': 'changed'})
+            assert_that(table.get(doc_id=8)).is_none()
+            assert_that(db.tables()).is_equal_to({'vault'})
+
+    def test_changes_tracked(self):
+        with self.open() as db:
+            vault, other = db.table('vault'), db.table('other')
+            vault.insert_multiple({'user': f'user{i}', 'pw': 'secret'} for i in range(10))
+            other.insert_multiple({'user': f'other{i}'} for i in range(3))
+            before = db.storage.log_size
+            vault.update(ops.update({'pw': 'changed', 'user': DEL}), doc_ids=[2])
+            vault.update(ops.delete_keys(['pw']), doc_ids=[3])
+            # documents modified in place are logged, unchanged documents and tables are not
+            with open(db.storage.log_path) as f:
+                records = [json.loads(line) for line in f][-2:]
+            assert_that(records).is_equal_to([
+                {'put': {'vault': {'2': {'pw': 'changed'}}}}, {'put': {'vault': {'3': {'user': 'user2'}}}}])
+            assert_that(db.storage.log_size - before).is_less_than(100)
+            vault.upsert({'user': 'user4', 'pw': 'upserted'}, Query().user == 'user4')
+            other.truncate()
+            other.insert({'user': 'again'})
+            expected = {name: {doc.doc_id: dict(doc) for doc in db.table(name)} for name in db.tables()}
+        with self.open() as db:
+            assert_that({name: {doc.doc_id: dict(doc) for doc in db.table(name)} for name in db.tables()}).is_equal_to(
+                expected)
+            assert_that(db.table('other').all()).is_equal_to([{'user': 'again'}])
+
+    def test_compaction(self):
+        with self.open(compact_threshold=512) as db:
+            table = db.table('compacted')
+            for i in range(50):
+                table.insert({'user': f'user{i}'})
+            table.update({'pw': 'compacted'}, doc_ids=[1])
+            db.storage.compact()
+            assert_that(str(db.storage.old_log_path)).does_not_exist()
+            assert_that(db.storage.log_size).is_equal_to(0)
+            with open(self.path) as f:
+                assert_that(json.load(f)['compacted']).is_length(50)
+            table.remove(doc_ids=[2])
+        with self.open() as db:
+            table = db.table('compacted')
+            assert_that(table).is_length(49)
+            assert_that(table.get(doc_id=1)).contains_entry({'pw': 'compacted'})
+
+    def test_incomplete_record(self):
+        with self.open() as db:
+            db.table('crashed').insert({'user': 'durable'})
+            log_path = db.storage.log_path
+        with open(log_path, 'a') as f:
+            f.write('{"put": {"crashed": {"2": {"user": "lo')
+        with self.open() as db:
+            assert_that(db.table('crashed').all()).is_equal_to([{'user': 'durable'}])
+            db.table('crashed').insert({'user': 'after'})
+        with self.open() as db:
+            assert_that([doc['user'] for doc in db.table('crashed')]).is_equal_to(['durable', 'after'])
+
+    def test_dao(self):
+        path = Path(self.tmp_dir.name) / 'dao.json'
+        dao = TinyDao('vault', path=path, storage=LogStorage, persistent=True, indexes=(UID_FIELD,))
+        repo = VaultTinyRepository(dao=dao)
+        ids = repo.create_many([VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}) for i in range(6)])
+        repo.update_by_id(ids[0], VaultEntity(pw='changed'))
+        assert_that(repo.find_by_crit({UID_FIELD: 1})).is_length(3)
+        dao.close()
+        assert_that(repo.find_by_id(ids[0]).pw).is_equal_to('changed')
+        assert_that(repo.find_by_crit({UID_FIELD: 0})).is_length(3)
+        dao.close()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    def setup_method(self):
+        self.path = Path(self.tmp_dir.name) / 'log.json'
+        for path in (self.path, self.path.with_name('log.json.log')):
+            if path.exists():
+                path.unlink()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
+
+
+class TestMmapStorage:
+    def write(self, data, **kwargs):
+        tmp_path = self.path.with_name('mmap.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
+        # mapped files are replaced, never truncated
+        os.replace(tmp_path, self.path)
+
+    def test_read(self):
+        data = {
+            'vault': {
+                str(i): {'user': f'user{i} "{{quoted}}" \\ é', 'nested': {'list': [1, {'brace': '}'}]}, 'empty': {}}
+                for i in range(1, 20)},
+            'empty': {},
+            'escaped "table"': {'1': {}, '2': {'flat': '{'}},
+        }
+        for kwargs in ({}, {'indent': 2, 'ensure_ascii': False}):
+            self.write(data, **kwargs)
+            tables = MmapStorage(str(self.path)).read()
+            assert_that(tables['vault']).is_instance_of(MappedTable)
+            assert_that({table: dict(docs) for table, docs in tables.items()}).is_equal_to(data)
+
+    def test_lazy_documents(self):
+        with open(self.path, 'w') as f:
+            f.write('{"vault": {"1": {"user": "valid"}, "2": {"user": invalid}}}')
+        table = MmapStorage(str(self.path)).read()['vault']
+        # only the requested document is parsed
+        assert_that(table['1']).is_equal_to({'user': 'valid'})
+        assert_that(list(table)).is_equal_to(['1', '2'])
+        assert_that(table.__getitem__).raises(ValueError).when_called_with('2')
+
+    def test_missing_and_empty(self):
+        assert_that(MmapStorage(str(self.path)).read()).is_none()
+        self.path.touch()
+        assert_that(MmapStorage(str(self.path)).read()).is_none()
+        assert_that(MmapStorage).raises(IOError).when_called_with(str(self.path), access_mode='r+')
+
+    def test_dao(self):
+        self.write({'vault': {str(i): {'user': f'user{i}', UID_FIELD: i % 3} for i in range(1, 10)}})
+        dao = TinyDao('vault', path=self.path, read_only=True, persistent=True, indexes=(UID_FIELD,))
+        repo = VaultTinyRepository(dao=dao)
+        assert_that(repo.find_by_id(4).user).is_equal_to('user4')
+        assert_that([e.id for e in repo.find_by_ids([9, 2, 100])]).is_equal_to([2, 9])
+        assert_that(repo.find_by_crit({UID_FIELD: 1})).is_length(3)
+        assert_that([e.id for e in repo.find_all(limit=2, cursor=7)]).is_equal_to([8, 9])
+        assert_that(repo.create).raises(IOError).when_called_with(VaultEntity(user='new'))
+        # a replaced file is mapped again
+        self.write({'vault': {'1': {'user': 'replaced', UID_FIELD: 1}}})
+        assert_that(repo.find_by_crit({UID_FIELD: 1})).is_length(1)
+        assert_that(repo.find_by_id(4)).is_none()
+        dao.close()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    def setup_method(self):
+        self.path = Path(self.tmp_dir.name) / 'mmap.json'
+        if self.path.exists():
+            self.path.unlink()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
+
+
+class TestSerializedTinyDao:
+    def test_serializer(self):
+        serializer = LengthPrefixedSerializer()
+        for persistent in (False, True):
+            path = Path(self.tmp_dir.name) / f'serialized-{persistent}{serializer.extension}'
+            repo = VaultTinyRepository(path=path, persistent=persistent, serializer=serializer)
+            ids = repo.create_many([VaultEntity(user=f'user{i}', **{UID_FIELD: i % 2}) for i in range(4)])
+            repo.update_by_id(ids[0], VaultEntity(pw='changed'))
+            assert_that(repo.find_by_crit({UID_FIELD: 0})).is_length(2)
+            repo.dao.close()
+            with open(path, 'rb') as f:
+                tables = serializer.loads(f.read())
+            assert_that(tables['vault'][str(ids[0])]).is_equal_to({'user': 'user0', UID_FIELD: 0, 'pw': 'changed'})
+
+    def test_sharded(self):
+        dao = ShardedTinyDao(
+            'vault', Path(self.tmp_dir.name) / 'shards', shards=2, serializer=LengthPrefixedSerializer())
+        dao.create({'user': 'sharded', UID_FIELD: 1})
+        assert_that([path.suffix for path in dao.shard_paths()]).is_equal_to(['.lp', '.lp'])
+        assert_that(dao.read(cond=None)).is_length(1)
+        dao.unlink()
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()
+
+
+class TestReadWriteLock:
+    def test_concurrent_readers(self):
+        lock = ReadWriteLock()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with lock.read():
+                # every reader has to be inside the lock at the same time to pass the barrier
+                barrier.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_that(lock.stats()['read']['acquired']).is_equal_to(3)
+
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+
+        def reader():
+            with lock.read():
+                events.append('read')
+
+        with lock.write():
+            thread = threading.Thread(target=reader)
+            thread.start()
+            time.sleep(0.05)
+            events.append('written')
+        thread.join()
+        assert_that(events).is_equal_to(['written', 'read'])
+        assert_that(lock.stats()['read']['wait_max']).is_greater_than_or_equal_to(0.04)
+
+    def test_waiting_writer_blocks_new_readers(self):
+        lock = ReadWriteLock()
+        events = []
+
+        def writer():
+            with lock.write():
+                events.append('write')
+
+        def reader():
+            with lock.read():
+                events.append('read')
+
+        with lock.read():
+            writer_thread = threading.Thread(target=writer)
+            writer_thread.start()
+            time.sleep(0.05)
+            reader_thread = threading.Thread(target=reader)
+            reader_thread.start()
+            time.sleep(0.05)
+            assert_that(events).is_empty()
+        writer_thread.join()
+        reader_thread.join()
+        assert_that(events).is_equal_to(['write', 'read'])
+
+    def test_reentrancy(self):
+        lock = ReadWriteLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                assert_that(lock.write().__enter__).raises(RuntimeError).when_called_with()
+        # reentering the lock is not counted as an acquisition
+        assert_that(lock.stats()['read']['acquired']).is_equal_to(1)
+        assert_that(lock.stats()['write']['acquired']).is_equal_to(1)
+
+
+def _create_entries(path: str, count: int, file_lock: bool):
+    dao = TinyDao('vault', path=path, file_lock=file_lock)
+    return [dao.create({'user': f'user{os.getpid()}-{i}'}) for i in range(count)]
+
+
+class TestTinyDaoLocking:
+    def test_concurrent_creates(self):
+        for persistent in (False, True):
+            path = Path(self.tmp_dir.name) / f'threads-{persistent}.json'
+            dao = TinyDao('vault', path=path, persistent=persistent)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                ids = list(executor.map(lambda i: dao.create({'user': f'user{i}'}), range(80)))
+            # no insert is lost by writers rewriting the file based on a stale read
+            assert_that(set(ids)).is_length(80)
+            assert_that(dao.read(cond=None)).is_length(80)
+            stats = dao.lock_stats()
+            assert_that(stats['write']['acquired']).is_greater_than_or_equal_to(80)
+            assert_that(stats['read']['acquired']).is_greater_than_or_equal_to(1)
+            dao.close()
+
+    def test_concurrent_reads_and_writes(self):
+        path = Path(self.tmp_dir.name) / 'mixed.json'
+        dao = TinyDao('vault', path=path, persistent=True, indexes=(UID_FIELD,))
+        dao.create_many({'user': f'user{i}', UID_FIELD: i % 4} for i in range(40))
+
+        def work(i):
+            if i % 4 == 0:
+                return dao.update({'pw': f'pw{i}'}, cond=create_query({UID_FIELD: i % 8 // 2}, 'and'))
+            return dao.read(cond=create_query({UID_FIELD: i % 4}, 'and'))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(work, range(200)))
+        assert_that(all(len(result) == 10 for result in results)).is_true()
+        dao.close()
+
+    def test_file_lock_between_processes(self):
+        path = Path(self.tmp_dir.name) / 'processes.json'
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(_create_entries, [str(path)] * 4, [25] * 4, [True] * 4))
+        assert_that(set(doc_id for ids in results for doc_id in ids)).is_length(100)
+        assert_that(TinyDao('vault', path=path).read(cond=None)).is_length(100)
+        assert_that(str(path.with_name('processes.json.lock'))).exists()
+
+    def test_file_lock_with_group_commit_throws(self):
+        path = Path(self.tmp_dir.name) / 'group.json'
+        assert_that(TinyDao).raises(ValueError).when_called_with(
+            'vault', path=path, file_lock=True, group_commit={})
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tmp_dir.cleanup()